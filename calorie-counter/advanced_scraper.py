@@ -1,6 +1,7 @@
 import requests
 from bs4 import BeautifulSoup
 import json
+import threading
 import time
 from datetime import datetime
 import re
@@ -8,8 +9,28 @@ from typing import List, Dict, Optional
 from urllib.parse import urljoin, urlparse
 import random
 
+class HostRateLimiter:
+    """同一主機的請求之間至少間隔 min_interval 秒，不同主機互不影響"""
+
+    def __init__(self, min_interval: float = 2.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_allowed: Dict[str, float] = {}
+
+    def acquire(self, host: str) -> None:
+        """預約下一個請求時段並等待到輪到為止"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_allowed.get(host, 0.0))
+            self._next_allowed[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
 class AdvancedNutritionScraper:
-    def __init__(self):
+    def __init__(self, max_workers: int = 6, min_host_interval: float = 2.0):
+        # 背景爬蟲並行抓取的網站數上限與同一主機的最小請求間隔
+        self.max_workers = max_workers
+        self.rate_limiter = HostRateLimiter(min_host_interval)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -34,60 +55,33 @@ class AdvancedNutritionScraper:
             }
         }
     
-    def scrape_fitness_websites(self, query: str = "nutrition tips") -> List[Dict]:
-        """爬取多個健身網站的營養資訊"""
-        all_results = []
-        
-        for site_name, site_info in self.fitness_sites.items():
-            try:
-                results = self._scrape_single_site(site_name, site_info, query)
-                all_results.extend(results)
-                # 避免請求過於頻繁
-                time.sleep(random.uniform(1, 3))
-            except Exception as e:
-                print(f"爬取 {site_name} 時發生錯誤: {str(e)}")
-                continue
-        
-        return all_results
-    
-    def _scrape_single_site(self, site_name: str, site_info: Dict, query: str) -> List[Dict]:
-        """爬取單一網站的資訊"""
+    def fetch_site_articles(self, site_name: str, site_info: Dict) -> List[Dict]:
+        """下載單一網站營養專欄的文章列表（不依查詢過濾）；連線或 HTTP 錯誤直接拋出"""
+        nutrition_url = urljoin(site_info['base_url'], site_info['nutrition_section'])
+        response = self.session.get(nutrition_url, timeout=10)
+        response.raise_for_status()
+
+        soup = BeautifulSoup(response.content, 'html.parser')
         results = []
-        
-        try:
-            # 嘗試爬取營養相關頁面
-            nutrition_url = urljoin(site_info['base_url'], site_info['nutrition_section'])
-            response = self.session.get(nutrition_url, timeout=10)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # 尋找文章標題和內容
-                articles = soup.find_all(['article', 'div'], class_=re.compile(r'article|post|content'))
-                
-                for article in articles[:5]:  # 限制數量避免過度爬取
-                    title_elem = article.find(['h1', 'h2', 'h3', 'h4'])
-                    content_elem = article.find(['p', 'div'], class_=re.compile(r'content|excerpt|summary'))
-                    
-                    if title_elem and content_elem:
-                        title = title_elem.get_text(strip=True)
-                        content = content_elem.get_text(strip=True)[:200] + "..."  # 限制長度
-                        
-                        if query.lower() in title.lower() or query.lower() in content.lower():
-                            results.append({
-                                "title": title,
-                                "content": content,
-                                "source": f"{site_name.title()}",
-                                "url": nutrition_url,
-                                "timestamp": datetime.now().isoformat(),
-                                "category": "scraped"
-                            })
-            
-        except Exception as e:
-            print(f"爬取 {site_name} 詳細頁面時發生錯誤: {str(e)}")
-        
+
+        # 尋找文章標題和內容
+        articles = soup.find_all(['article', 'div'], class_=re.compile(r'article|post|content'))
+
+        for article in articles[:5]:  # 限制數量避免過度爬取
+            title_elem = article.find(['h1', 'h2', 'h3', 'h4'])
+            content_elem = article.find(['p', 'div'], class_=re.compile(r'content|excerpt|summary'))
+
+            if title_elem and content_elem:
+                results.append({
+                    "title": title_elem.get_text(strip=True),
+                    "content": content_elem.get_text(strip=True)[:200] + "...",  # 限制長度
+                    "source": f"{site_name.title()}",
+                    "url": nutrition_url,
+                    "timestamp": datetime.now().isoformat(),
+                    "category": "scraped"
+                })
         return results
-    
+
     def scrape_nutrition_database(self) -> List[Dict]:
         """爬取營養資料庫資訊"""
         nutrition_data = [
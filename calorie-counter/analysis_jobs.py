@@ -0,0 +1,137 @@
+"""
+非同步圖片分析工作
+上傳後立即回傳工作 ID，由有限大小的執行緒池在背景呼叫模型
+
+工作狀態以 JSON 檔案存放在共用目錄，任何一個 gunicorn worker 都能回應輪詢。
+串流工作在執行中的狀態附上已完成的項目，輪詢即可逐項顯示，不必佔用 worker 等待整個模型回應。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from image_cache import write_json_atomic
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class QueueFullError(Exception):
+    """等待中的工作已達上限"""
+
+
+class AnalysisJobQueue:
+    def __init__(self, directory: str, max_workers: int = 4, max_pending: int = 16,
+                 ttl_seconds: int = 3600):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = None
+        self._pending = 0
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # 延遲建立執行緒池，避免在 gunicorn fork 之前就啟動執行緒
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="analysis-job")
+        return self._executor
+
+    def submit(self, fn: Callable[..., Dict], *args) -> str:
+        """提交工作並回傳工作 ID，佇列已滿時拋出 QueueFullError"""
+        return self._submit(self._run, fn, args)
+
+    def submit_stream(self, fn: Callable[..., Iterable[Tuple[str, Dict]]], *args) -> str:
+        """提交串流工作：fn 依序產生 ("item", dict)，最後產生 ("result", dict)"""
+        return self._submit(self._run_stream, fn, args)
+
+    def _submit(self, run: Callable, fn: Callable, args) -> str:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"已有 {self._pending} 個工作等待中")
+            self._pending += 1
+            executor = self._get_executor()
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            write_json_atomic(self._path(job_id), {"status": "queued", "created": now})
+            executor.submit(run, job_id, now, fn, args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        self._cleanup(now)
+        return job_id
+
+    def _run(self, job_id: str, created: float, fn: Callable[..., Dict], args) -> None:
+        try:
+            write_json_atomic(self._path(job_id), {"status": "running", "created": created})
+            result = fn(*args)
+            state = {"status": "done", "created": created, "result": result}
+        except Exception as e:
+            print(f"分析工作 {job_id} 失敗: {str(e)}")
+            state = {"status": "failed", "created": created, "error": str(e)}
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        try:
+            write_json_atomic(self._path(job_id), state)
+        except OSError as e:
+            print(f"寫入分析工作 {job_id} 狀態失敗: {str(e)}")
+
+    def _run_stream(self, job_id: str, created: float, fn: Callable[..., Iterable[Tuple[str, Dict]]],
+                    args) -> None:
+        def produce():
+            items = []
+            result = None
+            for event, data in fn(*args):
+                if event == "item":
+                    items.append(data)
+                    write_json_atomic(self._path(job_id), {"status": "running", "created": created, "items": items})
+                elif event == "result":
+                    result = data
+            if result is None:
+                raise ValueError("分析沒有產生結果")
+            return result
+
+        self._run(job_id, created, produce, ())
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """讀取工作狀態，找不到時回傳 None"""
+        if not _JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _cleanup(self, now: float) -> None:
+        """刪除超過保留時間的工作狀態檔，每分鐘最多執行一次"""
+        with self._lock:
+            if now - self._last_cleanup < 60:
+                return
+            self._last_cleanup = now
+
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        if now - entry.stat().st_mtime > self.ttl_seconds:
+                            os.remove(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
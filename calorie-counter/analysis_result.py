@@ -0,0 +1,122 @@
+"""
+圖片分析結果型別
+在邊界上一次把模型回傳的自由格式數字（例如 "about 350 kcal"）正規化為整數，
+並以各項食物重新計算總熱量、標記不一致之處
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# 允許負號與指數，負數與 "1e12" 之類的數值才會被拒絕，而不是解析為 5 或 1
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+# 千分位逗號，例如 "1,200 kcal"
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+# 範圍，例如 "300-400"、"300 to 400"、"300～400"
+_RANGE = re.compile(r"(-?\d+(?:\.\d+)?)\s*(?:-|–|~|～|to|至|到)\s*(\d+(?:\.\d+)?)")
+
+# 模型回報的總熱量與各項加總相差超過此比例（且超過最小差距）時視為不一致
+TOTAL_TOLERANCE_RATIO = 0.1
+TOTAL_TOLERANCE_KCAL = 20
+
+# 單項或單餐卡路里的合理上限；超過時視為模型幻覺，避免寫入時超出 INT 欄位範圍
+MAX_CALORIES = 20000
+
+
+def _bounded(value: float) -> Optional[int]:
+    # 先比較範圍，極大的整數不必轉為浮點數
+    if value < 0 or value > MAX_CALORIES or not math.isfinite(value):
+        return None
+    return int(round(value))
+
+
+def parse_calories(value) -> Optional[int]:
+    """將卡路里數值正規化為非負整數；範圍取中間值，負數、超過上限或無法解析時回傳 None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return _bounded(value)
+
+    text = _THOUSANDS.sub("", str(value))
+    match = _RANGE.search(text)
+    if match:
+        low, high = float(match.group(1)), float(match.group(2))
+        if _bounded(low) is None or _bounded(high) is None:
+            return None
+        return _bounded((low + high) / 2)
+
+    match = _NUMBER.search(text)
+    if match is None:
+        return None
+    return _bounded(float(match.group()))
+
+
+@dataclass(slots=True)
+class FoodEstimate:
+    name: str
+    calories: int
+
+    @classmethod
+    def from_model_output(cls, data) -> "FoodEstimate":
+        if not isinstance(data, dict):
+            data = {}
+        name = str(data.get("name") or "").strip() or "未知食物"
+        return cls(name, parse_calories(data.get("calories")) or 0)
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "calories": self.calories}
+
+
+@dataclass(slots=True)
+class CalorieAnalysis:
+    reasoning: str
+    food_items: List[FoodEstimate]
+    total: int
+    reported_total: Optional[int] = None
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def consistent(self) -> bool:
+        return not self.warnings
+
+    @classmethod
+    def from_model_output(cls, data) -> "CalorieAnalysis":
+        """驗證並正規化模型回傳的 JSON"""
+        if not isinstance(data, dict):
+            data = {}
+        warnings = []
+
+        raw_items = data.get("food_items")
+        if not isinstance(raw_items, list):
+            raw_items = []
+        items = []
+        for raw in raw_items:
+            item = FoodEstimate.from_model_output(raw)
+            if isinstance(raw, dict) and parse_calories(raw.get("calories")) is None:
+                warnings.append(f"無法解析「{item.name}」的卡路里: {raw.get('calories')!r}")
+            items.append(item)
+
+        reported_total = parse_calories(data.get("total"))
+        if items:
+            total = sum(item.calories for item in items)
+            if reported_total is not None:
+                difference = abs(reported_total - total)
+                if difference > max(TOTAL_TOLERANCE_KCAL, total * TOTAL_TOLERANCE_RATIO):
+                    warnings.append(f"模型回報總熱量 {reported_total} 與各項加總 {total} 不一致")
+        else:
+            total = reported_total or 0
+            if reported_total is None:
+                warnings.append("模型未提供任何卡路里數值")
+
+        return cls(str(data.get("reasoning") or ""), items, total, reported_total, warnings)
+
+    def to_dict(self) -> Dict:
+        return {
+            "reasoning": self.reasoning,
+            "food_items": [item.to_dict() for item in self.food_items],
+            "total": self.total,
+            "reported_total": self.reported_total,
+            "consistent": self.consistent,
+            "warnings": list(self.warnings),
+        }
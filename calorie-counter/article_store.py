@@ -0,0 +1,178 @@
+"""
+爬取文章的本機儲存
+由背景爬蟲程序（crawl_scheduler.py）寫入，伺服器的請求處理只讀取，不會對外連線。
+使用 SQLite 的 WAL 模式，多個 gunicorn worker 讀取時不會被爬蟲的寫入阻擋。
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS article (
+    site TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (site, position)
+);
+CREATE TABLE IF NOT EXISTS crawl_state (
+    site TEXT PRIMARY KEY,
+    last_attempt REAL,
+    last_success REAL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    next_crawl REAL NOT NULL DEFAULT 0,
+    article_count INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+"""
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def _article(row: sqlite3.Row) -> Dict:
+    return {
+        "title": row["title"],
+        "content": row["content"],
+        "source": row["source"],
+        "url": row["url"],
+        "timestamp": _isoformat(row["fetched_at"]),
+        "category": "scraped",
+    }
+
+
+class ArticleStore:
+    def __init__(self, path: Optional[str] = None):
+        # 在建立時才讀取環境變數，.env 由呼叫端先行載入
+        self.path = path or os.getenv(
+            'CALORIE_ARTICLE_DB',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'articles.db'),
+        )
+        self._initialised = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作使用新的連線，可在多個執行緒與程序之間安全共用
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        if not self._initialised:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialised = True
+        return conn
+
+    def _ensure_directory(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def replace_site_articles(self, site: str, articles: List[Dict], next_crawl: float,
+                              now: Optional[float] = None) -> None:
+        """以本次爬取結果取代該網站的文章，並記錄成功時間與下次爬取時間"""
+        now = time.time() if now is None else now
+        self._ensure_directory()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM article WHERE site = ?", (site,))
+                conn.executemany(
+                    "INSERT INTO article (site, position, title, content, source, url, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(site, i, a["title"], a.get("content", ""), a.get("source", site), a.get("url", ""), now)
+                     for i, a in enumerate(articles)],
+                )
+                conn.execute(
+                    "INSERT INTO crawl_state (site, last_attempt, last_success, failures, next_crawl, article_count, last_error) "
+                    "VALUES (?, ?, ?, 0, ?, ?, NULL) "
+                    "ON CONFLICT(site) DO UPDATE SET last_attempt = excluded.last_attempt, "
+                    "last_success = excluded.last_success, failures = 0, next_crawl = excluded.next_crawl, "
+                    "article_count = excluded.article_count, last_error = NULL",
+                    (site, now, now, next_crawl, len(articles)),
+                )
+        finally:
+            conn.close()
+
+    def record_failure(self, site: str, error: str, next_crawl: float, now: Optional[float] = None) -> None:
+        """記錄爬取失敗並保留上次的文章"""
+        now = time.time() if now is None else now
+        self._ensure_directory()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO crawl_state (site, last_attempt, failures, next_crawl, last_error) "
+                    "VALUES (?, ?, 1, ?, ?) "
+                    "ON CONFLICT(site) DO UPDATE SET last_attempt = excluded.last_attempt, "
+                    "failures = failures + 1, next_crawl = excluded.next_crawl, last_error = excluded.last_error",
+                    (site, now, next_crawl, error),
+                )
+        finally:
+            conn.close()
+
+    def due_sites(self, sites: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """回傳已到下次爬取時間（或從未爬取過）的網站"""
+        now = time.time() if now is None else now
+        states = self.crawl_state()
+        return [site for site in sites if site not in states or states[site]["next_crawl"] <= now]
+
+    def crawl_state(self) -> Dict[str, Dict]:
+        """各網站的爬取狀態（時間為 Unix timestamp）"""
+        if not os.path.exists(self.path):
+            return {}
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM crawl_state").fetchall()
+        finally:
+            conn.close()
+        return {row["site"]: dict(row) for row in rows}
+
+    def freshness(self) -> Dict[str, Dict]:
+        """各網站最近一次成功爬取的時間與狀態，供 API 回傳"""
+        return {
+            site: {
+                "last_success": _isoformat(state["last_success"]),
+                "last_attempt": _isoformat(state["last_attempt"]),
+                "next_crawl": _isoformat(state["next_crawl"]),
+                "failures": state["failures"],
+                "articles": state["article_count"],
+                "last_error": state["last_error"],
+            }
+            for site, state in sorted(self.crawl_state().items())
+        }
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """在已爬取的文章中搜尋標題或內容包含查詢字串的文章（英文不分大小寫）"""
+        if not os.path.exists(self.path):
+            return []
+        needle = query.strip().lower()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT title, content, source, url, fetched_at FROM article "
+                "WHERE instr(lower(title), ?) > 0 OR instr(lower(content), ?) > 0 "
+                "ORDER BY site, position LIMIT ?",
+                (needle, needle, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_article(row) for row in rows]
+
+    def site_articles(self, site: str) -> List[Dict]:
+        """該網站目前的文章，依頁面上的順序"""
+        if not os.path.exists(self.path):
+            return []
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT title, content, source, url, fetched_at FROM article WHERE site = ? ORDER BY position",
+                (site,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_article(row) for row in rows]
@@ -1,23 +1,117 @@
-from openai import OpenAI
 from dotenv import load_dotenv
-import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import glob
 import json
+import os
 import sys
+import time
+
+from analysis_result import CalorieAnalysis, FoodEstimate
+from image_cache import ImageResultCache
+from image_preprocess import prepare_image
+from metrics import MetricsRegistry
+from openai_client import CircuitOpenError, ResilientOpenAIClient
+from phash_index import PerceptualHashIndex, dhash
+from single_flight import SingleFlight
+from vision_backends import VisionRequest, create_backend
 
 load_dotenv()
-client = OpenAI()
 
-def get_calories_from_image(image_path):
-    with open(image_path, "rb") as image:
-        base64_image = base64.b64encode(image.read()).decode("utf-8")
+# 各 worker 的統計數據寫到共用目錄，由 /metrics 加總；設為空字串則只統計本程序
+metrics = MetricsRegistry(
+    os.getenv('CALORIE_METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'metrics')),
+)
+vision_requests = metrics.counter("calorie_vision_requests_total", "視覺模型呼叫次數")
+vision_latency = metrics.histogram(
+    "calorie_vision_latency_seconds", "視覺模型呼叫耗時（秒）",
+    [0.5, 1, 2, 4, 8, 16, 32, 64],
+)
+vision_upload_bytes = metrics.histogram(
+    "calorie_vision_upload_bytes", "送出的圖片大小（base64 編碼後的位元組數）",
+    [16384, 65536, 131072, 262144, 524288, 1048576, 4194304, 16777216],
+)
+vision_tokens = metrics.counter("calorie_vision_tokens_total", "視覺模型使用的 token 數")
+vision_cost = metrics.counter("calorie_vision_cost_usd_total", "依 token 單價估算的費用（美元）")
+vision_retries = metrics.counter("calorie_vision_retries_total", "OpenAI 呼叫重試次數")
+analysis_cache_lookups = metrics.counter("calorie_analysis_cache_lookups_total", "分析結果快取查詢次數")
+circuit_events = metrics.counter("calorie_openai_circuit_events_total", "OpenAI 斷路器開啟、關閉與拒絕呼叫的次數")
+circuit_open = metrics.gauge("calorie_openai_circuit_open", "斷路器未關閉（開啟或等待試探呼叫）的程序數")
+
+# 每 100 萬 token 的美元單價 (輸入, 輸出)，模型名稱以前綴比對，例如 gpt-4o-2024-08-06
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+def _record_circuit_event(event):
+    circuit_events.inc(event=event)
+    if event != "rejected":
+        circuit_open.set(1 if event == "opened" else 0)
+
+# 每次嘗試的逾時、整體期限、429/5xx 重試次數與斷路器門檻
+client = ResilientOpenAIClient(
+    timeout=float(os.getenv('CALORIE_OPENAI_TIMEOUT', '20')),
+    deadline=float(os.getenv('CALORIE_OPENAI_DEADLINE', '45')),
+    max_retries=int(os.getenv('CALORIE_OPENAI_MAX_RETRIES', '2')),
+    failure_threshold=int(os.getenv('CALORIE_OPENAI_CIRCUIT_FAILURES', '5')),
+    reset_timeout=float(os.getenv('CALORIE_OPENAI_CIRCUIT_RESET', '30')),
+    on_retry=lambda error: vision_retries.inc(reason=type(error).__name__),
+    on_circuit_event=_record_circuit_event,
+)
+
+MODEL = "gpt-4o"
+
+if os.getenv('CALORIE_PRICE_INPUT_PER_1M') or os.getenv('CALORIE_PRICE_OUTPUT_PER_1M'):
+    MODEL_PRICES[MODEL] = (
+        float(os.getenv('CALORIE_PRICE_INPUT_PER_1M', MODEL_PRICES[MODEL][0])),
+        float(os.getenv('CALORIE_PRICE_OUTPUT_PER_1M', MODEL_PRICES[MODEL][1])),
+    )
+
+VISION_BACKEND = os.getenv('CALORIE_VISION_BACKEND', 'openai')
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        response_format={"type": "json_object"},
-        messages=[
-            {
-                "role": "system",
-                "content": """You are a dietitian. A user sends you an image of a meal and you tell them how many calories are in it. Use the following JSON format:
+# 視覺模型後端：openai（預設）、record（呼叫模型並錄製回應）或 replay（只重播錄製的回應）
+backend = create_backend(
+    VISION_BACKEND,
+    client,
+    os.getenv('CALORIE_REPLAY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings')),
+)
+
+# 近似重複的照片（例如同一款便當）重用先前的分析結果，距離設為負數時停用
+phash_index = PerceptualHashIndex(
+    os.getenv('CALORIE_PHASH_INDEX', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'phash.idx')),
+    max_distance=int(os.getenv('CALORIE_PHASH_MAX_DISTANCE', '3')),
+)
+# 索引檔在背景讀入，第一個請求不必等待
+if phash_index.enabled:
+    phash_index.load_in_background()
+
+# 相同圖片重複上傳時直接回傳先前的分析結果；被淘汰的項目一併從相似度索引移除
+image_cache = ImageResultCache(
+    os.getenv('CALORIE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'analyses')),
+    max_entries=int(os.getenv('CALORIE_CACHE_MAX_ENTRIES', '1000')),
+    on_evict=phash_index.remove,
+)
+
+# 相同圖片同時只呼叫一次模型；設定鎖目錄時也在多個 worker 之間合併，設為空字串則只在程序內合併
+single_flight = SingleFlight(
+    os.getenv('CALORIE_SINGLEFLIGHT_LOCK_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'locks')),
+)
+
+def _read_image_bytes(image):
+    """接受檔案路徑、bytes 或檔案物件，回傳圖片內容"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    if hasattr(image, "read"):
+        return image.read()
+    with open(image, "rb") as f:
+        return f.read()
+
+def _build_messages(prepared):
+    return [
+        {
+            "role": "system",
+            "content": """You are a dietitian. A user sends you an image of a meal and you tell them how many calories are in it. Use the following JSON format:
 
 {
     "reasoning": "reasoning for the total calories",
@@ -29,34 +123,360 @@ def get_calories_from_image(image_path):
     ],
     "total": "total calories in the meal"
 }"""
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "How many calories is in this meal?"
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": "How many calories is in this meal?"
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": prepared.data_url()
                     }
-                ]
-            },
-        ],
-    )
+                }
+            ]
+        },
+    ]
+
+def _lookup_cached(image_bytes, use_cache):
+    """查詢完全相同與近似重複的快取結果，回傳 (快取鍵, 感知雜湊, 快取結果)"""
+    cache_key = image_cache.key_for(image_bytes)
+    if use_cache:
+        cached = image_cache.get(cache_key)
+        if cached is not None:
+            analysis_cache_lookups.inc(result="hit")
+            return cache_key, None, cached
+
+    image_hash = dhash(image_bytes) if phash_index.enabled else None
+    if use_cache and image_hash is not None:
+        # 由近至遠嘗試，其他 worker 已淘汰的結果從索引移除後改用下一個
+        for similar_key, _ in phash_index.matches(image_hash):
+            similar = image_cache.get(similar_key, record_stats=False)
+            if similar is None:
+                phash_index.remove([similar_key])
+                continue
+            image_cache.put(cache_key, similar)
+            analysis_cache_lookups.inc(result="similar")
+            return cache_key, image_hash, similar
+
+    if use_cache:
+        analysis_cache_lookups.inc(result="miss")
+    return cache_key, image_hash, None
+
+def _prepare(image_bytes):
+    # 縮小並重新編碼後再送出，降低上傳量與圖片 token 成本
+    prepared = prepare_image(image_bytes)
+    print(f"圖片預處理: {prepared.original_bytes} -> {len(prepared.data)} bytes "
+          f"(節省 {prepared.bytes_saved} bytes)，耗時 {prepared.elapsed_ms:.1f} ms", file=sys.stderr)
+    return prepared
+
+def estimate_cost(model, usage):
+    """依 token 用量估算美元費用，未知模型回傳 None"""
+    if not usage:
+        return None
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return None
+    input_price, output_price = MODEL_PRICES[max(matches, key=len)]
+    return ((usage.get("prompt_tokens") or 0) * input_price
+            + (usage.get("completion_tokens") or 0) * output_price) / 1_000_000
+
+def _record_vision_call(prepared, started, response=None, error=None, aborted=False):
+    """記錄單次模型呼叫的耗時、上傳量、token 與費用；aborted 表示用戶端在串流途中離線"""
+    if isinstance(error, CircuitOpenError):
+        # 斷路器拒絕的呼叫沒有送出，不計入耗時與上傳量
+        vision_requests.inc(model=MODEL, backend=VISION_BACKEND, outcome="circuit_open")
+        print(f"模型呼叫略過: {str(error)}", file=sys.stderr)
+        return
+    elapsed = time.perf_counter() - started
+    # data URL 以 base64 編碼，實際上傳量約為原始大小的 4/3
+    upload_bytes = (len(prepared.data) + 2) // 3 * 4
+    model = response.model if response is not None else MODEL
+    outcome = "aborted" if aborted else "error" if error is not None else "success"
+
+    vision_requests.inc(model=model, backend=VISION_BACKEND, outcome=outcome)
+    vision_latency.observe(elapsed, backend=VISION_BACKEND, outcome=outcome)
+    vision_upload_bytes.observe(upload_bytes, backend=VISION_BACKEND)
+    if aborted:
+        print(f"模型呼叫中斷: 用戶端已離線，耗時 {elapsed:.2f} 秒", file=sys.stderr)
+        return
+    if response is None:
+        print(f"模型呼叫失敗: {type(error).__name__}，耗時 {elapsed:.2f} 秒", file=sys.stderr)
+        return
+
+    usage = response.usage or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    vision_tokens.inc(prompt_tokens, model=model, backend=VISION_BACKEND, kind="prompt")
+    vision_tokens.inc(completion_tokens, model=model, backend=VISION_BACKEND, kind="completion")
+    cost = estimate_cost(model, usage)
+    if cost is not None:
+        vision_cost.inc(cost, model=model, backend=VISION_BACKEND)
+
+    cost_text = f"${cost:.4f}" if cost is not None else "未知"
+    print(f"模型呼叫: {model}，耗時 {elapsed:.2f} 秒，上傳 {upload_bytes} bytes，"
+          f"tokens {prompt_tokens}/{completion_tokens}，重試 {response.retries} 次，費用 {cost_text}", file=sys.stderr)
+
+def _store(cache_key, image_hash, calories):
+    image_cache.put(cache_key, calories)
+    if image_hash is not None:
+        phash_index.add(image_hash, cache_key)
+
+def get_calories_from_image(image, use_cache=True):
+    image_bytes = _read_image_bytes(image)
+
+    cache_key, image_hash, cached = _lookup_cached(image_bytes, use_cache)
+    if cached is not None:
+        return CalorieAnalysis.from_model_output(cached)
+
+    def analyse():
+        # 取得跨程序鎖後再查一次快取，其他 worker 可能剛分析完同一張圖片
+        if use_cache and single_flight.shared:
+            cached = image_cache.get(cache_key, record_stats=False)
+            if cached is not None:
+                return cached
+
+        prepared = _prepare(image_bytes)
+
+        started = time.perf_counter()
+        try:
+            response = backend.complete(VisionRequest(cache_key, MODEL, _build_messages(prepared)))
+        except Exception as e:
+            _record_vision_call(prepared, started, error=e)
+            raise
+        _record_vision_call(prepared, started, response)
+
+        calories = json.loads(response.content)
+        _store(cache_key, image_hash, calories)
+
+        return calories
+
+    # 快取保存模型原始輸出，回傳前才正規化
+    return CalorieAnalysis.from_model_output(single_flight.do(cache_key, analyse))
+
+class FoodItemStreamParser:
+    """從逐段輸出的 JSON 文字中，取出每個已完整的 food_items 項目"""
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._array_depth = None
+        self._item_start = None
+
+    def feed(self, chunk):
+        """加入新的文字片段，回傳此次新完成的食物項目"""
+        self._text += chunk
+        text = self._text
+        items = []
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        # 最外層物件中最後出現的字串，緊接著 [ 時即為鍵名
+                        self._last_key = text[self._string_start:i + 1]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._last_key == '"food_items"':
+                    self._array_depth = self._depth
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif ch in "}]":
+                if ch == "}" and self._item_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        items.append(json.loads(text[self._item_start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._item_start = None
+                elif ch == "]" and self._depth == self._array_depth:
+                    self._array_depth = None
+                self._depth -= 1
+
+        self._pos = len(text)
+        return items
+
+def _events_from_output(output):
+    analysis = CalorieAnalysis.from_model_output(output)
+    for item in analysis.food_items:
+        yield "item", item
+    yield "result", analysis
+
+def stream_calories_from_image(image, use_cache=True):
+    """以串流方式分析圖片，依序產生 ("item", FoodEstimate) 事件，最後產生 ("result", CalorieAnalysis)"""
+    image_bytes = _read_image_bytes(image)
+
+    cache_key, image_hash, cached = _lookup_cached(image_bytes, use_cache)
+    if cached is not None:
+        yield from _events_from_output(cached)
+        return
+
+    with single_flight.claim(cache_key) as call:
+        if not call.leader:
+            # 相同圖片正在分析中，等待結果後一次送出
+            yield from _events_from_output(call.wait())
+            return
+
+        if use_cache and single_flight.shared:
+            cached = image_cache.get(cache_key, record_stats=False)
+            if cached is not None:
+                call.result = cached
+                yield from _events_from_output(cached)
+                return
+
+        prepared = _prepare(image_bytes)
+
+        parser = FoodItemStreamParser()
+        started = time.perf_counter()
+        stream = backend.stream(VisionRequest(cache_key, MODEL, _build_messages(prepared)))
+        try:
+            while True:
+                # 串流結束時，產生器的回傳值為含 token 用量的完整回應
+                try:
+                    delta = next(stream)
+                except StopIteration as stop:
+                    response = stop.value
+                    break
+                for item in parser.feed(delta):
+                    yield "item", FoodEstimate.from_model_output(item)
+        except GeneratorExit:
+            # 用戶端中斷連線時產生器被關閉，模型可能已開始計費，仍須記錄這次呼叫
+            stream.close()
+            _record_vision_call(prepared, started, aborted=True)
+            raise
+        except Exception as e:
+            _record_vision_call(prepared, started, error=e)
+            raise
+        _record_vision_call(prepared, started, response)
+
+        output = json.loads(response.content)
+        _store(cache_key, image_hash, output)
+        call.result = output
+
+    yield "result", CalorieAnalysis.from_model_output(output)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".heic"}
+
+def find_images(patterns):
+    """展開檔案、目錄（遞迴）與 glob 樣式，回傳排序後的圖片路徑"""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        paths.add(os.path.normpath(os.path.join(root, name)))
+        elif glob.has_magic(pattern):
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path):
+                    paths.add(os.path.normpath(path))
+        else:
+            paths.add(os.path.normpath(pattern))
+    return sorted(paths)
+
+def iter_calories_from_images(paths, concurrency=4, use_cache=True):
+    """並行分析多張圖片，依完成順序產生 (路徑, 結果, 錯誤訊息)"""
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(get_calories_from_image, path, use_cache): path for path in paths}
+        try:
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    yield path, future.result(), None
+                except Exception as e:
+                    yield path, None, str(e)
+        finally:
+            # 中斷時取消尚未開始的分析
+            for future in futures:
+                future.cancel()
+
+def _completed_images(output_path):
+    """讀取既有輸出檔中已成功分析的圖片，用於中斷後續跑"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 中斷時可能留下寫到一半的最後一行
+                continue
+            if "calories" in record:
+                done.add(record["image"])
+    return done
+
+def main():
+    parser = argparse.ArgumentParser(description="分析餐點圖片的卡路里")
+    parser.add_argument("images", nargs="+", help="圖片路徑、目錄或 glob 樣式")
+    parser.add_argument("-o", "--output", help="NDJSON 輸出檔；已存在時跳過其中已成功分析的圖片")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="同時分析的圖片數量")
+    parser.add_argument("--no-cache", action="store_true", help="忽略快取重新分析（例如更換提示詞後）")
+    args = parser.parse_args()
+
+    paths = find_images(args.images)
+
+    # 單張圖片且未指定輸出檔時，維持原本的輸出格式
+    if len(paths) == 1 and not args.output and not os.path.isdir(args.images[0]):
+        calories = get_calories_from_image(paths[0], use_cache=not args.no_cache)
+        print(json.dumps(calories.to_dict(), indent=4, ensure_ascii=False))
+        return
+
+    if args.output:
+        done = _completed_images(args.output)
+        pending = [path for path in paths if path not in done]
+        output = open(args.output, "a", encoding="utf-8")
+        if output.tell() > 0:
+            with open(args.output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    output.write("\n")
+    else:
+        pending = paths
+        output = sys.stdout
+
+    print(f"共 {len(paths)} 張圖片，待分析 {len(pending)} 張", file=sys.stderr)
 
-    response_message = response.choices[0].message
-    content = response_message.content
+    failed = 0
+    try:
+        for count, (path, calories, error) in enumerate(
+                iter_calories_from_images(pending, args.concurrency, not args.no_cache), 1):
+            record = {"image": path}
+            if error is None:
+                record["calories"] = calories.to_dict()
+            else:
+                record["error"] = error
+                failed += 1
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            if count % 100 == 0:
+                print(f"已完成 {count}/{len(pending)} 張", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("已中斷，重新執行相同指令即可從中斷處繼續", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if output is not sys.stdout:
+            output.close()
 
-    return json.loads(content)
+    print(f"完成，失敗 {failed} 張", file=sys.stderr)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("使用方法: python calorie_counter.py <圖片路徑>")
-        sys.exit(1)
-    image_path = sys.argv[1]
-    calories = get_calories_from_image(image_path)
-    print(json.dumps(calories, indent=4))
+    # 命令列執行不提供 /metrics，不寫入網站共用的統計目錄
+    metrics.directory = None
+    main()
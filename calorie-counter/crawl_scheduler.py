@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+背景爬蟲排程程序
+定期並行爬取 AdvancedNutritionScraper.fitness_sites，把文章寫入 ArticleStore，
+伺服器的 /api/nutrition/search 與 /api/nutrition/scrape-websites 只讀取本機資料。
+爬取失敗的網站以指數退避延後重試，成功時間記錄在 crawl_state 表格。
+
+    python3 crawl_scheduler.py          # 常駐執行（systemd: config/calorieapp-crawler.service）
+    python3 crawl_scheduler.py --once   # 爬取一次已到期的網站後結束
+"""
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+from advanced_scraper import AdvancedNutritionScraper
+from article_store import ArticleStore
+
+load_dotenv()
+
+CRAWL_INTERVAL = float(os.getenv('CALORIE_CRAWL_INTERVAL', str(6 * 3600)))
+CRAWL_RETRY_DELAY = float(os.getenv('CALORIE_CRAWL_RETRY_DELAY', '300'))
+CRAWL_MAX_BACKOFF = float(os.getenv('CALORIE_CRAWL_MAX_BACKOFF', str(24 * 3600)))
+
+
+class CrawlScheduler:
+    def __init__(self, scraper: AdvancedNutritionScraper, store: ArticleStore,
+                 interval: float = CRAWL_INTERVAL, retry_delay: float = CRAWL_RETRY_DELAY,
+                 max_backoff: float = CRAWL_MAX_BACKOFF, poll_interval: float = 60.0):
+        self.scraper = scraper
+        self.store = store
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+
+    def _backoff(self, failures: int) -> float:
+        # 指數退避並加上隨機抖動，避免多個網站在同一時間重試
+        delay = min(self.max_backoff, self.retry_delay * 2 ** (failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def crawl_site(self, site_name: str, site_info: Dict) -> bool:
+        """爬取單一網站並寫入儲存；失敗時保留舊文章並安排退避後重試"""
+        started = time.time()
+        try:
+            # 同一主機的請求之間保持間隔，背景程序等到輪到為止
+            self.scraper.rate_limiter.acquire(urlparse(site_info['base_url']).netloc)
+            articles = self.scraper.fetch_site_articles(site_name, site_info)
+            if not articles:
+                # 頁面改版或被擋時通常仍回傳 200，不以空結果覆蓋上次的文章
+                raise ValueError("頁面中沒有找到文章")
+        except Exception as e:
+            # 只有這個程序會寫入爬取狀態，讀取後再更新不會互相覆蓋
+            failures = self.store.crawl_state().get(site_name, {}).get("failures", 0) + 1
+            next_crawl = started + self._backoff(failures)
+            self.store.record_failure(site_name, str(e), next_crawl, now=started)
+            print(f"爬取 {site_name} 失敗（連續 {failures} 次），{next_crawl - started:.0f} 秒後重試: {str(e)}")
+            return False
+
+        # 下次爬取時間加上 ±10% 抖動，分散各網站的請求
+        next_crawl = started + self.interval * random.uniform(0.9, 1.1)
+        self.store.replace_site_articles(site_name, articles, next_crawl, now=started)
+        print(f"爬取 {site_name} 完成: {len(articles)} 篇文章，耗時 {time.time() - started:.1f} 秒")
+        return True
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, bool]:
+        """並行爬取所有已到期的網站；回傳 {網站: 是否成功}"""
+        sites = self.scraper.fitness_sites
+        due = self.store.due_sites(sites, now)
+        if not due:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(len(due), self.scraper.max_workers),
+                                thread_name_prefix="crawler") as executor:
+            futures = {site: executor.submit(self.crawl_site, site, sites[site]) for site in due}
+        return {site: future.result() for site, future in futures.items()}
+
+    def run_forever(self) -> None:
+        print(f"爬蟲排程啟動：每 {self.interval:.0f} 秒爬取 {len(self.scraper.fitness_sites)} 個網站，"
+              f"文章存放於 {self.store.path}")
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                # 儲存暫時無法寫入等錯誤不應讓常駐程序結束
+                print(f"爬蟲排程發生錯誤: {str(e)}")
+            time.sleep(self.poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="定期爬取健身網站的營養文章")
+    parser.add_argument("--once", action="store_true", help="爬取一次已到期的網站後結束")
+    parser.add_argument("--force", action="store_true", help="忽略下次爬取時間，立即爬取所有網站（搭配 --once）")
+    args = parser.parse_args()
+
+    scheduler = CrawlScheduler(AdvancedNutritionScraper(), ArticleStore())
+    if args.once:
+        results = scheduler.run_once(now=float("inf") if args.force else None)
+        print(f"完成: {sum(results.values())}/{len(results)} 個網站成功")
+        return
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
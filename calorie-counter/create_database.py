@@ -73,6 +73,28 @@ def create_database():
             """
             cursor.execute(create_food_item_table)
             print("food_item 表格建立成功！")
+
+            # 每日彙總表格（由應用程式於儲存/刪除餐點時增量更新）
+            create_daily_calorie_rollup_table = """
+            CREATE TABLE IF NOT EXISTS daily_calorie_rollup (
+                day DATE PRIMARY KEY,
+                total_calories INT NOT NULL DEFAULT 0,
+                meal_count INT NOT NULL DEFAULT 0
+            )
+            """
+            cursor.execute(create_daily_calorie_rollup_table)
+            
+            create_daily_food_rollup_table = """
+            CREATE TABLE IF NOT EXISTS daily_food_rollup (
+                day DATE NOT NULL,
+                food_name VARCHAR(100) NOT NULL,
+                calories INT NOT NULL DEFAULT 0,
+                item_count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, food_name)
+            )
+            """
+            cursor.execute(create_daily_food_rollup_table)
+            print("每日彙總表格建立成功！")
             
             # 建立索引 (MySQL 不支援 IF NOT EXISTS 語法)
             try:
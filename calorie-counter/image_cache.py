@@ -0,0 +1,122 @@
+"""
+圖片分析結果快取
+以圖片內容的 SHA-256 作為鍵，將分析結果以 JSON 檔案存放在磁碟上
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+def write_json_atomic(path: str, value) -> None:
+    """寫入 JSON 檔案；先寫入暫存檔再原子替換，避免其他 worker 讀到寫一半的檔案"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ImageResultCache:
+    def __init__(self, directory: str, max_entries: int = 1000,
+                 on_evict: Optional[Callable[[List[str]], None]] = None):
+        self.directory = directory
+        self.max_entries = max_entries
+        # 淘汰項目後以被淘汰的鍵呼叫，讓相似度索引一併移除
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key_for(data: bytes) -> str:
+        """計算圖片內容的快取鍵"""
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str, record_stats: bool = True) -> Optional[Dict]:
+        """取得快取結果，找不到時回傳 None"""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            # 以檔案修改時間作為 LRU 依據，命中時更新
+            os.utime(path)
+        except (OSError, ValueError):
+            if record_stats:
+                with self._lock:
+                    self.misses += 1
+            return None
+
+        if record_stats:
+            with self._lock:
+                self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict) -> None:
+        """寫入快取結果，超過上限時淘汰最久未使用的項目"""
+        if not self.enabled:
+            return
+
+        write_json_atomic(self._path(key), value)
+        self._evict()
+
+    def _evict(self) -> None:
+        """淘汰超出上限的最舊項目"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".json"):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            continue
+        except OSError:
+            return
+
+        overflow = len(entries) - self.max_entries
+        if overflow <= 0:
+            return
+
+        entries.sort()
+        evicted = []
+        for _, path in entries[:overflow]:
+            try:
+                os.remove(path)
+            except OSError:
+                # 可能已被其他 worker 刪除
+                pass
+            evicted.append(os.path.basename(path)[:-len(".json")])
+        if self.on_evict is not None:
+            self.on_evict(evicted)
+
+    def stats(self) -> Dict:
+        """回傳命中統計"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,121 @@
+"""
+圖片預處理
+在送往視覺模型前解碼圖片、套用 EXIF 方向、縮小到指定最長邊並重新編碼
+"""
+
+import base64
+import io
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 為選用套件，未安裝時直接送出原圖
+    Image = None
+    ImageOps = None
+
+MAX_EDGE = int(os.getenv('CALORIE_IMAGE_MAX_EDGE', '1024'))
+OUTPUT_FORMAT = os.getenv('CALORIE_IMAGE_FORMAT', 'JPEG').upper()
+QUALITY = int(os.getenv('CALORIE_IMAGE_QUALITY', '85'))
+
+_FORMAT_MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+}
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    elapsed_ms: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    def data_url(self) -> str:
+        encoded = base64.b64encode(self.data).decode("utf-8")
+        return f"data:{self.mime_type};base64,{encoded}"
+
+
+class InvalidImageError(ValueError):
+    """內容不是可辨識的圖片"""
+
+
+def verify_image(data: bytes) -> None:
+    """確認內容是 Pillow 可辨識的圖片（只讀取檔頭），否則拋出 InvalidImageError；未安裝 Pillow 時不檢查"""
+    if Image is None:
+        return
+    try:
+        with Image.open(io.BytesIO(data)):
+            pass
+    except Exception as e:
+        raise InvalidImageError("Unsupported or invalid image") from e
+
+
+def sniff_mime_type(data: bytes) -> str:
+    """依檔案開頭的魔術數字判斷圖片格式"""
+    if data.startswith(b"\xff\xd8\xff"):
+        return 'image/jpeg'
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return 'image/png'
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return 'image/webp'
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return 'image/gif'
+    return 'image/jpeg'
+
+
+def prepare_image(data: bytes, max_edge: int = MAX_EDGE, output_format: str = OUTPUT_FORMAT,
+                  quality: int = QUALITY) -> PreparedImage:
+    """縮小並重新編碼圖片，無法處理時回傳原圖；安裝 Pillow 時無法辨識的內容拋出 InvalidImageError，不送往模型"""
+    start = time.perf_counter()
+    mime_type = None
+
+    def passthrough() -> PreparedImage:
+        return PreparedImage(data, mime_type or sniff_mime_type(data), len(data),
+                             (time.perf_counter() - start) * 1000)
+
+    if Image is None:
+        return passthrough()
+
+    try:
+        img = Image.open(io.BytesIO(data))
+    except Exception as e:
+        raise InvalidImageError("Unsupported or invalid image") from e
+    mime_type = Image.MIME.get(img.format)
+    if max_edge <= 0:
+        img.close()
+        return passthrough()
+
+    try:
+        with img:
+            original_size = img.size
+            # JPEG 可在解碼時直接縮小，避免解出整張手機照片
+            img.draft("RGB", (max_edge, max_edge))
+            rotated = img.getexif().get(0x0112, 1) != 1
+            oriented = ImageOps.exif_transpose(img)
+            if oriented.mode not in ("RGB", "L"):
+                oriented = oriented.convert("RGB")
+            oriented.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            resized = max(original_size) > max_edge
+
+            buffer = io.BytesIO()
+            oriented.save(buffer, format=output_format, quality=quality)
+    except Exception as e:
+        print(f"圖片預處理失敗，改送原圖: {str(e)}", file=sys.stderr)
+        return passthrough()
+
+    encoded = buffer.getvalue()
+    # 已經夠小且方向正確的圖片重新編碼反而變大時，保留原圖
+    if len(encoded) >= len(data) and not resized and not rotated:
+        return passthrough()
+
+    return PreparedImage(encoded, _FORMAT_MIME_TYPES.get(output_format, 'image/jpeg'), len(data),
+                         (time.perf_counter() - start) * 1000)
@@ -0,0 +1,130 @@
+"""
+餐點歷史趨勢分析
+把餐點與食物項目載入為 NumPy 欄位陣列後以向量運算統計，數年的記錄也能在單次請求內完成
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+@dataclass
+class MealHistory:
+    meal_times: np.ndarray      # datetime64[m]，已換算為使用者時區
+    meal_calories: np.ndarray   # int64
+    food_times: np.ndarray      # datetime64[m]，所屬餐點的時間
+    food_names: np.ndarray      # str
+    food_calories: np.ndarray   # int64
+
+    @classmethod
+    def from_rows(cls, meal_rows: Iterable[Tuple[datetime, int]], food_rows: Iterable[Tuple[datetime, str, int]],
+                  utc_offset_minutes: int = 0) -> "MealHistory":
+        """由 (時間, 總熱量) 與 (餐點時間, 食物名稱, 熱量) 查詢結果建立欄位陣列；資料庫時間為 UTC"""
+        meal_rows = list(meal_rows)
+        food_rows = list(food_rows)
+        offset = np.timedelta64(utc_offset_minutes, "m")
+        return cls(
+            meal_times=np.array([row[0] for row in meal_rows], dtype="datetime64[m]") + offset,
+            meal_calories=np.fromiter((row[1] or 0 for row in meal_rows), dtype=np.int64, count=len(meal_rows)),
+            food_times=np.array([row[0] for row in food_rows], dtype="datetime64[m]") + offset,
+            food_names=np.array([row[1] for row in food_rows], dtype=str),
+            food_calories=np.fromiter((row[2] or 0 for row in food_rows), dtype=np.int64, count=len(food_rows)),
+        )
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """以累加和計算移動平均；前 window-1 天以已有的天數平均"""
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    ends = np.arange(1, len(values) + 1)
+    counts = np.minimum(ends, window)
+    return (cumulative[ends] - cumulative[ends - counts]) / counts
+
+
+def analyse_history(history: MealHistory, start: date, end: date, target: Optional[int] = None,
+                    window: int = 7, top: int = 10) -> Dict:
+    """計算每日總熱量與移動平均、星期與時段分布、食物頻率與熱量占比，以及相對目標的赤字/盈餘"""
+    first_day = np.datetime64(start, "D")
+    day_count = int((np.datetime64(end, "D") - first_day).astype(int)) + 1
+
+    def day_indexes(times):
+        index = (times.astype("datetime64[D]") - first_day).astype(np.int64)
+        return index, (index >= 0) & (index < day_count)
+
+    day_index, in_range = day_indexes(history.meal_times)
+    day_index = day_index[in_range]
+    calories = history.meal_calories[in_range]
+    times = history.meal_times[in_range]
+
+    daily_totals = np.bincount(day_index, weights=calories, minlength=day_count)
+    daily_meals = np.bincount(day_index, minlength=day_count)
+    rolling = rolling_mean(daily_totals, window)
+    logged = daily_meals > 0
+
+    # 1970-01-01 為星期四，換算為星期一 = 0
+    all_days = first_day + np.arange(day_count)
+    weekday_of_day = (all_days.astype(np.int64) + 3) % 7
+    weekday_days = np.bincount(weekday_of_day[logged], minlength=7)
+    weekday_calories = np.bincount(weekday_of_day, weights=daily_totals, minlength=7)
+    weekday_meals = np.bincount(weekday_of_day, weights=daily_meals, minlength=7)
+
+    hours = ((times - times.astype("datetime64[D]")).astype(np.int64) // 60).astype(np.int64)
+    hour_meals = np.bincount(hours, minlength=24)
+    hour_calories = np.bincount(hours, weights=calories, minlength=24)
+
+    foods = []
+    _, food_in_range = day_indexes(history.food_times)
+    food_names = history.food_names[food_in_range]
+    if len(food_names):
+        names, inverse, counts = np.unique(food_names, return_inverse=True, return_counts=True)
+        food_totals = np.bincount(inverse, weights=history.food_calories[food_in_range], minlength=len(names))
+        all_calories = food_totals.sum()
+        # 依出現次數、再依熱量排序
+        order = np.lexsort((-food_totals, -counts))[:top]
+        foods = [{
+            "name": str(names[i]),
+            "count": int(counts[i]),
+            "calories": int(food_totals[i]),
+            "average_calories": round(float(food_totals[i] / counts[i]), 1),
+            "calorie_share": round(float(food_totals[i] / all_calories), 4) if all_calories else 0.0,
+        } for i in order]
+
+    result = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "logged_days": int(logged.sum()),
+        "meal_count": int(daily_meals.sum()),
+        "average_daily_calories": round(float(daily_totals[logged].mean()), 1) if logged.any() else None,
+        "daily": [{
+            "date": str(day),
+            "total_calories": int(total),
+            "meal_count": int(meals),
+            "rolling_average": round(float(average), 1),
+        } for day, total, meals, average in zip(all_days, daily_totals, daily_meals, rolling)],
+        "weekdays": [{
+            "weekday": WEEKDAYS[i],
+            "meal_count": int(weekday_meals[i]),
+            "average_calories": round(float(weekday_calories[i] / weekday_days[i]), 1) if weekday_days[i] else None,
+        } for i in range(7)],
+        "hours": [{
+            "hour": hour,
+            "meal_count": int(hour_meals[hour]),
+            "calories": int(hour_calories[hour]),
+        } for hour in range(24)],
+        "foods": foods,
+    }
+
+    if target is not None:
+        # 只比較有記錄的日子，未記錄的日子不視為赤字
+        difference = daily_totals[logged] - target
+        result["target"] = {
+            "daily_target": target,
+            "average_difference": round(float(difference.mean()), 1) if len(difference) else None,
+            "total_difference": int(difference.sum()),
+            "days_over": int((difference > 0).sum()),
+            "days_under": int((difference < 0).sum()),
+        }
+    return result
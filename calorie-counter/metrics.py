@@ -0,0 +1,277 @@
+"""
+Prometheus 格式的計數器與直方圖
+每個 worker 程序定期把自己的數值寫到共用目錄，/metrics 讀取所有檔案加總後輸出，
+因此數值涵蓋所有 gunicorn worker。已結束程序的快照在輸出時併入單一累計檔後刪除，
+worker 重新啟動不會讓目錄中的檔案無限增加。
+"""
+
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+from image_cache import write_json_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，不合併快照
+    fcntl = None
+
+_SNAPSHOT_PATTERN = re.compile(r"^metrics_(\d+)_\d+\.json$")
+ACCUMULATED_FILE = "accumulated.json"
+
+
+def _label_key(labels: Dict[str, str]) -> str:
+    return ",".join(f'{name}="{str(value)}"' for name, value in sorted(labels.items()))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshot(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge_snapshot(total: Dict, snapshot: Dict) -> None:
+    """把一份快照加到 total；計數器直接相加，直方圖的桶數不同時略過"""
+    for name, values in snapshot.items():
+        merged = total.setdefault(name, {})
+        for key, value in values.items():
+            if not isinstance(value, dict):
+                merged[key] = merged.get(key, 0) + value
+                continue
+            state = merged.get(key)
+            if state is None:
+                merged[key] = {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+            elif len(state["buckets"]) == len(value["buckets"]):
+                state["buckets"] = [a + b for a, b in zip(state["buckets"], value["buckets"])]
+                state["sum"] += value["sum"]
+                state["count"] += value["count"]
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.values: Dict[str, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.mark_dirty()
+
+
+class Gauge:
+    """目前的數值（例如斷路器是否開啟）；各 worker 的值相加，已結束程序的值不保留"""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.values: Dict[str, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self.registry.lock:
+            self.values[key] = value
+        self.registry.mark_dirty()
+
+
+class Histogram:
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, buckets: Sequence[float]):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.buckets = list(buckets)
+        # 每組標籤：各桶計數（非累積）、總和、次數
+        self.values: Dict[str, Dict] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self.values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+        self.registry.mark_dirty()
+
+
+class MetricsRegistry:
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._metrics: List = []
+        self._flush_scheduled = False
+        self._pid = None
+        self._snapshot_path = None
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(self, name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        metric = Gauge(self, name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(self, name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def _path(self) -> str:
+        # 檔名含程序 ID 與啟動時間，重新啟動的 worker 不會覆蓋舊的累計值
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._snapshot_path = os.path.join(self.directory, f"metrics_{pid}_{int(time.time() * 1000)}.json")
+        return self._snapshot_path
+
+    def _snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                metric.name: json.loads(json.dumps(metric.values))
+                for metric in self._metrics
+            }
+
+    def mark_dirty(self) -> None:
+        """數值變更後延遲寫入共用目錄，避免每次更新都寫檔"""
+        if not self.directory:
+            return
+        with self.lock:
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        timer = threading.Timer(self.flush_interval, self.flush)
+        timer.daemon = True
+        timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush_scheduled = False
+        if not self.directory:
+            return
+        try:
+            write_json_atomic(self._path(), self._snapshot())
+        except OSError as e:
+            print(f"寫入統計數據失敗: {str(e)}", file=sys.stderr)
+
+    @contextmanager
+    def _directory_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _fold_dead_snapshots(self) -> None:
+        """把已結束程序的快照併入累計檔並刪除；以檔案鎖避免多個 worker 重複合併"""
+        if fcntl is None:
+            return
+        with self._directory_lock():
+            dead = []
+            for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+                match = _SNAPSHOT_PATTERN.match(os.path.basename(path))
+                if match and not _process_alive(int(match.group(1))):
+                    dead.append(path)
+            if not dead:
+                return
+
+            accumulated_path = os.path.join(self.directory, ACCUMULATED_FILE)
+            accumulated = _read_snapshot(accumulated_path) or {}
+            gauges = {metric.name for metric in self._metrics if isinstance(metric, Gauge)}
+            for path in dead:
+                snapshot = _read_snapshot(path) or {}
+                _merge_snapshot(accumulated, {name: values for name, values in snapshot.items() if name not in gauges})
+            # 先寫入累計檔再刪除快照；中途失敗時最多重複計入一次，不會遺失數值
+            write_json_atomic(accumulated_path, accumulated)
+            for path in dead:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+
+    def _collect(self) -> List[Dict]:
+        """收集所有 worker 的快照與已結束程序的累計值，本程序使用記憶體中的最新數值"""
+        snapshots = [self._snapshot()]
+        if not self.directory:
+            return snapshots
+        try:
+            self._fold_dead_snapshots()
+        except OSError as e:
+            print(f"合併統計數據失敗: {str(e)}", file=sys.stderr)
+        own = self._path()
+        paths = glob.glob(os.path.join(self.directory, "metrics_*.json"))
+        for path in [*paths, os.path.join(self.directory, ACCUMULATED_FILE)]:
+            if path == own:
+                continue
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def render(self) -> str:
+        """輸出 Prometheus 文字格式"""
+        totals_by_name: Dict[str, Dict] = {}
+        for snapshot in self._collect():
+            _merge_snapshot(totals_by_name, snapshot)
+        lines = []
+        for metric in self._metrics:
+            if isinstance(metric, (Counter, Gauge)):
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {'counter' if isinstance(metric, Counter) else 'gauge'}")
+                for key, value in sorted(totals_by_name.get(metric.name, {}).items()):
+                    labels = f"{{{key}}}" if key else ""
+                    lines.append(f"{metric.name}{labels} {_format_value(value)}")
+            else:
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} histogram")
+                for key, state in sorted(totals_by_name.get(metric.name, {}).items()):
+                    # 桶的設定變更前寫入的快照無法對應
+                    if len(state["buckets"]) != len(metric.buckets):
+                        continue
+                    prefix = f"{key}," if key else ""
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, state["buckets"]):
+                        cumulative += count
+                        lines.append(f'{metric.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+                    lines.append(f'{metric.name}_bucket{{{prefix}le="+Inf"}} {state["count"]}')
+                    labels = f"{{{key}}}" if key else ""
+                    lines.append(f"{metric.name}_sum{labels} {_format_value(state['sum'])}")
+                    lines.append(f"{metric.name}_count{labels} {state['count']}")
+        return "\n".join(lines) + "\n"
+
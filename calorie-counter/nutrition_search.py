@@ -0,0 +1,534 @@
+"""
+營養資訊搜尋
+以倒排索引搜尋內建營養資料庫與背景爬蟲抓取的文章。英文取單字、中文取相鄰兩字（bigram）與單字作為詞彙；
+同義詞在建立索引時展開為群組詞彙，查詢時不必逐一比對；結果以 BM25 排序，各詞彙的文件依權重預先排序，
+掃描到分數上限不足以進入前幾名時即停止，常見詞彙在十萬篇文章中查詢也不需要逐篇評分；
+很少同時出現的常見詞彙則以位元集合求交集。排序後的列表在加入、移除資料時就地更新。
+英文複數在建立索引與查詢時還原為單數（vitamins → vitamin），索引中沒有的英文詞彙以字首展開（carb → carbohydrates）。
+查無結果時以 SymSpell 拼字字典修正查詢（例如 magnesum、vitamn c）後再搜尋一次，仍無結果時逐筆比對子字串。
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from bisect import bisect_left, insort
+from heapq import heappush, heapreplace
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# 同義詞群組（可視需要擴充）
+SYNONYMS: Dict[str, set] = {
+    'iron': {"iron", "鐵", "鐵質", "fe", "ferrous", "ferric"},
+    'zinc': {"zinc", "鋅"},
+    'magnesium': {"magnesium", "鎂"},
+    'calcium': {"calcium", "鈣", "ca"},
+    'potassium': {"potassium", "鉀", "k"},
+    'vitamin_c': {"vitamin c", "維生素c", "維他命c", "抗壞血酸", "ascorbic acid"},
+    'folate': {"folate", "葉酸", "維生素b9", "vitamin b9"},
+}
+
+# 英文與數字分開，「300mg」、「2000iu」也能以 mg、iu 查詢
+_WORD_PATTERN = re.compile(r"[a-z]+|[0-9]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+# 拼字修正以英文單字或連續的中文為單位
+_QUERY_PIECE_PATTERN = re.compile(r"[a-z]+|[0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+# 營養相關常用字的簡體對應繁體，簡體查詢（例如「维生素」、「铁」）也能命中繁體資料
+_SIMPLIFIED_TO_TRADITIONAL = str.maketrans(
+    "铁镁钙钾锌钠维叶质热营养纤运动补饮议复盐鱼鸡猪虾麦谷粮类压脏肠胆减体坚种软饭汤鲑鳕锰铜铬钴计标摄点训练后强坏构矿单饱饿",
+    "鐵鎂鈣鉀鋅鈉維葉質熱營養纖運動補飲議復鹽魚雞豬蝦麥穀糧類壓臟腸膽減體堅種軟飯湯鮭鱈錳銅鉻鈷計標攝點訓練後強壞構礦單飽餓",
+)
+
+# 標題與分類中的詞彙權重高於內文
+FIELD_WEIGHTS = (("title", 3), ("category", 2), ("content", 1))
+
+
+def normalize(text: str) -> str:
+    """轉為小寫，全形轉半形，常用簡體字轉為繁體"""
+    text = (text or "").lower()
+    if text.isascii():
+        return text
+    return unicodedata.normalize("NFKC", text).translate(_SIMPLIFIED_TO_TRADITIONAL)
+
+
+def singular(word: str) -> str:
+    """英文複數的簡易還原，不求正確拼法（calories → calory），建立索引與查詢時一致套用即可"""
+    if not (word.isascii() and word.isalpha()):
+        return word
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str, unigrams: bool = False) -> List[str]:
+    """英文與數字各自取連續字元，中文取相鄰兩字；只有一個字的中文片段保留單字。
+    建立索引時另外加入中文單字（unigrams=True），單字查詢（例如「鎂」）也能命中較長的片段"""
+    text = normalize(text)
+    if text.isascii():
+        return _WORD_PATTERN.findall(text)
+    tokens = _WORD_PATTERN.findall(text)
+    for run in _CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(map(str.__add__, run, run[1:]))
+            if unigrams:
+                tokens.extend(run)
+    return tokens
+
+
+class InvertedIndex:
+    def __init__(self, synonyms: Optional[Dict[str, Iterable[str]]] = None, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._next_doc = 0
+        self._docs: Dict[Hashable, int] = {}
+        self._entries: Dict[int, Dict] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._total_len = 0
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # 查詢過的詞彙 -> (依權重由高至低排序的 (-權重, 文件), {文件: 權重})，加入與移除資料時就地更新
+        self._ranked: Dict[str, Tuple[List[Tuple[float, int]], Dict[int, float]]] = {}
+        # 多詞彙查詢用過的常見詞彙 -> 文件編號的位元集合，以整數的位元運算求交集
+        self._bits: Dict[str, int] = {}
+        # 排序後的英文詞彙，供字首展開以二分搜尋；新增或刪除詞彙時清除，下次展開時重建
+        self._vocabulary: Optional[List[str]] = None
+
+        # 同義詞群組以 "syn:" 開頭的詞彙表示（一般詞彙不含冒號）；依第一個詞彙分組，建立索引時只檢查資料中出現的詞彙
+        self._variants: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        self._query_groups: Dict[Tuple[str, ...], str] = {}
+        for key, variants in (synonyms or {}).items():
+            for variant in set(variants) | {key}:
+                tokens = tuple(tokenize(variant))
+                if tokens:
+                    self._variants.setdefault(tokens[0], []).append((tokens, f"syn:{key}"))
+                    self._query_groups[tokens] = f"syn:{key}"
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def has_term(self, term: str) -> bool:
+        return term in self._postings
+
+    def _entry_terms(self, entry: Dict) -> Tuple[Dict[str, int], int]:
+        tokens: List[str] = []
+        for field, weight in FIELD_WEIGHTS:
+            tokens.extend(tokenize(entry.get(field) or "", unigrams=True) * weight)
+        counts = Counter(tokens)
+        # 複數另外計入單數詞彙，查詢 vitamin 也能命中只寫 vitamins 的資料
+        for token, tf in list(counts.items()):
+            stem = singular(token)
+            if stem != token:
+                counts[stem] += tf
+        # 包含任一同義詞的資料加上群組詞彙，次數以該同義詞各詞彙的最少次數估計
+        for first in self._variants.keys() & counts.keys():
+            for tokens, group in self._variants[first]:
+                tf = min(counts.get(token, 0) for token in tokens)
+                if tf:
+                    counts[group] += tf
+        return counts, len(tokens)
+
+    def add(self, key: Hashable, entry: Dict) -> None:
+        """加入一筆資料；key 已存在時取代舊資料。加入後請勿修改 entry，移除時會由它重新斷詞"""
+        terms, length = self._entry_terms(entry)
+        with self._lock:
+            self.remove(key)
+            doc = self._next_doc
+            self._next_doc += 1
+            self._docs[key] = doc
+            self._entries[doc] = entry
+            self._doc_len[doc] = length
+            self._total_len += length
+            postings = self._postings
+            for term, tf in terms.items():
+                term_postings = postings.get(term)
+                if term_postings is None:
+                    postings[term] = {doc: tf}
+                    self._vocabulary = None
+                else:
+                    term_postings[doc] = tf
+            if self._ranked:
+                avgdl = self._avgdl()
+                for term in self._ranked.keys() & terms.keys():
+                    ranked, weights = self._ranked[term]
+                    weight = weights[doc] = self._weight(terms[term], length, avgdl)
+                    insort(ranked, (-weight, doc))
+            bit = 1 << doc
+            for term in self._bits.keys() & terms.keys():
+                self._bits[term] |= bit
+
+    def remove(self, key: Hashable) -> bool:
+        """移除一筆資料；不存在時回傳 False"""
+        with self._lock:
+            doc = self._docs.pop(key, None)
+            if doc is None:
+                return False
+            # 由原始資料重新斷詞找出要移除的詞彙，不必為每筆資料另存詞彙表
+            terms, _ = self._entry_terms(self._entries.pop(doc))
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None or postings.pop(doc, None) is None:
+                    continue
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary = None
+                    self._ranked.pop(term, None)
+                    self._bits.pop(term, None)
+                    continue
+                cached = self._ranked.get(term)
+                if cached is not None:
+                    ranked, weights = cached
+                    del ranked[bisect_left(ranked, (-weights.pop(doc), doc))]
+                if term in self._bits:
+                    self._bits[term] &= ~(1 << doc)
+            self._total_len -= self._doc_len.pop(doc)
+            return True
+
+    def _avgdl(self) -> float:
+        return self._total_len / len(self._doc_len) or 1.0
+
+    def _weight(self, tf: int, length: int, avgdl: float) -> float:
+        """BM25 的詞頻部分；平均長度取計算當下的值，資料量增加後的些微差異不影響排序"""
+        return tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avgdl))
+
+    def _ranked_postings(self, term: str) -> Tuple[List[Tuple[float, int]], Dict[int, float]]:
+        cached = self._ranked.get(term)
+        if cached is None:
+            avgdl = self._avgdl()
+            doc_len = self._doc_len
+            weights = {doc: self._weight(tf, doc_len[doc], avgdl) for doc, tf in self._postings[term].items()}
+            ranked = sorted((-weight, doc) for doc, weight in weights.items())
+            cached = self._ranked[term] = (ranked, weights)
+        return cached
+
+    def _doc_bits(self, docs: Iterable[int]) -> int:
+        buffer = bytearray(self._next_doc // 8 + 1)
+        for doc in docs:
+            buffer[doc >> 3] |= 1 << (doc & 7)
+        return int.from_bytes(buffer, "little")
+
+    def _term_bits(self, term: str) -> int:
+        bits = self._bits.get(term)
+        if bits is None:
+            bits = self._bits[term] = self._doc_bits(self._postings[term])
+        return bits
+
+    def _prefix_terms(self, prefix: str) -> Tuple[str, ...]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(term for term in self._postings if term.isascii() and term.isalpha())
+        vocabulary = self._vocabulary
+        start = bisect_left(vocabulary, prefix)
+        end = bisect_left(vocabulary, prefix + "{")  # "{" 是緊接在 "z" 之後的字元
+        return tuple(vocabulary[start:end])
+
+    def _query_terms(self, query: str) -> Optional[List[Tuple[str, ...]]]:
+        """把查詢轉為詞彙組：同義詞群組或單數化的詞彙各為一組；索引中沒有的英文詞彙（三個字母以上）
+        展開為同字首的所有詞彙，同組中任一詞彙出現即算命中。有詞彙組完全沒有命中時回傳 None"""
+        tokens = tuple(tokenize(query))
+        group = self._query_groups.get(tokens)
+        if group:
+            return [(group,)] if group in self._postings else None
+        specs = []
+        for term in dict.fromkeys(map(singular, tokens)):
+            if term in self._postings:
+                specs.append((term,))
+            elif len(term) >= 3 and term.isascii() and term.isalpha() and self._prefix_terms(term):
+                specs.append(self._prefix_terms(term))
+            else:
+                return None
+        return specs
+
+    def _spec_postings(self, spec: Tuple[str, ...]) -> Tuple[List[Tuple[float, int]], Dict[int, float]]:
+        if len(spec) == 1:
+            return self._ranked_postings(spec[0])
+        # 字首展開的詞彙組以各詞彙的最大詞頻計分，只在查詢當下計算，不快取
+        avgdl = self._avgdl()
+        doc_len = self._doc_len
+        tfs: Dict[int, int] = {}
+        for term in spec:
+            for doc, tf in self._postings[term].items():
+                if tf > tfs.get(doc, 0):
+                    tfs[doc] = tf
+        weights = {doc: self._weight(tf, doc_len[doc], avgdl) for doc, tf in tfs.items()}
+        return sorted((-weight, doc) for doc, weight in weights.items()), weights
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (len(self._doc_len) - df + 0.5) / (df + 0.5))
+
+    def entries(self) -> List[Dict]:
+        """所有資料，依加入順序"""
+        with self._lock:
+            return list(self._entries.values())
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[Dict, float]]:
+        """回傳 (資料, 分數) 依相關度排序；查詢屬於同義詞群組時搜尋整個群組，否則須包含所有詞彙"""
+        if limit <= 0:
+            return []
+        with self._lock:
+            specs = self._query_terms(query)
+            if not specs:
+                return []
+            lists = [self._spec_postings(spec) for spec in specs]
+            idfs = [self._idf(len(weights)) for _, weights in lists]
+            if len(specs) > 1 and min(len(ranked) for ranked, _ in lists) > _SCAN_LIMIT:
+                # 常見詞彙很少同時出現時，依權重掃描要走過大半個列表才湊得滿結果；
+                # 先以位元集合求出同時包含所有詞彙的文件，數量不多時直接逐篇評分
+                bits = [self._term_bits(spec[0]) if len(spec) == 1 else self._doc_bits(weights)
+                        for spec, (_, weights) in zip(specs, lists)]
+                candidates = bits[0]
+                for other in bits[1:]:
+                    candidates &= other
+                if candidates.bit_count() <= _SCAN_LIMIT:
+                    top = _score_candidates(_bit_positions(candidates), lists, idfs, limit)
+                    return [(self._entries[doc], score) for score, doc in top]
+            return [(self._entries[doc], score) for score, doc in _top_k(lists, idfs, limit)]
+
+
+# 列表超過此長度且交集不超過此數量時，改以位元集合求交集後逐篇評分
+_SCAN_LIMIT = 2048
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+
+
+def _bit_positions(bits: int) -> Iterable[int]:
+    """位元集合中為 1 的位置；以正規表示式跳過全為 0 的位元組"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for match in _NONZERO_BYTE.finditer(data):
+        base = match.start() * 8
+        byte = data[match.start()]
+        while byte:
+            low = byte & -byte
+            yield base + low.bit_length() - 1
+            byte ^= low
+
+
+def _push(heap: List[Tuple[float, int]], score: float, doc: int, limit: int) -> None:
+    # (分數, -文件) 的最小堆積，同分時文件編號小者優先
+    item = (score, -doc)
+    if len(heap) < limit:
+        heappush(heap, item)
+    elif item > heap[0]:
+        heapreplace(heap, item)
+
+
+def _score_candidates(docs: Iterable[int], lists: List[Tuple[List[Tuple[float, int]], Dict[int, float]]],
+                      idfs: List[float], limit: int) -> List[Tuple[float, int]]:
+    heap: List[Tuple[float, int]] = []
+    for doc in docs:
+        _push(heap, sum(idf * weights[doc] for (_, weights), idf in zip(lists, idfs)), doc, limit)
+    return [(score, -negative_doc) for score, negative_doc in sorted(heap, reverse=True)]
+
+
+def _top_k(lists: List[Tuple[List[Tuple[float, int]], Dict[int, float]]], idfs: List[float],
+           limit: int) -> List[Tuple[float, int]]:
+    """以最少文件的詞彙帶頭，依權重由高至低掃描；其餘詞彙以各自的最高權重估計分數上限，
+    第 limit 名的分數不低於上限時停止（所有詞彙都須出現，帶頭的列表已涵蓋全部候選）"""
+    order = sorted(range(len(lists)), key=lambda i: len(lists[i][0]))
+    lead_ranked, lead_idf = lists[order[0]][0], idfs[order[0]]
+    others = [(lists[i][1], idfs[i]) for i in order[1:]]
+    slack = -sum(idfs[i] * lists[i][0][0][0] for i in order[1:])
+
+    heap: List[Tuple[float, int]] = []
+    for negative_weight, doc in lead_ranked:
+        score = -lead_idf * negative_weight
+        if len(heap) >= limit and heap[0][0] >= score + slack:
+            break
+        for weights, idf in others:
+            other = weights.get(doc)
+            if other is None:
+                break
+            score += idf * other
+        else:
+            _push(heap, score, doc, limit)
+    return [(score, -negative_doc) for score, negative_doc in sorted(heap, reverse=True)]
+
+
+def _deletes(word: str, distance: int) -> set:
+    """word 本身與刪除 1～distance 個字元的所有變形"""
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        results |= frontier
+    return results
+
+
+def _edit_distance(a: str, b: str) -> int:
+    """Damerau-Levenshtein 距離（相鄰字元對調算一次）"""
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+class SpellingCorrector:
+    """SymSpell 拼字修正：字典詞彙預先產生刪除字元的變形，查詢時只需查找查詢詞的刪除變形，
+    不必與每個詞彙計算編輯距離"""
+
+    def __init__(self):
+        self._words: Dict[str, int] = {}
+        self._deletes: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @staticmethod
+    def max_distance(word: str) -> int:
+        # 短詞容易誤改成其他詞彙（例如 fe 與 ca、葉子與葉酸），只修正較長的詞
+        if word.isascii():
+            return 0 if len(word) < 4 else 1 if len(word) < 8 else 2
+        return 0 if len(word) < 3 else 1
+
+    def add(self, word: str, count: int = 1) -> None:
+        """加入詞彙；count 為出現次數，距離相同時優先修正為較常見的詞彙"""
+        if word in self._words:
+            self._words[word] += count
+            return
+        self._words[word] = count
+        for variant in _deletes(word, self.max_distance(word)):
+            self._deletes.setdefault(variant, []).append(word)
+
+    def lookup(self, word: str) -> Optional[str]:
+        """回傳字典中最接近的詞彙；word 本身在字典中時直接回傳，沒有足夠接近的詞彙時回傳 None"""
+        if word in self._words:
+            return word
+        limit = self.max_distance(word)
+        best = None
+        for variant in _deletes(word, limit):
+            for candidate in self._deletes.get(variant, ()):
+                allowed = min(limit, self.max_distance(candidate))
+                if abs(len(candidate) - len(word)) > allowed:
+                    continue
+                distance = _edit_distance(word, candidate)
+                if distance <= allowed:
+                    key = (distance, -self._words[candidate], candidate)
+                    if best is None or key < best:
+                        best = key
+        return best[2] if best else None
+
+
+class NutritionSearch:
+    """內建營養資料庫只載入一次；爬取文章依各網站的最近成功時間，只重新索引有更新的網站"""
+
+    def __init__(self, load_database: Callable[[], List[Dict]], store=None, refresh_interval: float = 30.0,
+                 synonyms: Optional[Dict[str, Iterable[str]]] = SYNONYMS):
+        self.index = InvertedIndex(synonyms)
+        self.synonyms = synonyms or {}
+        self.speller = SpellingCorrector()
+        self.load_database = load_database
+        self.store = store
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._database_loaded = False
+        self._site_versions: Dict[str, Optional[float]] = {}
+        self._site_keys: Dict[str, List[Tuple]] = {}
+        self._next_refresh = 0.0
+
+    def refresh(self, force: bool = False) -> None:
+        """載入內建資料庫，並把爬蟲更新過的網站文章重新加入索引（每 refresh_interval 秒最多檢查一次）"""
+        with self._lock:
+            if not self._database_loaded:
+                entries = self.load_database()
+                for i, entry in enumerate(entries):
+                    self.index.add(("database", i), entry)
+                self._build_speller(entries)
+                self._database_loaded = True
+
+            now = time.monotonic()
+            if self.store is None or (not force and now < self._next_refresh):
+                return
+            self._next_refresh = now + self.refresh_interval
+            for site, state in self.store.crawl_state().items():
+                if state["last_success"] == self._site_versions.get(site):
+                    continue
+                for key in self._site_keys.pop(site, []):
+                    self.index.remove(key)
+                keys = []
+                for i, article in enumerate(self.store.site_articles(site)):
+                    key = ("article", site, i)
+                    self.index.add(key, article)
+                    keys.append(key)
+                self._site_keys[site] = keys
+                self._site_versions[site] = state["last_success"]
+
+    def _build_speller(self, entries: List[Dict]) -> None:
+        # 拼字字典：內建資料庫的英文單字（依出現次數）與同義詞中的英文單字、中文詞
+        counts = Counter()
+        for entry in entries:
+            for field, _ in FIELD_WEIGHTS:
+                counts.update(word for word in _WORD_PATTERN.findall(normalize(entry.get(field))) if not word.isdigit())
+        for key, variants in self.synonyms.items():
+            for variant in set(variants) | {key}:
+                counts.update(_QUERY_PIECE_PATTERN.findall(normalize(variant)))
+        for word, count in counts.items():
+            self.speller.add(word, count)
+
+    def correct(self, query: str) -> Optional[str]:
+        """把索引中沒有的英文單字或中文片段換成拼字字典中最接近的詞彙；沒有可修正的部分時回傳 None"""
+        self.refresh()
+        changed = False
+
+        def replace(match):
+            nonlocal changed
+            piece = match.group()
+            # 數字（例如 2000、300）不修正
+            if piece.isdigit() or all(self.index.has_term(token) for token in tokenize(piece)):
+                return piece
+            corrected = self.speller.lookup(piece)
+            if corrected is None or corrected == piece:
+                return piece
+            changed = True
+            return corrected
+
+        corrected = _QUERY_PIECE_PATTERN.sub(replace, normalize(query))
+        return corrected if changed else None
+
+    def search_with_correction(self, query: str, limit: int = 20) -> Tuple[List[Dict], Optional[str]]:
+        """查無結果時修正拼字後再搜尋一次，仍無結果時比對子字串；回傳 (結果, 實際使用的修正查詢或 None)"""
+        results = self.search(query, limit)
+        if results:
+            return results, None
+        corrected = self.correct(query)
+        if corrected is not None:
+            results = self.search(corrected, limit)
+            if results:
+                return results, corrected
+        return self.substring_search(query, limit), None
+
+    def substring_search(self, query: str, limit: int = 20) -> List[Dict]:
+        """逐筆比對標題、分類與內文是否包含查詢字串（或其同義詞），詞彙索引找不到時的後備"""
+        self.refresh()
+        keyword = normalize(query).strip()
+        if not keyword:
+            return []
+        keywords = {keyword}
+        for key, variants in self.synonyms.items():
+            if keyword == key or keyword in variants:
+                keywords |= {normalize(variant) for variant in variants} | {key}
+                break
+        results = []
+        for entry in self.index.entries():
+            if any(word in normalize(entry.get(field)) for field, _ in FIELD_WEIGHTS for word in keywords):
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        try:
+            self.refresh()
+        except Exception as e:
+            # 無法讀取爬取文章時仍以目前的索引回應
+            print(f"更新搜尋索引失敗: {str(e)}")
+        return [entry for entry, _ in self.index.search(query, limit)]
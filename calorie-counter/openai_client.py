@@ -0,0 +1,202 @@
+"""
+具韌性的 OpenAI 用戶端
+提供每次呼叫的期限、429/5xx 的抖動退避重試，以及上游持續失敗時快速失敗的斷路器
+"""
+
+import random
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import openai
+from openai import OpenAI
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，暫停呼叫上游 API"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"OpenAI API 暫時無法使用，請於 {retry_after:.0f} 秒後再試")
+        self.retry_after = retry_after
+
+
+def _is_retryable(error: Exception) -> bool:
+    """逾時、連線錯誤、429 與 5xx 視為暫時性錯誤"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """讀取 429 回應的 Retry-After 標頭"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientOpenAIClient:
+    def __init__(self, timeout: float = 20.0, deadline: float = 45.0, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 client: Optional[OpenAI] = None,
+                 on_retry: Optional[Callable[[Exception], None]] = None,
+                 on_circuit_event: Optional[Callable[[str], None]] = None):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._client = client
+        self.on_retry = on_retry
+        # 斷路器開啟 ("opened")、關閉 ("closed") 與拒絕呼叫 ("rejected") 時通知，供統計數據使用
+        self.on_circuit_event = on_circuit_event
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._half_open_trial = False
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "timeouts": 0,
+            "circuit_opened": 0,
+            "circuit_rejected": 0,
+        }
+
+    @property
+    def client(self) -> OpenAI:
+        # 延遲建立，未設定 API 金鑰時仍可匯入模組；重試由本類別負責
+        if self._client is None:
+            self._client = OpenAI(timeout=self.timeout, max_retries=0)
+        return self._client
+
+    @property
+    def last_retries(self) -> int:
+        """目前執行緒最近一次呼叫的重試次數"""
+        return getattr(self._local, "retries", 0)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def _notify(self, event: str) -> None:
+        if self.on_circuit_event is not None:
+            self.on_circuit_event(event)
+
+    def _before_call(self) -> None:
+        """斷路器開啟時拒絕呼叫；冷卻時間過後只放行一個試探呼叫"""
+        with self._lock:
+            self.counters["calls"] += 1
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed >= self.reset_timeout and not self._half_open_trial:
+                self._half_open_trial = True
+                return
+            self.counters["circuit_rejected"] += 1
+        self._notify("rejected")
+        raise CircuitOpenError(max(1.0, self.reset_timeout - elapsed))
+
+    def _record_success(self) -> None:
+        with self._lock:
+            self.counters["successes"] += 1
+            self._consecutive_failures = 0
+            closed = self._opened_at is not None
+            self._opened_at = None
+            self._half_open_trial = False
+        if closed:
+            self._notify("closed")
+
+    def _record_failure(self, upstream: bool) -> None:
+        """記錄失敗；只有上游的暫時性錯誤會累計到斷路器"""
+        opened = False
+        with self._lock:
+            self.counters["failures"] += 1
+            trial = self._half_open_trial
+            self._half_open_trial = False
+            if not upstream:
+                return
+            self._consecutive_failures += 1
+            if trial or self._consecutive_failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.counters["circuit_opened"] += 1
+                    opened = True
+                self._opened_at = time.monotonic()
+        if opened:
+            self._notify("opened")
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """指數退避加上完整抖動；429 有 Retry-After 時以其為下限"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def create_chat_completion(self, **kwargs):
+        """呼叫 chat.completions.create，套用期限、重試與斷路器"""
+        self._before_call()
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        self._local.retries = 0
+
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise openai.APITimeoutError(request=None)
+                response = self.client.with_options(timeout=min(self.timeout, remaining)) \
+                    .chat.completions.create(**kwargs)
+            except Exception as e:
+                retryable = _is_retryable(e)
+                if isinstance(e, openai.RateLimitError):
+                    self._count("rate_limited")
+                elif isinstance(e, openai.APITimeoutError):
+                    self._count("timeouts")
+                elif isinstance(e, openai.APIStatusError) and e.status_code >= 500:
+                    self._count("server_errors")
+
+                if retryable and attempt < self.max_retries:
+                    delay = self._backoff(attempt, e)
+                    if time.monotonic() + delay < deadline:
+                        attempt += 1
+                        self._local.retries = attempt
+                        self._count("retries")
+                        if self.on_retry is not None:
+                            self.on_retry(e)
+                        print(f"OpenAI 呼叫失敗 ({type(e).__name__})，{delay:.1f} 秒後進行第 {attempt} 次重試", file=sys.stderr)
+                        time.sleep(delay)
+                        continue
+
+                self._record_failure(upstream=retryable)
+                raise
+
+            self._record_success()
+            return response
+
+    def stats(self) -> Dict:
+        """回傳計數器與斷路器狀態"""
+        with self._lock:
+            counters = dict(self.counters)
+        counters["circuit_state"] = self.state
+        return counters
@@ -0,0 +1,219 @@
+"""
+感知雜湊相似度索引
+以 64 位元 dHash 找出近似重複的餐點照片，重用先前的分析結果
+
+索引採用多重索引雜湊 (multi-index hashing)：將雜湊切成 max_distance + 1 段，
+依鴿籠原理，漢明距離不超過 max_distance 的兩個雜湊至少有一段完全相同，
+因此只需比對各段相同的候選項目。
+"""
+
+import io
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 為選用套件，未安裝時停用相似度比對
+    Image = None
+
+HASH_BITS = 64
+# 每筆紀錄：8 bytes 雜湊 + 32 bytes 圖片 SHA-256
+_RECORD = struct.Struct("<Q32s")
+
+
+def dhash(image_bytes: bytes) -> Optional[int]:
+    """計算圖片的 64 位元差異雜湊 (dHash)，無法解碼時回傳 None"""
+    if Image is None:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            # JPEG 可直接以縮小尺寸解碼，省下大部分解碼時間
+            img.draft("L", (64, 64))
+            small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    except Exception:
+        return None
+
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _chunk_layout(chunks: int) -> List[Tuple[int, int]]:
+    """將 64 位元切成 chunks 段，回傳每段的 (位移, 遮罩)"""
+    base, extra = divmod(HASH_BITS, chunks)
+    layout = []
+    shift = 0
+    for i in range(chunks):
+        width = base + (1 if i < extra else 0)
+        layout.append((shift, (1 << width) - 1))
+        shift += width
+    return layout
+
+
+class PerceptualHashIndex:
+    def __init__(self, path: str, max_distance: int = 3, min_compact: int = 1024):
+        self.path = path
+        self.max_distance = max_distance
+        # 失效的紀錄達到 min_compact 筆且多於有效紀錄時重寫索引檔
+        self.min_compact = min_compact
+        self._layout = _chunk_layout(max_distance + 1) if max_distance >= 0 else []
+        self._lock = threading.Lock()
+        # 未呼叫 load_in_background 時，第一次查詢同步讀入索引檔
+        self._ready = threading.Event()
+        self._ready.set()
+        self._file = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._tables = [dict() for _ in self._layout]
+        self._hashes = array("Q")
+        self._keys: List[bytes] = []
+        # 圖片鍵 -> 最新紀錄的位置；被移除或被較新紀錄取代的位置視為失效
+        self._live: Dict[bytes, int] = {}
+        self._loaded_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and self.max_distance >= 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def load_in_background(self) -> threading.Thread:
+        """在背景執行緒讀入索引檔；讀取完成前查詢直接回傳沒有結果，不在請求中等待"""
+        self._ready.clear()
+
+        def load():
+            try:
+                with self._lock:
+                    self._refresh()
+            except Exception as e:
+                print(f"讀取感知雜湊索引失敗: {str(e)}", file=sys.stderr)
+            finally:
+                self._ready.set()
+
+        thread = threading.Thread(target=load, name="phash-load", daemon=True)
+        thread.start()
+        return thread
+
+    def _refresh(self) -> None:
+        """讀入其他 worker 追加到索引檔的新紀錄；索引檔被壓縮後的新檔案取代時重新讀取"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        # 持續開著目前讀取的檔案，舊檔案的 inode 不會被新檔案重複使用
+        if self._file is None or os.fstat(self._file.fileno()).st_ino != stat.st_ino:
+            try:
+                f = open(self.path, "rb")
+            except OSError:
+                return
+            if self._file is not None:
+                self._file.close()
+            self._reset()
+            self._file = f
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size <= self._loaded_bytes:
+            return
+        self._file.seek(self._loaded_bytes)
+        # 只讀取完整的紀錄，寫到一半的紀錄留到下次
+        data = self._file.read((size - self._loaded_bytes) // _RECORD.size * _RECORD.size)
+
+        position = len(self._hashes)
+        hashes, keys, live = self._hashes, self._keys, self._live
+        tables = [(table, shift, mask) for table, (shift, mask) in zip(self._tables, self._layout)]
+        for value, key in _RECORD.iter_unpack(data):
+            hashes.append(value)
+            keys.append(key)
+            live[key] = position
+            for table, shift, mask in tables:
+                bucket = table.get((value >> shift) & mask)
+                if bucket is None:
+                    table[(value >> shift) & mask] = [position]
+                else:
+                    bucket.append(position)
+            position += 1
+        self._loaded_bytes += len(data)
+
+    def matches(self, value: int) -> List[Tuple[str, int]]:
+        """找出距離不超過 max_distance 的有效項目，依距離由近至遠回傳 (圖片鍵, 距離)"""
+        if not self.enabled or not self._ready.is_set():
+            return []
+
+        with self._lock:
+            self._refresh()
+            hashes, keys, live = self._hashes, self._keys, self._live
+            found = {}
+            for table, (shift, mask) in zip(self._tables, self._layout):
+                for position in table.get((value >> shift) & mask, ()):
+                    if position not in found and live.get(keys[position]) == position:
+                        found[position] = (value ^ hashes[position]).bit_count()
+            ranked = sorted((distance, position) for position, distance in found.items()
+                            if distance <= self.max_distance)
+            return [(keys[position].hex(), distance) for distance, position in ranked]
+
+    def lookup(self, value: int) -> Optional[Tuple[str, int]]:
+        """找出距離最近且不超過 max_distance 的項目，回傳 (圖片鍵, 距離)"""
+        found = self.matches(value)
+        return found[0] if found else None
+
+    def add(self, value: int, key: str) -> None:
+        """新增一筆雜湊並追加寫入索引檔"""
+        if not self.enabled:
+            return
+
+        record = _RECORD.pack(value, bytes.fromhex(key))
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 以附加模式單次寫入，多個 worker 同時寫入也不會交錯
+            with open(self.path, "ab") as f:
+                f.write(record)
+            # 從檔案讀回，確保與其他 worker 追加的紀錄順序一致；背景讀取中則留給讀取執行緒
+            if self._ready.is_set():
+                self._refresh()
+
+    def remove(self, keys: Iterable[str]) -> None:
+        """移除已不在結果快取中的項目（例如被淘汰的快取），失效的紀錄過多時壓縮索引檔"""
+        if not self.enabled or not self._ready.is_set():
+            # 背景讀取中略過；查詢時呼叫端仍會略過快取中已不存在的項目
+            return
+
+        with self._lock:
+            self._refresh()
+            for key in keys:
+                self._live.pop(bytes.fromhex(key), None)
+            dead = len(self._hashes) - len(self._live)
+            if dead >= self.min_compact and dead > len(self._live):
+                self._compact()
+
+    def _compact(self) -> None:
+        """只保留有效紀錄重寫索引檔，其他 worker 發現檔案被取代後重新讀取。
+        壓縮與其他 worker 的追加同時發生時，那筆紀錄可能遺失，只會少一次近似命中"""
+        hashes, keys = self._hashes, self._keys
+        data = b"".join(_RECORD.pack(hashes[position], keys[position]) for position in sorted(self._live.values()))
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            print(f"壓縮感知雜湊索引失敗: {str(e)}", file=sys.stderr)
+            return
+        print(f"壓縮感知雜湊索引: {len(hashes)} -> {len(self._live)} 筆", file=sys.stderr)
+        self._refresh()
@@ -1,18 +1,65 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Request, Response, render_template, request, jsonify, redirect, stream_with_context, url_for
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from werkzeug.exceptions import RequestEntityTooLarge
+import base64
+import binascii
+import csv
+import io
+import json
 import tempfile
 import os
 from dotenv import load_dotenv
 
-from calorie_counter import get_calories_from_image
+from analysis_result import parse_calories
+from image_preprocess import InvalidImageError, verify_image
+from calorie_counter import get_calories_from_image, metrics, stream_calories_from_image
+from meal_analytics import MealHistory, analyse_history
+from analysis_jobs import AnalysisJobQueue, QueueFullError
+from openai_client import CircuitOpenError
 from nutrition_scraper import NutritionScraper
 from advanced_scraper import AdvancedNutritionScraper
+from article_store import ArticleStore
+from nutrition_search import NutritionSearch
 
 # 載入環境變數
 load_dotenv()
 
+# 單張上傳圖片的大小上限
+MAX_UPLOAD_BYTES = int(os.getenv('CALORIE_MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+
+# 批次上傳的圖片數量上限與同時分析的數量
+BATCH_MAX_IMAGES = int(os.getenv('CALORIE_BATCH_MAX_IMAGES', '10'))
+BATCH_CONCURRENCY = int(os.getenv('CALORIE_BATCH_CONCURRENCY', '4'))
+
+# 首頁是否以 /upload/stream 串流結果；同步 worker 會在整個模型回應期間被佔用，
+# 只在使用 gthread 或 gevent worker 時開啟，否則首頁以工作模式輪詢逐項顯示
+UI_STREAMING = os.getenv('CALORIE_UI_STREAMING', '').lower() in ('1', 'true', 'yes')
+
+# 餐點記錄頁面每次載入的筆數
+MEALS_PAGE_SIZE = 5
+
+# 匯入歷史餐點：請求大小上限、每次提交的餐點數與回報的錯誤數上限
+IMPORT_MAX_BYTES = int(os.getenv('CALORIE_IMPORT_MAX_BYTES', str(200 * 1024 * 1024)))
+IMPORT_CHUNK_SIZE = int(os.getenv('CALORIE_IMPORT_CHUNK_SIZE', '500'))
+IMPORT_MAX_ERRORS = 100
+
+# 匯出時每次讀取的餐點數
+EXPORT_CHUNK_SIZE = int(os.getenv('CALORIE_EXPORT_CHUNK_SIZE', '1000'))
+
+class InMemoryUploadRequest(Request):
+    """單張圖片大小以內的上傳檔案保留在記憶體中，不寫入暫存檔"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # 單張圖片上傳受 MAX_CONTENT_LENGTH 限制，不會溢出到磁碟；
+        # /upload/batch 與匯入放寬了單一請求的上限，超過此大小的檔案會寫入暫存檔，避免整個請求留在記憶體
+        return tempfile.SpooledTemporaryFile(max_size=MAX_UPLOAD_BYTES + 64 * 1024)
+
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
+# 保留一點空間給 multipart 標頭
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
 
 # 資料庫配置 - 從環境變數讀取
 db_host = os.getenv('DB_HOST', 'localhost')
@@ -20,10 +67,19 @@ db_user = os.getenv('DB_USER', 'root')
 db_password = os.getenv('DB_PASSWORD', 'password')
 db_name = os.getenv('DB_NAME', 'calorie_db')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:3306/{db_name}'
+# 設定 DATABASE_URL 時優先使用（例如測試時改用 SQLite）
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or \
+    f'mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:3306/{db_name}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+# 背景分析工作：執行緒數與佇列深度皆為單一 worker 程序的上限
+analysis_jobs = AnalysisJobQueue(
+    os.getenv('CALORIE_JOB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'jobs')),
+    max_workers=int(os.getenv('CALORIE_JOB_WORKERS', '4')),
+    max_pending=int(os.getenv('CALORIE_JOB_QUEUE_DEPTH', '16')),
+)
+
 # 資料庫模型
 class MealRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -31,60 +87,322 @@ class MealRecord(db.Model):
     total_calories = db.Column(db.Integer, nullable=False)
     foods = db.relationship('FoodItem', backref='meal_record', lazy=True, cascade='all, delete-orphan')
 
+    # 與 create_database.py 建立的索引相同；InnoDB 的次要索引隱含主鍵，可直接依 (date, id) 排序
+    __table_args__ = (db.Index('idx_meal_record_date', 'date'),)
+
 class FoodItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     calories = db.Column(db.Integer, nullable=False)
     meal_record_id = db.Column(db.Integer, db.ForeignKey('meal_record.id'), nullable=False)
 
+    __table_args__ = (db.Index('idx_food_item_meal_id', 'meal_record_id'),)
+
+# 每日彙總：於儲存與刪除餐點時增量更新，統計 API 不需掃描明細表（日期以 UTC 計）
+class DailyCalorieRollup(db.Model):
+    __tablename__ = 'daily_calorie_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    total_calories = db.Column(db.Integer, nullable=False, default=0)
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyFoodRollup(db.Model):
+    __tablename__ = 'daily_food_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    food_name = db.Column(db.String(100), primary_key=True)
+    calories = db.Column(db.Integer, nullable=False, default=0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return render_template("index.html", stream_uploads=UI_STREAMING)
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    # 批次與匯入端點放寬了請求大小，回應其本身的上限
+    if request.endpoint == "api_meals_import":
+        return jsonify({"success": False, "message": f"匯入檔案過大 (上限 {IMPORT_MAX_BYTES} bytes)"}), 413
+    if request.endpoint == "upload_batch":
+        return {
+            "error": f"Batch too large (max {BATCH_MAX_IMAGES} images of {MAX_UPLOAD_BYTES} bytes each)",
+        }, 413
+    return {
+        "error": f"Image too large (max {MAX_UPLOAD_BYTES} bytes)",
+    }, 413
+
+@app.errorhandler(InvalidImageError)
+def invalid_image(e):
+    # 無法辨識的內容不送往模型，避免產生費用
+    return {
+        "error": str(e),
+    }, 400
+
+@app.errorhandler(CircuitOpenError)
+def upstream_unavailable(e):
+    return {
+        "error": str(e),
+    }, 503, {"Retry-After": str(int(e.retry_after))}
+
+def _stream_to_dicts(image_bytes):
+    for event, data in stream_calories_from_image(image_bytes):
+        yield event, data.to_dict()
 
 @app.route("/upload", methods=["POST"])
 def upload():
-    image = request.files["image"]
+    image = request.files.get("image")
+
+    if image is None or image.filename == "":
+        return {
+            "error": "No image uploaded",
+        }, 400
+
+    # 直接從記憶體讀取上傳內容，多讀一個位元組用來判斷是否超過上限
+    image_bytes = image.stream.read(MAX_UPLOAD_BYTES + 1)
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        return upload_too_large(None)
+    verify_image(image_bytes)
+
+    # 工作模式：立即回傳工作 ID，由背景執行緒呼叫模型
+    if request.args.get("mode") == "job":
+        try:
+            job_id = analysis_jobs.submit_stream(_stream_to_dicts, image_bytes)
+        except QueueFullError:
+            return {
+                "error": "Server busy, please try again later",
+            }, 429, {"Retry-After": "5"}
+        return {
+            "job_id": job_id,
+            "status_url": url_for("upload_status", job_id=job_id),
+        }, 202
+
+    calories = get_calories_from_image(image_bytes)
 
-    if image.filename == "":
+    return {
+        "calories": calories.to_dict(),
+    }
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route("/upload/stream", methods=["POST"])
+def upload_stream():
+    image = request.files.get("image")
+
+    if image is None or image.filename == "":
         return {
             "error": "No image uploaded",
         }, 400
 
-    # 將臨時檔案存到專案根目錄
-    temp_file = tempfile.NamedTemporaryFile(delete=False, dir=os.getcwd())
-    image.save(temp_file.name)
+    image_bytes = image.stream.read(MAX_UPLOAD_BYTES + 1)
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        return upload_too_large(None)
+    verify_image(image_bytes)
+
+    def generate():
+        # 每個食物項目完成時立即送出，最後送出完整結果
+        try:
+            for event, data in stream_calories_from_image(image_bytes):
+                yield _sse_event(event, data.to_dict())
+        except Exception as e:
+            print(f"串流分析失敗: {str(e)}")
+            yield _sse_event("error", {"error": str(e)})
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.route("/upload/batch", methods=["POST"])
+def upload_batch():
+    # 批次請求可包含多張圖片，放寬整體請求大小
+    request.max_content_length = BATCH_MAX_IMAGES * MAX_UPLOAD_BYTES + 64 * 1024
+    images = [image for image in request.files.getlist("images") if image.filename]
+
+    if not images:
+        return {
+            "error": "No images uploaded",
+        }, 400
+    if len(images) > BATCH_MAX_IMAGES:
+        return {
+            "error": f"Too many images (max {BATCH_MAX_IMAGES})",
+        }, 400
+
+    def analyse(image):
+        image_bytes = image.stream.read(MAX_UPLOAD_BYTES + 1)
+        if len(image_bytes) > MAX_UPLOAD_BYTES:
+            raise ValueError(f"Image too large (max {MAX_UPLOAD_BYTES} bytes)")
+        verify_image(image_bytes)
+        return get_calories_from_image(image_bytes).to_dict()
 
-    calories = get_calories_from_image(temp_file.name)
-    temp_file.close()
+    # 各圖片獨立分析，單張失敗不影響其他結果
+    results = []
+    with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(images))) as executor:
+        futures = [executor.submit(analyse, image) for image in images]
+        for image, future in zip(images, futures):
+            try:
+                results.append({"filename": image.filename, "calories": future.result()})
+            except Exception as e:
+                results.append({"filename": image.filename, "error": str(e)})
 
     return {
-        "calories": calories,
+        "results": results,
+    }
+
+@app.route("/upload/<job_id>")
+def upload_status(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return {
+            "error": "Job not found",
+        }, 404
+
+    response = {
+        "job_id": job_id,
+        "status": job["status"],
     }
+    if job["status"] == "running":
+        # 串流工作已完成的食物項目，前端輪詢時逐項顯示
+        response["items"] = job.get("items", [])
+    elif job["status"] == "done":
+        response["calories"] = job["result"]
+    elif job["status"] == "failed":
+        response["error"] = job["error"]
+    return response
+
+@app.route("/metrics")
+def prometheus_metrics():
+    # 加總所有 worker 的模型呼叫統計，供 Prometheus 抓取
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/record")
 def record():
     return render_template("record.html")
 
+def _normalise_meal(data):
+    """驗證並正規化餐點資料，回傳 (食物列表, 總卡路里, 錯誤訊息)"""
+    if not isinstance(data, dict):
+        return None, None, "請提供餐點資料"
+
+    foods = []
+    for food in data.get('foods') or []:
+        if not isinstance(food, dict):
+            return None, None, "食物項目格式錯誤"
+        name = str(food.get('name') or '').strip()[:100]
+        calories = parse_calories(food.get('calories'))
+        if not name or calories is None:
+            return None, None, f"食物項目資料不完整: {food}"
+        foods.append({'name': name, 'calories': calories})
+
+    # 未提供總卡路里時以各項加總
+    total_calories = parse_calories(data.get('total_calories'))
+    if total_calories is None:
+        total_calories = sum(food['calories'] for food in foods)
+    return foods, total_calories, None
+
+def _upsert_increment(model, rows, keys):
+    """插入彙總列，已存在時把數值欄位累加上去（單一 SQL，並行寫入也不會遺失更新）"""
+    table = model.__table__
+    counters = [column for column in rows[0] if column not in keys]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(rows)
+        statement = statement.on_duplicate_key_update(
+            {column: table.c[column] + statement.inserted[column] for column in counters}
+        )
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: table.c[column] + statement.excluded[column] for column in counters},
+        )
+    db.session.execute(statement)
+
+def _apply_rollups(meals, sign):
+    """將多筆 (日期, 總熱量, 食物列表) 餐點加入 (sign=1) 或移出 (sign=-1) 每日彙總"""
+    per_day = {}
+    per_food = {}
+    for day, total_calories, foods in meals:
+        calories, count = per_day.get(day, (0, 0))
+        per_day[day] = (calories + total_calories, count + 1)
+        for food in foods:
+            calories, count = per_food.get((day, food['name']), (0, 0))
+            per_food[(day, food['name'])] = (calories + food['calories'], count + 1)
+    if not per_day:
+        return
+
+    _upsert_increment(DailyCalorieRollup, [{
+        'day': day,
+        'total_calories': sign * calories,
+        'meal_count': sign * count,
+    } for day, (calories, count) in per_day.items()], ['day'])
+    if per_food:
+        _upsert_increment(DailyFoodRollup, [{
+            'day': day,
+            'food_name': name,
+            'calories': sign * calories,
+            'item_count': sign * count,
+        } for (day, name), (calories, count) in per_food.items()], ['day', 'food_name'])
+
+    if sign < 0:
+        # 移除已沒有任何餐點的列，讓彙總表只保留有資料的日子
+        days = list(per_day)
+        db.session.execute(db.delete(DailyCalorieRollup).where(
+            DailyCalorieRollup.day.in_(days), DailyCalorieRollup.meal_count <= 0))
+        db.session.execute(db.delete(DailyFoodRollup).where(
+            DailyFoodRollup.day.in_(days), DailyFoodRollup.item_count <= 0))
+
+def rebuild_rollups():
+    """由明細表重新計算所有彙總（初次部署或修復用），回傳彙總的天數"""
+    meal_day = db.func.date(MealRecord.date)
+    db.session.execute(db.delete(DailyFoodRollup))
+    db.session.execute(db.delete(DailyCalorieRollup))
+    db.session.execute(db.insert(DailyCalorieRollup).from_select(
+        ['day', 'total_calories', 'meal_count'],
+        db.select(meal_day, db.func.sum(MealRecord.total_calories), db.func.count())
+        .group_by(meal_day),
+    ))
+    db.session.execute(db.insert(DailyFoodRollup).from_select(
+        ['day', 'food_name', 'calories', 'item_count'],
+        db.select(meal_day, FoodItem.name, db.func.sum(FoodItem.calories), db.func.count())
+        .join(MealRecord, FoodItem.meal_record_id == MealRecord.id)
+        .group_by(meal_day, FoodItem.name),
+    ))
+    db.session.commit()
+    return db.session.scalar(db.select(db.func.count()).select_from(DailyCalorieRollup))
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """flask --app server rebuild-rollups"""
+    print(f"已重新計算 {rebuild_rollups()} 天的彙總")
+
+def _insert_meals(meals):
+    """寫入多筆 (時間, 總熱量, 食物列表) 餐點並更新彙總；呼叫端負責 commit"""
+    food_rows = []
+    for meal_date, total_calories, foods in meals:
+        # MySQL 無法回傳多列 INSERT 的各筆 ID，餐點逐筆寫入，食物項目合併為一次 INSERT
+        meal_id = db.session.execute(
+            db.insert(MealRecord).values(date=meal_date, total_calories=total_calories)
+        ).inserted_primary_key[0]
+        food_rows.extend({'name': food['name'], 'calories': food['calories'], 'meal_record_id': meal_id}
+                         for food in foods)
+    if food_rows:
+        db.session.execute(db.insert(FoodItem).values(food_rows))
+    _apply_rollups([(meal_date.date(), total_calories, foods) for meal_date, total_calories, foods in meals], 1)
+
 @app.route("/save_meal", methods=["POST"])
 def save_meal():
     try:
         data = request.get_json()
-        foods = data.get('foods', [])
-        total_calories = data.get('total_calories', 0)
+        foods, total_calories, error = _normalise_meal(data)
+        if error:
+            return jsonify({"success": False, "message": error}), 400
         
-        # 建立新的餐點記錄
-        meal_record = MealRecord(total_calories=total_calories)
-        db.session.add(meal_record)
-        db.session.flush()  # 取得ID
-        
-        # 新增食物項目
-        for food in foods:
-            food_item = FoodItem(
-                name=food['name'],
-                calories=food['calories'],
-                meal_record_id=meal_record.id
-            )
-            db.session.add(food_item)
+        # 建立新的餐點記錄，食物項目以單一多列 INSERT 寫入
+        _insert_meals([(datetime.utcnow(), total_calories, foods)])
         
         db.session.commit()
         return jsonify({"success": True, "message": "餐點記錄已儲存"})
@@ -92,44 +410,316 @@ def save_meal():
         db.session.rollback()
         return jsonify({"success": False, "message": f"儲存失敗: {str(e)}"}), 500
 
+def _parse_meal_date(value):
+    """解析匯入資料的時間；含時區時換算為 UTC"""
+    parsed = datetime.fromisoformat(str(value or '').strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _iter_import_ndjson(lines):
+    """NDJSON 每行一餐，格式與 /save_meal 相同並加上 date"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError:
+            yield line_number, None, "JSON 格式錯誤"
+
+def _iter_import_csv(lines):
+    """CSV 每列一個食物項目（欄位 meal_id, date, total_calories, food_name, food_calories），
+    相鄰且 meal_id 相同（沒有 meal_id 時為 date 相同）的列屬於同一餐"""
+    reader = csv.DictReader(lines)
+    current_key = current = start_line = None
+    for row in reader:
+        key = row.get('meal_id') or row.get('date')
+        if current is not None and key != current_key:
+            yield start_line, current, None
+            current = None
+        if current is None:
+            current_key, start_line = key, reader.line_num
+            current = {'date': row.get('date'), 'total_calories': row.get('total_calories') or None, 'foods': []}
+        if row.get('food_name'):
+            current['foods'].append({'name': row['food_name'], 'calories': row.get('food_calories')})
+    if current is not None:
+        yield start_line, current, None
+
+@app.route("/api/meals/import", methods=["POST"])
+def api_meals_import():
+    """API端點：串流匯入 CSV 或 NDJSON 格式的歷史餐點，每 IMPORT_CHUNK_SIZE 筆提交一次"""
+    request.max_content_length = IMPORT_MAX_BYTES
+    import_format = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'ndjson')
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({"success": False, "message": "format 必須是 csv 或 ndjson"}), 400
+
+    # 直接讀取請求本文，不把整個檔案載入記憶體
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    records = _iter_import_csv(lines) if import_format == 'csv' else _iter_import_ndjson(lines)
+
+    imported = skipped = 0
+    errors = []
+    chunk = []
+    try:
+        for line_number, data, error in records:
+            if error is None:
+                foods, total_calories, error = _normalise_meal(data)
+            if error is None:
+                try:
+                    meal_date = _parse_meal_date(data.get('date'))
+                except ValueError:
+                    error = f"無效的時間: {data.get('date')!r}"
+            if error:
+                skipped += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({'line': line_number, 'error': error})
+                continue
+
+            chunk.append((meal_date, total_calories, foods))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                _insert_meals(chunk)
+                db.session.commit()
+                imported += len(chunk)
+                chunk = []
+
+        if chunk:
+            _insert_meals(chunk)
+            db.session.commit()
+            imported += len(chunk)
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        raise
+    except (csv.Error, UnicodeDecodeError) as e:
+        # 已提交的區塊會保留，回報筆數讓使用者從中斷處繼續
+        db.session.rollback()
+        return jsonify({"success": False, "message": f"檔案格式錯誤: {str(e)}", "imported": imported}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": f"匯入失敗: {str(e)}", "imported": imported}), 500
+
+    return jsonify({"success": True, "imported": imported, "skipped": skipped, "errors": errors})
+
+def _iter_meal_chunks():
+    """依 id 以鍵集分段讀取所有餐點與其食物項目，記憶體中只保留一段"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(MealRecord.id, MealRecord.date, MealRecord.total_calories)
+            .where(MealRecord.id > last_id)
+            .order_by(MealRecord.id)
+            .limit(EXPORT_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows, _foods_by_meal([row.id for row in rows])
+        last_id = rows[-1].id
+
+def _export_csv():
+    """每列一個食物項目，欄位與 /api/meals/import 相同，可直接重新匯入"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['meal_id', 'date', 'total_calories', 'food_name', 'food_calories'])
+    for rows, foods in _iter_meal_chunks():
+        for row in rows:
+            meal_date = row.date.isoformat()
+            if not foods[row.id]:
+                writer.writerow([row.id, meal_date, row.total_calories, '', ''])
+            for food in foods[row.id]:
+                writer.writerow([row.id, meal_date, row.total_calories, food['name'], food['calories']])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def _export_ndjson():
+    for rows, foods in _iter_meal_chunks():
+        yield ''.join(json.dumps({
+            'id': row.id,
+            'date': row.date.isoformat(),
+            'total_calories': row.total_calories,
+            'foods': foods[row.id],
+        }, ensure_ascii=False) + '\n' for row in rows)
+
+@app.route("/api/meals/export")
+def api_meals_export():
+    """API端點：以串流方式匯出完整的餐點記錄（CSV 或 NDJSON），記憶體用量與記錄數量無關"""
+    export_format = request.args.get('format', 'csv')
+    if export_format == 'csv':
+        body, mimetype = _export_csv(), 'text/csv'
+    elif export_format == 'ndjson':
+        body, mimetype = _export_ndjson(), 'application/x-ndjson'
+    else:
+        return jsonify({"error": "format 必須是 csv 或 ndjson"}), 400
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=meals.{export_format}',
+    })
+
 @app.route("/meals")
 def meals():
-    # 取得所有餐點記錄，按日期排序
-    meal_records = MealRecord.query.order_by(MealRecord.date.desc()).all()
-    return render_template("meals.html", meal_records=meal_records)
+    # 只在伺服器端輸出第一頁，其餘由頁面以 next_cursor 向 /api/meals 接續載入
+    meals_data, next_cursor = _load_meal_page(MEALS_PAGE_SIZE)
+    return render_template("meals.html", meals=meals_data, next_cursor=next_cursor, page_size=MEALS_PAGE_SIZE)
+
+def _foods_by_meal(meal_ids):
+    """以單一 IN 查詢取得多筆餐點的食物項目，依餐點 ID 分組"""
+    foods = {meal_id: [] for meal_id in meal_ids}
+    if not meal_ids:
+        return foods
+    rows = db.session.execute(
+        db.select(FoodItem.meal_record_id, FoodItem.name, FoodItem.calories)
+        .where(FoodItem.meal_record_id.in_(meal_ids))
+        .order_by(FoodItem.id)
+    )
+    for meal_id, name, calories in rows:
+        foods[meal_id].append({'name': name, 'calories': calories})
+    return foods
+
+def _meals_to_dicts(rows):
+    """將餐點欄位查詢結果與其食物項目組成 API 格式，不建立 ORM 物件"""
+    foods = _foods_by_meal([row.id for row in rows])
+    return [{
+        'id': row.id,
+        'date': row.date.strftime('%Y-%m-%d %H:%M'),
+        'total_calories': row.total_calories,
+        'foods': foods[row.id],
+    } for row in rows]
+
+def _encode_cursor(date, meal_id):
+    """將最後一筆餐點的 (date, id) 編碼為不透明的游標字串"""
+    raw = json.dumps([date.isoformat(), meal_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor):
+    """解析游標，格式錯誤時拋出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        date, meal_id = json.loads(raw)
+        return datetime.fromisoformat(date), int(meal_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError("無效的游標") from e
+
+def _load_meal_page(per_page, cursor=None):
+    """依 (date, id) 由新到舊取得一頁餐點，回傳 (餐點列表, 下一頁游標)"""
+    query = db.select(MealRecord.id, MealRecord.date, MealRecord.total_calories)
+    if cursor:
+        date, meal_id = _decode_cursor(cursor)
+        query = query.where(db.or_(
+            MealRecord.date < date,
+            db.and_(MealRecord.date == date, MealRecord.id < meal_id),
+        ))
+    # 多取一筆判斷是否還有下一頁
+    rows = db.session.execute(
+        query.order_by(MealRecord.date.desc(), MealRecord.id.desc()).limit(per_page + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = _encode_cursor(rows[-1].date, rows[-1].id)
+    return _meals_to_dicts(rows), next_cursor
 
 @app.route("/api/meals")
 def api_meals():
-    # API端點，回傳JSON格式的餐點記錄
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    
-    meal_records = MealRecord.query.order_by(MealRecord.date.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    meals_data = []
-    for meal in meal_records.items:
-        meals_data.append({
-            'id': meal.id,
-            'date': meal.date.strftime('%Y-%m-%d %H:%M'),
-            'total_calories': meal.total_calories,
-            'foods': [{'name': food.name, 'calories': food.calories} for food in meal.foods]
-        })
-    
-    return jsonify({
+    # API端點，回傳JSON格式的餐點記錄；以游標分頁，深層頁面與第一頁一樣快
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+    try:
+        meals_data, next_cursor = _load_meal_page(per_page, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = {
         'meals': meals_data,
-        'total': meal_records.total,
-        'pages': meal_records.pages,
-        'current_page': page,
-        'has_next': meal_records.has_next,
-        'has_prev': meal_records.has_prev
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None,
+    }
+    # 總數需要掃描整個表格，只在明確要求時計算
+    if request.args.get('count', type=int):
+        response['total'] = db.session.scalar(db.select(db.func.count()).select_from(MealRecord))
+    return jsonify(response)
+
+@app.route("/api/stats")
+def api_stats():
+    """API端點：最近 N 天每日與每週的總熱量、餐數與最常吃的食物，只讀取彙總表"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    top = min(max(request.args.get('top', 5, type=int), 0), 50)
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+
+    rows = db.session.execute(
+        db.select(DailyCalorieRollup.day, DailyCalorieRollup.total_calories, DailyCalorieRollup.meal_count)
+        .where(DailyCalorieRollup.day.between(start, end))
+    ).all()
+    by_day = {row.day: row for row in rows}
+
+    # 沒有記錄的日子補 0，方便圖表直接使用
+    daily = []
+    weekly = {}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day)
+        total_calories = row.total_calories if row else 0
+        meal_count = row.meal_count if row else 0
+        daily.append({'date': day.isoformat(), 'total_calories': total_calories, 'meal_count': meal_count})
+
+        week_start = day - timedelta(days=day.weekday())
+        week = weekly.setdefault(week_start, {'week_start': week_start.isoformat(), 'total_calories': 0, 'meal_count': 0, 'days': 0})
+        week['total_calories'] += total_calories
+        week['meal_count'] += meal_count
+        week['days'] += 1
+
+    top_foods = []
+    if top:
+        count = db.func.sum(DailyFoodRollup.item_count)
+        calories = db.func.sum(DailyFoodRollup.calories)
+        top_foods = [{'name': name, 'count': int(item_count), 'calories': int(total)}
+                     for name, item_count, total in db.session.execute(
+                         db.select(DailyFoodRollup.food_name, count, calories)
+                         .where(DailyFoodRollup.day.between(start, end))
+                         .group_by(DailyFoodRollup.food_name)
+                         .order_by(count.desc(), calories.desc())
+                         .limit(top)
+                     )]
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'daily': daily,
+        'weekly': list(weekly.values()),
+        'top_foods': top_foods,
     })
 
+@app.route("/api/analytics")
+def api_analytics():
+    """API端點：最近 N 天的熱量趨勢、星期與時段分布、常吃食物與目標差距"""
+    days = min(max(request.args.get('days', 90, type=int), 1), 3660)
+    window = min(max(request.args.get('window', 7, type=int), 1), 90)
+    top = min(max(request.args.get('top', 10, type=int), 0), 100)
+    target = request.args.get('target', type=int)
+    # 使用者時區相對 UTC 的分鐘數（台灣為 480），用於切分日期與時段
+    utc_offset = min(max(request.args.get('utc_offset', 0, type=int), -840), 840)
+
+    end = (datetime.utcnow() + timedelta(minutes=utc_offset)).date()
+    start = end - timedelta(days=days - 1)
+    since = datetime.combine(start, datetime.min.time()) - timedelta(minutes=utc_offset)
+
+    # 只取需要的欄位，由索引範圍掃描後直接轉為陣列
+    meal_rows = db.session.execute(
+        db.select(MealRecord.date, MealRecord.total_calories).where(MealRecord.date >= since)
+    )
+    food_rows = db.session.execute(
+        db.select(MealRecord.date, FoodItem.name, FoodItem.calories)
+        .join(MealRecord, FoodItem.meal_record_id == MealRecord.id)
+        .where(MealRecord.date >= since)
+    )
+    history = MealHistory.from_rows(meal_rows, food_rows, utc_offset)
+    return jsonify(analyse_history(history, start, end, target, window, top))
+
 @app.route("/delete_meal/<int:meal_id>", methods=["DELETE"])
 def delete_meal(meal_id):
     try:
         meal_record = MealRecord.query.get_or_404(meal_id)
+        foods = [{'name': food.name, 'calories': food.calories} for food in meal_record.foods]
+        _apply_rollups([(meal_record.date.date(), meal_record.total_calories, foods)], -1)
         db.session.delete(meal_record)
         db.session.commit()
         return jsonify({"success": True, "message": "餐點記錄已刪除"})
@@ -145,6 +735,10 @@ def create_tables():
 # 初始化爬蟲
 scraper = NutritionScraper()
 advanced_scraper = AdvancedNutritionScraper()
+# 健身網站文章由背景爬蟲程序（crawl_scheduler.py）寫入，請求處理只讀取本機資料
+article_store = ArticleStore()
+# 內建營養資料庫只在第一次搜尋時建立索引，之後依爬蟲更新的網站增量加入
+nutrition_search = NutritionSearch(advanced_scraper.scrape_nutrition_database, article_store)
 
 @app.route("/nutrition")
 def nutrition():
@@ -170,60 +764,23 @@ def api_nutrition_search():
     if not query:
         return jsonify({"error": "請提供搜尋關鍵字"}), 400
     
-    # 建立同義詞映射（可視需要擴充）
-    synonyms_map = {
-        'iron': {"iron", "鐵", "鐵質", "fe", "ferrous", "ferric"},
-        'zinc': {"zinc", "鋅"},
-        'magnesium': {"magnesium", "鎂"},
-        'calcium': {"calcium", "鈣", "ca"},
-        'potassium': {"potassium", "鉀", "k"},
-        'vitamin_c': {"vitamin c", "維生素c", "抗壞血酸", "ascorbic acid"},
-        'folate': {"folate", "葉酸", "維生素b9", "vitamin b9"},
-    }
-    q_lower = query.lower().strip()
-    # 若輸入屬於某一群同義詞，擴充查找關鍵字集合
-    expanded_keywords = {q_lower}
-    for key, variants in synonyms_map.items():
-        if q_lower in variants or q_lower == key:
-            expanded_keywords = expanded_keywords.union(variants).union({key})
-            break
-    
-    # 先嘗試使用進階爬蟲抓取真實內容
-    try:
-        scraped = advanced_scraper.scrape_fitness_websites(query)
-    except Exception as e:
-        scraped = []
-    
-    # 若進階爬蟲無結果，嘗試使用內建資料庫作為後備
-    db_results = []
-    if not scraped:
-        try:
-            db_entries = advanced_scraper.scrape_nutrition_database()
-            for entry in db_entries:
-                title = (entry.get('title') or '').lower()
-                content = (entry.get('content') or '').lower()
-                category = (entry.get('category') or '').lower()
-                # 若任一擴充關鍵字命中，即加入結果
-                if any(k in title or k in content or k in category for k in expanded_keywords):
-                    db_results.append(entry)
-        except Exception:
-            db_results = []
-    
-    # 仍無資料時，退回到基本模擬資料
-    basic = []
-    if not scraped and not db_results:
-        basic = scraper.search_nutrition_info(query) or []
+    # 以倒排索引搜尋內建營養資料庫與背景爬蟲抓取的文章（同義詞已在建立索引時展開），
+    # 沒有結果時修正拼字（例如 magnesum、vitamn c）後再搜尋一次
+    results, corrected_query = nutrition_search.search_with_correction(query)
     
-    # 合併結果（避免重複，保留有內容的）
+    # 去除標題重複的結果（不同網站可能刊登相同文章）
     seen_titles = set()
     merged = []
-    for item in (scraped + db_results + basic):
+    for item in results:
         title = item.get('title')
         if title and title not in seen_titles:
             seen_titles.add(title)
             merged.append(item)
     
-    return jsonify({"results": merged})
+    response = {"results": merged}
+    if corrected_query:
+        response["corrected_query"] = corrected_query
+    return jsonify(response)
 
 @app.route("/api/nutrition/meal-suggestions")
 def api_meal_suggestions():
@@ -275,14 +832,14 @@ def api_workout_nutrition_plan():
 
 @app.route("/api/nutrition/scrape-websites")
 def api_scrape_websites():
-    """API端點：爬取健身網站"""
+    """API端點：查詢背景爬蟲抓取的健身網站文章，並附上各網站的爬取時間"""
     query = request.args.get('query', 'nutrition tips')
     
     try:
-        results = advanced_scraper.scrape_fitness_websites(query)
-        return jsonify({"results": results})
+        results = article_store.search(query)
+        return jsonify({"results": results, "freshness": article_store.freshness()})
     except Exception as e:
-        return jsonify({"error": f"爬取失敗: {str(e)}"}), 500
+        return jsonify({"error": f"讀取爬取文章失敗: {str(e)}"}), 500
 
 @app.route("/api/nutrition/database")
 def api_nutrition_database():
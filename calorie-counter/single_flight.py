@@ -0,0 +1,119 @@
+"""
+單一飛行 (single-flight) 請求合併
+相同鍵的呼叫正在進行時，後到的請求等待同一個結果，不重複呼叫模型
+
+同一程序內以 threading.Event 等待；設定鎖目錄時另以檔案鎖在多個 gunicorn worker
+之間互斥，取得鎖的一方應先重新查詢共用快取。
+"""
+
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只在程序內合併
+    fcntl = None
+
+# 檔案鎖依鍵分散到固定數量的鎖檔，避免每張圖片留下一個鎖檔
+LOCK_STRIPES = 1024
+
+
+class _Call:
+    """同一個鍵進行中的呼叫，由領導者與等待者共用"""
+
+    def __init__(self):
+        self.result = None
+        self.error: Optional[BaseException] = None
+        # 領導者未完成就離開（例如串流的用戶端離線），等待者應重新爭取呼叫權而非失敗
+        self.abandoned = False
+        self.event = threading.Event()
+
+
+class _Claim:
+    def __init__(self, call: _Call, leader: bool):
+        self._call = call
+        self.leader = leader
+
+    @property
+    def result(self):
+        return self._call.result
+
+    @result.setter
+    def result(self, value) -> None:
+        self._call.result = value
+
+    def wait(self):
+        """等待領導者完成並回傳相同結果"""
+        self._call.event.wait()
+        if self._call.error is not None:
+            raise self._call.error
+        return self._call.result
+
+
+class SingleFlight:
+    def __init__(self, lock_dir: Optional[str] = None):
+        self.lock_dir = lock_dir
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self) -> bool:
+        """是否在多個程序之間互斥"""
+        return bool(self.lock_dir) and fcntl is not None
+
+    @contextmanager
+    def _process_lock(self, key: str):
+        if not self.shared:
+            yield
+            return
+
+        os.makedirs(self.lock_dir, exist_ok=True)
+        stripe = zlib.crc32(key.encode("utf-8")) % LOCK_STRIPES
+        with open(os.path.join(self.lock_dir, f"{stripe:04d}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def claim(self, key: str):
+        """取得鍵的呼叫權；call.leader 為 True 時須設定 call.result，否則呼叫 call.wait()"""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+            call.event.wait()
+            if not call.abandoned:
+                yield _Claim(call, False)
+                return
+            # 領導者中斷不是上游錯誤，重新爭取呼叫權
+
+        try:
+            with self._process_lock(key):
+                yield _Claim(call, True)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            # 串流中斷 (GeneratorExit) 或未設定結果就離開時，等待者改為自行呼叫
+            if call.error is None and call.result is None:
+                call.abandoned = True
+            call.event.set()
+
+    def do(self, key: str, fn: Callable):
+        """執行 fn，相同鍵同時只執行一次"""
+        with self.claim(key) as call:
+            if not call.leader:
+                return call.wait()
+            call.result = fn()
+            return call.result
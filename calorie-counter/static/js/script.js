@@ -1,6 +1,8 @@
 const upload_button = document.querySelector("#upload");
 const calorie_count = document.querySelector("#calorie-count");
 
+const POLL_INTERVAL_MS = 500;
+
 upload_button.addEventListener("click", () => {
     // ask to upload a file or take an image
     const file_input = document.createElement("input");
@@ -16,17 +18,147 @@ upload_button.addEventListener("click", () => {
         const fd = new FormData();
         fd.append("image", file);
 
-        fetch("/upload", {
-            method: "POST",
-            body: fd
-        }).then(response => response.json())
-        .then(data => {
+        calorie_count.textContent = "";
+        const items_list = document.createElement("ul");
+        calorie_count.appendChild(items_list);
+
+        const show_item = item => {
+            const li = document.createElement("li");
+            li.textContent = `${item.name}: ${item.calories}`;
+            items_list.appendChild(li);
+            calorie_count.style.display = "block";
+        };
+
+        // 預設以工作模式輪詢，模型在背景執行緒執行，不佔用 worker；
+        // 伺服器以 gthread 或 gevent worker 部署並開啟 CALORIE_UI_STREAMING 時才改用串流
+        const analysis = supports_streaming()
+            ? analyse_streaming(fd, show_item)
+            : analyse_job(fd, show_item);
+
+        analysis.then(calories => {
             stop_loading();
-            calorie_count.textContent = data.calories.total
+            const total = document.createElement("div");
+            total.textContent = calories.total;
+            calorie_count.appendChild(total);
+        })
+        .catch(error => {
+            stop_loading();
+            calorie_count.textContent = error.message;
         });
     });
 });
 
+function supports_streaming() {
+    return document.body.dataset.streamUploads === "true"
+        && window.ReadableStream !== undefined && window.TextDecoder !== undefined;
+}
+
+function analyse_streaming(fd, on_item) {
+    return fetch("/upload/stream", {
+        method: "POST",
+        body: fd
+    }).then(response => {
+        if (!response.ok) {
+            return response.json().then(data => {
+                throw new Error(data.error || "上傳失敗");
+            });
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let result = null;
+
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (value) {
+                    buffer += decoder.decode(value, { stream: true });
+                }
+
+                // SSE 事件以空行分隔
+                let boundary;
+                while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                    const event = parse_sse_event(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+
+                    if (event.type === "item") {
+                        on_item(event.data);
+                    } else if (event.type === "result") {
+                        result = event.data;
+                    } else if (event.type === "error") {
+                        throw new Error(event.data.error || "分析失敗");
+                    }
+                }
+
+                if (done) {
+                    if (result === null) {
+                        throw new Error("分析失敗");
+                    }
+                    return result;
+                }
+                return read();
+            });
+        }
+
+        return read();
+    });
+}
+
+function parse_sse_event(raw) {
+    let type = "message";
+    const data_lines = [];
+    raw.split("\n").forEach(line => {
+        if (line.startsWith("event: ")) {
+            type = line.slice(7);
+        } else if (line.startsWith("data: ")) {
+            data_lines.push(line.slice(6));
+        }
+    });
+    return { type: type, data: JSON.parse(data_lines.join("\n")) };
+}
+
+function analyse_job(fd, on_item) {
+    // 以工作模式上傳，伺服器立即回傳工作 ID，再輪詢結果
+    return fetch("/upload?mode=job", {
+        method: "POST",
+        body: fd
+    }).then(response => response.json().then(data => {
+        if (!response.ok) {
+            throw new Error(data.error || "上傳失敗");
+        }
+        return poll_job(data.status_url, on_item);
+    }));
+}
+
+function poll_job(status_url, on_item) {
+    return new Promise((resolve, reject) => {
+        // 執行中的工作回傳已完成的食物項目，只顯示新增的部分
+        let shown = 0;
+
+        function show_new(items) {
+            items.slice(shown).forEach(on_item);
+            shown = Math.max(shown, items.length);
+        }
+
+        function check() {
+            fetch(status_url)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status === "done") {
+                    show_new(data.calories.food_items || []);
+                    resolve(data.calories);
+                } else if (data.status === "failed" || data.error) {
+                    reject(new Error(data.error || "分析失敗"));
+                } else {
+                    show_new(data.items || []);
+                    setTimeout(check, POLL_INTERVAL_MS);
+                }
+            })
+            .catch(reject);
+        }
+        check();
+    });
+}
 
 function loading() {
     document.querySelector("#upload").style.display = "none";
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+本機視覺模型模擬伺服器
+模擬 OpenAI chat completions 端點並可設定延遲與錯誤率，用於壓力測試與離線效能量測
+
+使用方法:
+    python stub_vision_server.py --port 8081 --latency 2.0
+    OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=stub python server.py
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONTENT = {
+    "reasoning": "A grilled chicken salad with mixed greens, cherry tomatoes and a light vinaigrette.",
+    "food_items": [
+        {"name": "Grilled chicken breast", "calories": "220"},
+        {"name": "Mixed greens", "calories": "20"},
+        {"name": "Cherry tomatoes", "calories": "25"},
+        {"name": "Vinaigrette", "calories": "90"},
+    ],
+    "total": "355",
+}
+
+
+class StubVisionHandler(BaseHTTPRequestHandler):
+    # 由 main() 依命令列參數設定
+    content = json.dumps(DEFAULT_CONTENT)
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    stream_chunk_chars = 24
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "gpt-4o")
+
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if random.random() < self.error_rate:
+            self._send_json(503, {"error": {"message": "Stub server overloaded", "type": "server_error"}})
+            return
+
+        completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        # 以請求大小粗估 token 數，讓成本統計有數字可看
+        usage = {
+            "prompt_tokens": max(1, length // 4),
+            "completion_tokens": max(1, len(self.content) // 4),
+            "total_tokens": max(1, length // 4) + max(1, len(self.content) // 4),
+        }
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send_chunk(delta, finish_reason=None, chunk_usage=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if chunk_usage is not None:
+                chunk["choices"] = []
+                chunk["usage"] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send_chunk({"role": "assistant", "content": ""})
+        for i in range(0, len(self.content), self.stream_chunk_chars):
+            send_chunk({"content": self.content[i:i + self.stream_chunk_chars]})
+            time.sleep(0.01)
+        send_chunk({}, finish_reason="stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send_chunk({}, chunk_usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機視覺模型模擬伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=2.0, help="每次回應的平均延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.5, help="延遲的隨機浮動範圍（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳 503 的機率 (0-1)")
+    parser.add_argument("--response", help="自訂回應內容的 JSON 檔案")
+    args = parser.parse_args()
+
+    StubVisionHandler.latency = args.latency
+    StubVisionHandler.jitter = args.jitter
+    StubVisionHandler.error_rate = args.error_rate
+    if args.response:
+        with open(args.response, "r", encoding="utf-8") as f:
+            StubVisionHandler.content = json.dumps(json.load(f), ensure_ascii=False)
+
+    server = ThreadingHTTPServer((args.host, args.port), StubVisionHandler)
+    print(f"模擬伺服器已啟動: http://{args.host}:{args.port}/v1 (延遲 {args.latency}±{args.jitter} 秒)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+非同步圖片分析工作測試腳本
+以模擬的分析函數執行，不呼叫 OpenAI
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+# 統計數據不寫入專案的 cache/metrics，避免混入正式環境的 /metrics
+os.environ.setdefault('CALORIE_METRICS_DIR', os.path.join(_db_dir, 'metrics'))
+
+import server
+from analysis_jobs import AnalysisJobQueue, QueueFullError
+from analysis_result import CalorieAnalysis
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_images")
+
+def _read_image(name):
+    with open(os.path.join(IMAGE_DIR, name), "rb") as f:
+        return f.read()
+
+MEAL_IMAGE = _read_image("test image.jpg")
+# 模擬分析失敗的圖片
+BAD_IMAGE = _read_image(sorted(name for name in os.listdir(IMAGE_DIR) if name.endswith(".webp"))[0])
+
+def _wait_for(queue, job_id, status, timeout=5.0):
+    """輪詢直到工作進入指定狀態"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job is not None and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"工作 {job_id} 未在 {timeout} 秒內進入 {status}: {queue.get(job_id)}")
+
+def test_queue_full_and_pending_count():
+    """測試佇列已滿時拒絕工作，完成或失敗後釋出名額"""
+    print("🧪 測試佇列上限...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = AnalysisJobQueue(directory, max_workers=1, max_pending=2)
+        release = threading.Event()
+
+        def blocked(value):
+            release.wait(5)
+            if value == "bad":
+                raise ValueError("無法辨識的圖片")
+            return {"total": value}
+
+        first = queue.submit(blocked, 100)
+        second = queue.submit(blocked, "bad")
+        try:
+            queue.submit(blocked, 300)
+            raise AssertionError("佇列已滿時應拋出 QueueFullError")
+        except QueueFullError:
+            pass
+        assert queue.get(second)["status"] == "queued"
+
+        release.set()
+        assert _wait_for(queue, first, "done")["result"] == {"total": 100}
+        assert _wait_for(queue, second, "failed")["error"] == "無法辨識的圖片"
+        # 失敗的工作也要釋出名額
+        assert queue._pending == 0
+        third = queue.submit(blocked, 300)
+        assert _wait_for(queue, third, "done")["result"] == {"total": 300}
+        print("   佇列已滿時拒絕，完成與失敗後皆釋出名額")
+
+def test_shared_directory():
+    """測試其他 worker 可透過共用目錄讀取工作狀態"""
+    print("\n🧪 測試跨 worker 輪詢...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        worker_a = AnalysisJobQueue(directory)
+        worker_b = AnalysisJobQueue(directory)
+        job_id = worker_a.submit(lambda: {"total": 445})
+        assert _wait_for(worker_b, job_id, "done")["result"] == {"total": 445}
+        # 不合法或不存在的工作 ID
+        assert worker_b.get("../etc/passwd") is None
+        assert worker_b.get("0" * 32) is None
+
+def test_cleanup():
+    """測試超過保留時間的工作狀態檔會被刪除"""
+    print("\n🧪 測試過期工作清除...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = AnalysisJobQueue(directory, ttl_seconds=60)
+        old = queue.submit(lambda: {"total": 1})
+        _wait_for(queue, old, "done")
+        past = time.time() - 120
+        os.utime(queue._path(old), (past, past))
+
+        # 每分鐘最多清除一次，第一次提交時已清除過
+        recent = queue.submit(lambda: {"total": 2})
+        assert queue.get(old) is not None
+        queue._last_cleanup = 0.0
+        kept = queue.submit(lambda: {"total": 3})
+        assert queue.get(old) is None
+        _wait_for(queue, recent, "done")
+        _wait_for(queue, kept, "done")
+
+def test_stream_job_items():
+    """測試串流工作在執行中即可讀到已完成的項目"""
+    print("\n🧪 測試串流工作...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = AnalysisJobQueue(directory)
+        first_item = threading.Event()
+        release = threading.Event()
+
+        def stream():
+            yield "item", {"name": "白飯", "calories": 280}
+            first_item.set()
+            release.wait(5)
+            yield "item", {"name": "雞胸肉", "calories": 165}
+            yield "result", {"total": 445}
+
+        job_id = queue.submit_stream(stream)
+        assert first_item.wait(5)
+        job = queue.get(job_id)
+        assert job["status"] == "running" and job["items"] == [{"name": "白飯", "calories": 280}]
+        release.set()
+        assert _wait_for(queue, job_id, "done")["result"] == {"total": 445}
+
+        # 沒有產生結果的串流視為失敗
+        empty = queue.submit_stream(lambda: iter([("item", {"name": "白飯"})]))
+        assert _wait_for(queue, empty, "failed")["error"] == "分析沒有產生結果"
+        assert queue._pending == 0
+
+@contextmanager
+def _fake_server_analysis(queue, analyse):
+    """暫時替換伺服器的工作佇列與串流分析函數，結束時還原"""
+    saved = server.analysis_jobs, server.stream_calories_from_image
+    server.analysis_jobs = queue
+    server.stream_calories_from_image = analyse
+    try:
+        yield server.app.test_client()
+    finally:
+        server.analysis_jobs, server.stream_calories_from_image = saved
+
+def _upload(client, url, image=MEAL_IMAGE):
+    return client.post(url, data={"image": (io.BytesIO(image), "meal.jpg")},
+                       content_type="multipart/form-data")
+
+def test_job_endpoints():
+    """測試 /upload?mode=job 與 /upload/<job_id>"""
+    print("\n🧪 測試工作模式 API...")
+
+    first_item = threading.Event()
+    release = threading.Event()
+
+    def analyse(image_bytes):
+        if image_bytes == BAD_IMAGE:
+            raise ValueError("無法辨識的圖片")
+        analysis = CalorieAnalysis.from_model_output({"food_items": [{"name": "白飯", "calories": 280}]})
+        yield "item", analysis.food_items[0]
+        first_item.set()
+        release.wait(5)
+        yield "result", analysis
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = AnalysisJobQueue(directory, max_workers=1, max_pending=1)
+        with _fake_server_analysis(queue, analyse) as client:
+            response = _upload(client, "/upload?mode=job")
+            assert response.status_code == 202
+            data = response.get_json()
+            assert data["status_url"] == f"/upload/{data['job_id']}"
+            # 執行中即可輪詢到已完成的食物項目
+            assert first_item.wait(5)
+            status = client.get(data["status_url"]).get_json()
+            assert status == {"job_id": data["job_id"], "status": "running",
+                              "items": [{"name": "白飯", "calories": 280}]}
+
+            # 名額用完時回應 429 並建議稍後重試
+            busy = _upload(client, "/upload?mode=job")
+            assert busy.status_code == 429 and busy.headers["Retry-After"] == "5"
+
+            release.set()
+            _wait_for(queue, data["job_id"], "done")
+            status = client.get(data["status_url"]).get_json()
+            assert status["status"] == "done" and status["calories"]["total"] == 280
+
+            failed = _upload(client, "/upload?mode=job", BAD_IMAGE).get_json()
+            _wait_for(queue, failed["job_id"], "failed")
+            status = client.get(failed["status_url"]).get_json()
+            assert status == {"job_id": failed["job_id"], "status": "failed", "error": "無法辨識的圖片"}
+
+            # 首頁預設使用工作模式，不佔用同步 worker 串流
+            assert b'data-stream-uploads="false"' in client.get("/").data
+
+            assert client.get(f"/upload/{'0' * 32}").status_code == 404
+            assert client.get("/upload/not-a-job").status_code == 404
+    print("   202 → 輪詢 → done／failed，佇列已滿時 429")
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試非同步分析工作...")
+    print("=" * 50)
+
+    try:
+        test_queue_full_and_pending_count()
+        test_shared_directory()
+        test_cleanup()
+        test_stream_job_items()
+        test_job_endpoints()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分析結果正規化測試腳本
+"""
+
+import sys
+
+from analysis_result import MAX_CALORIES, CalorieAnalysis, parse_calories
+
+def test_parse_calories():
+    """測試自由格式卡路里數值的解析"""
+    print("🧪 測試卡路里數值解析...")
+
+    cases = {
+        "350": 350,
+        "about 350 kcal": 350,
+        "300-400 kcal": 350,
+        "300 to 400": 350,
+        "1,200 kcal": 1200,
+        "約350大卡": 350,
+        12.6: 13,
+        0: 0,
+        "unknown": None,
+        None: None,
+        -5: None,
+        "-5": None,
+        "-5 kcal": None,
+        True: None,
+        # 超過上限的幻覺數值不應寫入資料庫
+        MAX_CALORIES: MAX_CALORIES,
+        MAX_CALORIES + 1: None,
+        1e12: None,
+        "1e12": None,
+        "1000000000000 kcal": None,
+        "300-1000000": None,
+    }
+    for value, expected in cases.items():
+        result = parse_calories(value)
+        print(f"   {value!r} -> {result}")
+        assert result == expected, f"{value!r} 應為 {expected}，實際為 {result}"
+
+def test_total_recomputed():
+    """測試總熱量以各項加總重新計算並標記不一致"""
+    print("\n🧪 測試總熱量重新計算...")
+
+    analysis = CalorieAnalysis.from_model_output({
+        "reasoning": "rice and egg",
+        "food_items": [
+            {"name": "rice", "calories": "about 200 kcal"},
+            {"name": "egg", "calories": "70-90"},
+        ],
+        "total": "500 kcal",
+    })
+    assert analysis.total == 280
+    assert analysis.reported_total == 500
+    assert not analysis.consistent
+    print(f"   警告: {analysis.warnings}")
+
+    analysis = CalorieAnalysis.from_model_output({
+        "food_items": [{"name": "rice", "calories": "200"}],
+        "total": "210",
+    })
+    assert analysis.total == 200
+    assert analysis.consistent
+
+def test_malformed_output():
+    """測試格式錯誤的模型輸出"""
+    print("\n🧪 測試格式錯誤的輸出...")
+
+    analysis = CalorieAnalysis.from_model_output({"food_items": "none", "total": "about 400"})
+    assert analysis.food_items == []
+    assert analysis.total == 400
+
+    analysis = CalorieAnalysis.from_model_output({"food_items": [{"name": "", "calories": "?"}]})
+    assert analysis.food_items[0].name == "未知食物"
+    assert analysis.food_items[0].calories == 0
+    assert not analysis.consistent
+
+    # 超過上限的總熱量不採用，也不會讓寫入資料庫時溢位
+    analysis = CalorieAnalysis.from_model_output({"food_items": [], "total": 1e12})
+    assert analysis.total == 0
+    assert analysis.reported_total is None
+    assert not analysis.consistent
+
+    data = analysis.to_dict()
+    assert set(data) == {"reasoning", "food_items", "total", "reported_total", "consistent", "warnings"}
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試分析結果正規化...")
+    print("=" * 50)
+
+    try:
+        test_parse_calories()
+        test_total_recomputed()
+        test_malformed_output()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
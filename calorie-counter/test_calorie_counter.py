@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+卡路里分析流程測試腳本
+以模擬的視覺模型後端執行，不呼叫 OpenAI
+"""
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+
+# 統計數據與快取不寫入專案目錄
+_cache_dir = tempfile.mkdtemp()
+os.environ.setdefault('CALORIE_METRICS_DIR', '')
+os.environ.setdefault('CALORIE_CACHE_DIR', os.path.join(_cache_dir, 'analyses'))
+os.environ.setdefault('CALORIE_PHASH_INDEX', os.path.join(_cache_dir, 'phash.idx'))
+os.environ.setdefault('CALORIE_SINGLEFLIGHT_LOCK_DIR', '')
+
+import calorie_counter
+from image_cache import ImageResultCache
+from openai_client import CircuitOpenError
+from phash_index import PerceptualHashIndex
+from single_flight import SingleFlight
+from vision_backends import VisionBackend, VisionResponse
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_images")
+
+MODEL_OUTPUT = json.dumps({
+    "reasoning": "一碗白飯與一份雞胸肉",
+    "food_items": [
+        {"name": "白飯", "calories": "280"},
+        {"name": "雞胸肉", "calories": "165"},
+    ],
+    "total": "445",
+}, ensure_ascii=False)
+
+class FakeBackend(VisionBackend):
+    """回傳固定內容的視覺模型後端，串流時每段 chunk_chars 個字元"""
+
+    def __init__(self, content=MODEL_OUTPUT, chunk_chars=8):
+        self.content = content
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+
+    def complete(self, request):
+        self.calls += 1
+        return VisionResponse(self.content, request.model, {"prompt_tokens": 100, "completion_tokens": 50})
+
+    def stream(self, request):
+        self.calls += 1
+        for i in range(0, len(self.content), self.chunk_chars):
+            yield self.content[i:i + self.chunk_chars]
+        return VisionResponse(self.content, request.model, {"prompt_tokens": 100, "completion_tokens": 50})
+
+@contextmanager
+def fake_backend(backend):
+    """暫時以模擬後端與空白快取取代 calorie_counter 的模組狀態，結束時還原"""
+    names = ("backend", "image_cache", "phash_index", "single_flight")
+    saved = {name: getattr(calorie_counter, name) for name in names}
+    with tempfile.TemporaryDirectory() as directory:
+        calorie_counter.backend = backend
+        calorie_counter.image_cache = ImageResultCache(os.path.join(directory, "analyses"))
+        calorie_counter.phash_index = PerceptualHashIndex(os.path.join(directory, "phash.idx"))
+        calorie_counter.single_flight = SingleFlight(None)
+        try:
+            yield directory
+        finally:
+            for name, value in saved.items():
+                setattr(calorie_counter, name, value)
+
+def _read_test_image():
+    with open(os.path.join(IMAGE_DIR, "test image.jpg"), "rb") as f:
+        return f.read()
+
+def _vision_requests(outcome):
+    key = f'backend="{calorie_counter.VISION_BACKEND}",model="{calorie_counter.MODEL}",outcome="{outcome}"'
+    return calorie_counter.vision_requests.values.get(key, 0)
+
+class CircuitOpenBackend(FakeBackend):
+    """模擬斷路器開啟，呼叫在送出前即被拒絕"""
+
+    def complete(self, request):
+        self.calls += 1
+        raise CircuitOpenError(30)
+
+    def stream(self, request):
+        # 預設的串流實作呼叫 complete
+        return VisionBackend.stream(self, request)
+
+def _upload_observations():
+    return sum(state["count"] for state in calorie_counter.vision_upload_bytes.values.values())
+
+def _feed_in_pieces(text, cuts):
+    """在 cuts 指定的位置切開 text 依序餵給解析器，回傳所有取出的項目"""
+    parser = calorie_counter.FoodItemStreamParser()
+    items = []
+    bounds = [0, *cuts, len(text)]
+    for start, end in zip(bounds, bounds[1:]):
+        items.extend(parser.feed(text[start:end]))
+    return items
+
+def test_stream_parser():
+    """測試逐段解析 food_items，在任意位置切開結果都相同"""
+    print("🧪 測試串流 JSON 解析...")
+
+    output = json.dumps({
+        "reasoning": 'food_items: [{"name": "誤判"}] 與 "引號" \\ 及 {大括號}',
+        "notes": {"food_items": [{"name": "巢狀物件中的同名鍵"}]},
+        "food_items": [
+            {"name": "滷肉飯 {大碗}", "calories": "520"},
+            {"name": '說明含 \\"跳脫引號\\" 與 ]', "calories": 80, "detail": {"portion": {"grams": 150}}},
+            {"name": "味噌湯", "calories": "40", "tags": ["湯", "}"]},
+        ],
+        "total": "640",
+    }, ensure_ascii=False)
+    expected = json.loads(output)["food_items"]
+
+    assert _feed_in_pieces(output, []) == expected
+    # 每個位置切成兩段，以及逐字元餵入
+    for cut in range(1, len(output)):
+        assert _feed_in_pieces(output, [cut]) == expected, f"在第 {cut} 個字元切開"
+    assert _feed_in_pieces(output, range(1, len(output))) == expected
+
+    # 項目完成時立即回傳，不等待整個陣列
+    parser = calorie_counter.FoodItemStreamParser()
+    first_item_end = output.index('"calories": "520"}') + len('"calories": "520"}')
+    assert parser.feed(output[:first_item_end]) == expected[:1]
+    assert parser.feed(output[first_item_end:]) == expected[1:]
+
+    # 沒有 food_items 或格式錯誤的項目不會拋出例外
+    assert _feed_in_pieces('{"total": 0}', [3]) == []
+    assert _feed_in_pieces('{"food_items": [{"name": }, {"name": "飯"}]}', [5]) == [{"name": "飯"}]
+    print(f"   {len(output)} 個切點皆取出 {len(expected)} 個項目")
+
+def test_stream_aborted():
+    """測試用戶端在串流途中離線時仍記錄模型呼叫"""
+    print("\n🧪 測試串流中斷...")
+
+    backend = FakeBackend()
+    with fake_backend(backend):
+        aborted = _vision_requests("aborted")
+        events = calorie_counter.stream_calories_from_image(_read_test_image())
+        kind, item = next(events)
+        assert kind == "item" and item.name == "白飯"
+        # 模擬 SSE 用戶端中斷連線
+        events.close()
+        assert _vision_requests("aborted") == aborted + 1
+
+        # 完整串流記錄為成功
+        success = _vision_requests("success")
+        events = list(calorie_counter.stream_calories_from_image(_read_test_image()))
+        assert [kind for kind, _ in events] == ["item", "item", "result"]
+        assert events[-1][1].total == 445
+        assert _vision_requests("success") == success + 1
+        assert backend.calls == 2
+    print("   中斷的串流已記錄為 aborted")
+
+def test_circuit_open_outcome():
+    """測試斷路器拒絕的呼叫另外記錄，不計入耗時與上傳量"""
+    print("\n🧪 測試斷路器拒絕的呼叫...")
+
+    with fake_backend(CircuitOpenBackend()):
+        rejected = _vision_requests("circuit_open")
+        errors = _vision_requests("error")
+        uploads = _upload_observations()
+        for analyse in (calorie_counter.get_calories_from_image,
+                        lambda image: list(calorie_counter.stream_calories_from_image(image))):
+            try:
+                analyse(_read_test_image())
+                raise AssertionError("應拋出 CircuitOpenError")
+            except CircuitOpenError:
+                pass
+        assert _vision_requests("circuit_open") == rejected + 2
+        assert _vision_requests("error") == errors
+        assert _upload_observations() == uploads
+
+    # 斷路器狀態變化記錄為事件與量測值
+    opened = calorie_counter.circuit_events.values.get('event="opened"', 0)
+    calorie_counter._record_circuit_event("opened")
+    assert calorie_counter.circuit_events.values['event="opened"'] == opened + 1
+    assert calorie_counter.circuit_open.values[""] == 1
+    calorie_counter._record_circuit_event("closed")
+    assert calorie_counter.circuit_open.values[""] == 0
+
+def _image_tree(directory):
+    """在目錄下放三張不同的測試圖片與一個非圖片檔，回傳圖片路徑"""
+    sources = sorted(name for name in os.listdir(IMAGE_DIR) if name.endswith(".webp"))[:2]
+    paths = [os.path.join(directory, "a.jpg"), os.path.join(directory, "sub", "b.webp"),
+             os.path.join(directory, "sub", "c.WEBP")]
+    os.makedirs(os.path.join(directory, "sub"))
+    for source, path in zip(["test image.jpg", *sources], paths):
+        shutil.copyfile(os.path.join(IMAGE_DIR, source), path)
+    with open(os.path.join(directory, "sub", "notes.txt"), "w") as f:
+        f.write("不是圖片")
+    return paths
+
+def test_find_images():
+    """測試展開目錄、glob 與檔案路徑，去除重複並排序"""
+    print("\n🧪 測試尋找圖片...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        a, b, c = _image_tree(directory)
+        # 目錄遞迴時依副檔名（不分大小寫）篩選
+        assert calorie_counter.find_images([directory]) == [a, b, c]
+        assert calorie_counter.find_images([os.path.join(directory, "**", "*.webp")]) == [b]
+        # glob 不篩選副檔名，但略過目錄
+        assert calorie_counter.find_images([os.path.join(directory, "sub", "*")]) == [
+            b, c, os.path.join(directory, "sub", "notes.txt")]
+        # 明確指定的檔案直接保留，重複的路徑只出現一次
+        assert calorie_counter.find_images([c, os.path.join(directory, "sub", "..", "a.jpg"), directory]) == [a, b, c]
+        assert calorie_counter.find_images([os.path.join(directory, "*.png")]) == []
+
+def _run_cli(*args):
+    """以指定參數執行命令列主程式，回傳 stdout 與 stderr 的內容"""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    saved_argv = sys.argv
+    sys.argv = ["calorie_counter.py", *args]
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            calorie_counter.main()
+    finally:
+        sys.argv = saved_argv
+    return stdout.getvalue(), stderr.getvalue()
+
+def test_cli_stdout():
+    """測試 stdout 只輸出結果，預處理與模型呼叫的紀錄寫到 stderr"""
+    print("\n🧪 測試命令列輸出...")
+
+    with fake_backend(FakeBackend()) as directory:
+        a, b, c = _image_tree(os.path.join(directory, "images"))
+
+        # 單張圖片輸出一個完整的 JSON
+        stdout, stderr = _run_cli(a, "--no-cache")
+        assert json.loads(stdout)["total"] == 445
+        assert "模型呼叫" in stderr
+
+        # 多張圖片時每行一筆 NDJSON 紀錄
+        stdout, stderr = _run_cli(os.path.dirname(a), "--no-cache")
+        records = [json.loads(line) for line in stdout.splitlines()]
+        assert sorted(record["image"] for record in records) == [a, b, c]
+        assert all(record["calories"]["total"] == 445 for record in records)
+        assert stderr.count("模型呼叫:") == 3
+    print("   stdout 可逐行解析為 JSON")
+
+def test_resume_output():
+    """測試指定輸出檔時跳過已成功的圖片，並修補中斷時寫到一半的最後一行"""
+    print("\n🧪 測試中斷後續跑...")
+
+    backend = FakeBackend()
+    with fake_backend(backend) as directory:
+        a, b, c = _image_tree(os.path.join(directory, "images"))
+        output_path = os.path.join(directory, "results.ndjson")
+        assert calorie_counter._completed_images(output_path) == set()
+
+        # a 已成功、b 失敗、c 寫到一半時中斷
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"image": a, "calories": {"total": 445}}) + "\n")
+            f.write(json.dumps({"image": b, "error": "timeout"}) + "\n")
+            f.write(json.dumps({"image": c, "calories": {"total": 445}})[:-8])
+        assert calorie_counter._completed_images(output_path) == {a}
+
+        stdout, _ = _run_cli(os.path.dirname(a), "-o", output_path, "--no-cache")
+        assert stdout == ""
+        assert backend.calls == 2
+
+        with open(output_path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        # 寫到一半的行保留原樣，新結果從下一行開始
+        assert len(lines) == 5
+        assert {json.loads(line)["image"] for line in lines[3:]} == {b, c}
+        assert all(json.loads(line)["calories"]["total"] == 445 for line in lines[3:])
+        assert calorie_counter._completed_images(output_path) == {a, b, c}
+    print("   只重新分析未成功的 2 張圖片")
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試卡路里分析流程...")
+    print("=" * 50)
+
+    try:
+        test_stream_parser()
+        test_stream_aborted()
+        test_circuit_open_outcome()
+        test_find_images()
+        test_cli_stdout()
+        test_resume_output()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+背景爬蟲排程與文章儲存測試腳本
+以模擬的網站回應執行，不連線到外部網站
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+# 統計數據不寫入專案的 cache/metrics，避免混入正式環境的 /metrics
+os.environ.setdefault('CALORIE_METRICS_DIR', os.path.join(_db_dir, 'metrics'))
+
+import server
+from advanced_scraper import AdvancedNutritionScraper
+from article_store import ArticleStore
+from crawl_scheduler import CrawlScheduler
+from nutrition_search import NutritionSearch
+
+class FakeSiteScraper(AdvancedNutritionScraper):
+    """以固定延遲回傳文章，failing 中的網站拋出錯誤"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = {'women_health'}
+
+    def fetch_site_articles(self, site_name, site_info):
+        time.sleep(0.2)
+        if site_name in self.failing:
+            raise ConnectionError("connection refused")
+        return [
+            {"title": f"High Protein Breakfast ({site_name})", "content": "Eggs and oats...", "source": site_name.title(),
+             "url": site_info['base_url'] + site_info['nutrition_section']},
+            {"title": "Hydration basics", "content": "Drink water before training...", "source": site_name.title(),
+             "url": site_info['base_url'] + site_info['nutrition_section']},
+        ]
+
+def test_crawl_and_backoff():
+    """測試並行爬取、失敗退避與保留舊文章"""
+    print("🧪 測試爬蟲排程...")
+
+    store = ArticleStore(os.path.join(tempfile.mkdtemp(), 'articles.db'))
+    scraper = FakeSiteScraper(min_host_interval=0)
+    scheduler = CrawlScheduler(scraper, store, interval=3600, retry_delay=60, max_backoff=600)
+
+    started = time.monotonic()
+    assert scheduler.run_once() == {'bodybuilding': True, 'men_health': True, 'women_health': False}
+    assert time.monotonic() - started < 0.5, "各網站應並行爬取"
+
+    # 尚未到期的網站不會重新爬取
+    assert scheduler.run_once() == {}
+    state = store.crawl_state()
+    assert state['women_health']['failures'] == 1 and state['women_health']['last_success'] is None
+    assert 30 <= state['women_health']['next_crawl'] - state['women_health']['last_attempt'] <= 60
+    assert state['bodybuilding']['next_crawl'] - state['bodybuilding']['last_success'] >= 3600 * 0.9
+
+    # 連續失敗時延遲加倍，並以 max_backoff 為上限
+    for _ in range(5):
+        scheduler.run_once(now=float("inf"))
+    state = store.crawl_state()['women_health']
+    assert state['failures'] == 6
+    assert 300 <= state['next_crawl'] - state['last_attempt'] <= 600
+    print(f"   連續失敗 {state['failures']} 次，{state['next_crawl'] - state['last_attempt']:.0f} 秒後重試")
+
+    # 成功過的網站之後失敗時保留上次的文章
+    scraper.failing = {'bodybuilding'}
+    scheduler.run_once(now=float("inf"))
+    sources = [article["source"] for article in store.search("protein")]
+    assert sources == ['Bodybuilding', 'Men_Health', 'Women_Health'], sources
+    assert store.crawl_state()['women_health']['failures'] == 0
+
+def test_crawl_rate_limit():
+    """測試爬蟲經過同一主機的請求間隔"""
+    print("\n🧪 測試爬蟲請求間隔...")
+
+    scraper = FakeSiteScraper(min_host_interval=0.5)
+    scraper.failing = set()
+    scraper.fitness_sites = {
+        name: dict(info, base_url='https://www.example.com') for name, info in scraper.fitness_sites.items()
+    }
+    scheduler = CrawlScheduler(scraper, ArticleStore(os.path.join(tempfile.mkdtemp(), 'articles.db')))
+
+    started = time.monotonic()
+    assert all(scheduler.run_once().values())
+    elapsed = time.monotonic() - started
+    print(f"   3 個網站位於同一主機，耗時 {elapsed:.2f} 秒")
+    assert elapsed >= 1.0, "同一主機的請求之間應至少間隔 min_interval"
+
+def test_handlers_read_store():
+    """測試 API 只讀取本機文章，不對外連線"""
+    print("\n🧪 測試 API 讀取爬取文章...")
+
+    store = ArticleStore(os.path.join(tempfile.mkdtemp(), 'articles.db'))
+    client = server.app.test_client()
+    server.article_store = store
+    server.nutrition_search = NutritionSearch(server.advanced_scraper.scrape_nutrition_database, store,
+                                              refresh_interval=0)
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("請求處理不應連線到外部網站")
+    server.advanced_scraper.session.get = no_network
+
+    # 爬蟲尚未執行時退回內建資料
+    data = client.get("/api/nutrition/scrape-websites?query=protein").get_json()
+    assert data == {"results": [], "freshness": {}}
+    assert client.get("/api/nutrition/search?query=iron").get_json()["results"]
+
+    CrawlScheduler(FakeSiteScraper(), store).run_once()
+    data = client.get("/api/nutrition/scrape-websites?query=PROTEIN").get_json()
+    assert len(data["results"]) == 2
+    assert data["freshness"]["bodybuilding"]["last_success"]
+    assert data["freshness"]["women_health"]["last_error"] == "connection refused"
+
+    # 爬取文章與內建資料一起排序，並依標題去除重複
+    results = client.get("/api/nutrition/search?query=hydration").get_json()["results"]
+    assert [(item["title"], item["category"]) for item in results] == [
+        ("Hydration basics", "scraped"), ("水分補充原則", "hydration")], results
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試背景爬蟲...")
+    print("=" * 50)
+
+    try:
+        test_crawl_and_backoff()
+        test_crawl_rate_limit()
+        test_handlers_read_store()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圖片分析結果快取測試腳本
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from image_cache import ImageResultCache
+from phash_index import PerceptualHashIndex, dhash
+
+def test_hit_and_miss():
+    """測試快取命中與未命中統計"""
+    print("🧪 測試快取命中...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ImageResultCache(directory, max_entries=10)
+        key = cache.key_for(b"fake image bytes")
+
+        assert cache.get(key) is None
+        cache.put(key, {"total": 350, "food_items": []})
+        assert cache.get(key) == {"total": 350, "food_items": []}
+
+        # 相同內容必須得到相同的鍵
+        assert cache.key_for(b"fake image bytes") == key
+
+        stats = cache.stats()
+        print(f"   命中: {stats['hits']}，未命中: {stats['misses']}")
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+def test_lru_eviction():
+    """測試超過上限時淘汰最久未使用的項目"""
+    print("\n🧪 測試 LRU 淘汰...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ImageResultCache(directory, max_entries=2)
+        keys = [cache.key_for(bytes([i])) for i in range(3)]
+
+        cache.put(keys[0], {"total": 0})
+        cache.put(keys[1], {"total": 1})
+        # 讓 keys[0] 成為最近使用的項目
+        past = time.time() - 60
+        os.utime(os.path.join(directory, f"{keys[1]}.json"), (past, past))
+        assert cache.get(keys[0]) is not None
+
+        cache.put(keys[2], {"total": 2})
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) == {"total": 0}
+        assert cache.get(keys[2]) == {"total": 2}
+        print("   最久未使用的項目已被淘汰")
+
+def test_disabled():
+    """測試上限為 0 時停用快取"""
+    print("\n🧪 測試停用快取...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ImageResultCache(directory, max_entries=0)
+        key = cache.key_for(b"x")
+        cache.put(key, {"total": 1})
+        assert cache.get(key) is None
+        assert os.listdir(directory) == []
+
+def test_phash_index():
+    """測試感知雜湊索引的近似查詢與重新載入"""
+    print("\n🧪 測試感知雜湊索引...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "phash.idx")
+        index = PerceptualHashIndex(path, max_distance=3)
+        if not index.enabled:
+            print("   未安裝 Pillow，略過")
+            return
+
+        key = ImageResultCache.key_for(b"plate")
+        index.add(0x0123456789ABCDEF, key)
+        index.add(0xFFFF0000FFFF0000, ImageResultCache.key_for(b"other"))
+
+        # 翻轉 3 個位元仍在距離內
+        assert index.lookup(0x0123456789ABCDEF ^ 0b10101) == (key, 3)
+        assert index.lookup(0x0123456789ABCDEF ^ 0b1111) is None
+
+        # 重新啟動後從索引檔恢復
+        reloaded = PerceptualHashIndex(path, max_distance=3)
+        assert reloaded.lookup(0x0123456789ABCDEF) == (key, 0)
+        assert len(reloaded) == 2
+        print("   近似查詢與重新載入正常")
+
+def test_phash_eviction():
+    """測試淘汰快取時同步移除索引項目、略過失效項目與壓縮索引檔"""
+    print("\n🧪 測試感知雜湊索引淘汰...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "phash.idx")
+        index = PerceptualHashIndex(path, max_distance=3, min_compact=2)
+        if not index.enabled:
+            print("   未安裝 Pillow，略過")
+            return
+        other_worker = PerceptualHashIndex(path, max_distance=3, min_compact=2)
+        cache = ImageResultCache(os.path.join(directory, "analyses"), max_entries=2, on_evict=index.remove)
+
+        keys = [cache.key_for(bytes([i])) for i in range(4)]
+        values = [0x0123456789ABCDEF ^ (1 << i) - 1 for i in range(4)]  # 距離 0、1、2、3
+
+        def analyse(i):
+            cache.put(keys[i], {"total": i})
+            # 依序設定修改時間，先分析的項目先被淘汰
+            past = time.time() - 60 + i
+            os.utime(os.path.join(directory, "analyses", f"{keys[i]}.json"), (past, past))
+            index.add(values[i], keys[i])
+
+        analyse(0)
+        analyse(1)
+        assert other_worker.lookup(values[0]) == (keys[0], 0)
+
+        # 最接近的兩筆已被淘汰，查詢時略過它們，不會擋住較遠的有效項目
+        analyse(2)
+        analyse(3)
+        assert index.matches(values[0]) == [(keys[2], 2), (keys[3], 3)]
+        assert len(index) == 2
+
+        # 失效紀錄多於有效紀錄時已壓縮索引檔，其他 worker 發現檔案被取代後重新讀取
+        assert os.path.getsize(path) == 2 * 40
+        assert other_worker.matches(values[0]) == [(keys[2], 2), (keys[3], 3)]
+        index.add(values[0], keys[0])
+        assert other_worker.lookup(values[0]) == (keys[0], 0)
+        print("   已淘汰的項目不再回傳，索引檔已壓縮")
+
+def test_phash_background_load():
+    """測試索引在背景讀入，讀取期間查詢不等待"""
+    print("\n🧪 測試背景讀入索引...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "phash.idx")
+        writer = PerceptualHashIndex(path)
+        if not writer.enabled:
+            print("   未安裝 Pillow，略過")
+            return
+        key = ImageResultCache.key_for(b"plate")
+        writer.add(0x0123456789ABCDEF, key)
+
+        index = PerceptualHashIndex(path)
+        with index._lock:  # 模擬讀取大型索引檔需要一段時間
+            thread = index.load_in_background()
+            started = time.monotonic()
+            assert index.lookup(0x0123456789ABCDEF) is None
+            assert time.monotonic() - started < 0.1
+        thread.join(timeout=5)
+        assert index.lookup(0x0123456789ABCDEF) == (key, 0)
+
+def test_dhash():
+    """測試測試圖片的 dHash 計算"""
+    print("\n🧪 測試 dHash...")
+
+    image_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_images")
+    with open(os.path.join(image_dir, "test image.jpg"), "rb") as f:
+        data = f.read()
+
+    value = dhash(data)
+    if value is None:
+        print("   未安裝 Pillow，略過")
+        return
+    assert value == dhash(data)
+    assert dhash(b"not an image") is None
+    print(f"   dHash: {value:016x}")
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試圖片分析快取...")
+    print("=" * 50)
+
+    try:
+        test_hit_and_miss()
+        test_lru_eviction()
+        test_disabled()
+        test_phash_index()
+        test_phash_eviction()
+        test_phash_background_load()
+        test_dhash()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圖片預處理測試腳本
+"""
+
+import base64
+import io
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+# 統計數據不寫入專案的 cache/metrics，避免混入正式環境的 /metrics
+os.environ.setdefault('CALORIE_METRICS_DIR', os.path.join(_db_dir, 'metrics'))
+
+import server
+from image_preprocess import Image, InvalidImageError, prepare_image, verify_image
+
+def _encode(img, format, **kwargs):
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+def _decode(prepared):
+    return Image.open(io.BytesIO(prepared.data))
+
+def test_downscale_and_mime_type():
+    """測試縮小到最長邊並在 data URL 標示正確格式"""
+    print("🧪 測試縮小與 MIME 類型...")
+
+    if Image is None:
+        print("   未安裝 Pillow，略過")
+        return
+    photo = _encode(Image.new("RGB", (3000, 2000), (200, 120, 40)), "JPEG", quality=95)
+
+    prepared = prepare_image(photo, max_edge=1024, output_format="JPEG")
+    assert _decode(prepared).size == (1024, 683)
+    assert prepared.mime_type == "image/jpeg"
+    assert prepared.data_url().startswith("data:image/jpeg;base64,")
+    assert base64.b64decode(prepared.data_url().split(",", 1)[1]) == prepared.data
+    print(f"   {prepared.original_bytes} -> {len(prepared.data)} bytes")
+
+    prepared = prepare_image(photo, max_edge=512, output_format="WEBP")
+    assert _decode(prepared).format == "WEBP" and max(_decode(prepared).size) == 512
+    assert prepared.data_url().startswith("data:image/webp;base64,")
+
+    # 已經夠小的圖片重新編碼後變大時保留原圖，MIME 類型依原圖格式
+    icon = _encode(Image.new("RGB", (16, 16), (255, 255, 255)), "PNG")
+    prepared = prepare_image(icon, max_edge=1024, output_format="JPEG")
+    assert prepared.data == icon and prepared.data_url().startswith("data:image/png;base64,")
+
+    # 停用縮小時送出原圖
+    prepared = prepare_image(photo, max_edge=0)
+    assert prepared.data == photo and prepared.mime_type == "image/jpeg"
+
+def test_exif_orientation():
+    """測試依 EXIF 方向旋轉，直拍的手機照片不會橫躺"""
+    print("\n🧪 測試 EXIF 方向...")
+
+    if Image is None:
+        print("   未安裝 Pillow，略過")
+        return
+    # 感光元件存成橫向，EXIF 方向 6 表示需順時針旋轉 90 度
+    img = Image.new("RGB", (400, 200), (0, 0, 0))
+    img.paste((255, 255, 255), (0, 0, 200, 200))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    photo = _encode(img, "JPEG", exif=exif.tobytes())
+
+    oriented = _decode(prepare_image(photo, max_edge=1024, output_format="PNG"))
+    assert oriented.size == (200, 400)
+    # 原本左半邊的白色區塊旋轉後位於上半部
+    assert oriented.getpixel((100, 50))[0] > 200 and oriented.getpixel((100, 350))[0] < 50
+    assert oriented.getexif().get(0x0112, 1) == 1
+
+def test_reject_non_images():
+    """測試無法辨識的內容直接拒絕，不送往模型"""
+    print("\n🧪 測試拒絕非圖片內容...")
+
+    if Image is None:
+        print("   未安裝 Pillow，略過")
+        return
+    for data in (b"not img", b"", b"\xff\xd8\xff garbage"):
+        for check in (verify_image, prepare_image, lambda data: prepare_image(data, max_edge=0)):
+            try:
+                check(data)
+                raise AssertionError(f"{data!r} 應被拒絕")
+            except InvalidImageError:
+                pass
+
+    calls = []
+    saved = server.get_calories_from_image
+    server.get_calories_from_image = lambda image_bytes: calls.append(image_bytes)
+    try:
+        client = server.app.test_client()
+        for url in ("/upload", "/upload?mode=job", "/upload/stream"):
+            response = client.post(url, data={"image": (io.BytesIO(b"not img"), "x.jpg")},
+                                   content_type="multipart/form-data")
+            assert response.status_code == 400, url
+            assert response.get_json() == {"error": "Unsupported or invalid image"}
+
+        response = client.post("/upload/batch", data={"images": [(io.BytesIO(b"not img"), "x.jpg")]},
+                               content_type="multipart/form-data")
+        assert response.get_json()["results"] == [{"filename": "x.jpg", "error": "Unsupported or invalid image"}]
+    finally:
+        server.get_calories_from_image = saved
+    assert calls == [], "無法辨識的內容不應呼叫模型"
+    print("   非圖片內容回應 400，沒有呼叫模型")
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試圖片預處理...")
+    print("=" * 50)
+
+    try:
+        test_downscale_and_mime_type()
+        test_exif_orientation()
+        test_reject_non_images()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+餐點趨勢分析測試腳本
+"""
+
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+from meal_analytics import MealHistory, analyse_history, rolling_mean
+
+def test_rolling_mean():
+    """測試移動平均"""
+    print("🧪 測試移動平均...")
+
+    result = rolling_mean(np.array([100, 200, 300, 400, 500]), 3)
+    print(f"   {result}")
+    assert np.allclose(result, [100, 150, 200, 300, 400])
+
+def test_analyse_history():
+    """測試分布、食物占比與目標差距"""
+    print("\n🧪 測試趨勢分析...")
+
+    meal_rows = [
+        (datetime(2024, 1, 1, 0, 30), 500),   # 星期一，UTC+8 為 08:30
+        (datetime(2024, 1, 1, 4, 0), 700),
+        (datetime(2024, 1, 3, 11, 0), 900),   # 星期三 19:00
+        (datetime(2023, 12, 1, 4, 0), 9999),  # 範圍外
+    ]
+    food_rows = [
+        (datetime(2024, 1, 1, 0, 30), "rice", 300),
+        (datetime(2024, 1, 1, 0, 30), "egg", 200),
+        (datetime(2024, 1, 1, 4, 0), "rice", 700),
+        (datetime(2024, 1, 3, 11, 0), "noodles", 900),
+        (datetime(2023, 12, 1, 4, 0), "cake", 9999),
+    ]
+    history = MealHistory.from_rows(meal_rows, food_rows, utc_offset_minutes=480)
+    result = analyse_history(history, date(2024, 1, 1), date(2024, 1, 4), target=1000, window=2, top=5)
+
+    assert result["meal_count"] == 3
+    assert result["logged_days"] == 2
+    assert [day["total_calories"] for day in result["daily"]] == [1200, 0, 900, 0]
+    assert [day["rolling_average"] for day in result["daily"]] == [1200, 600, 450, 450]
+    assert result["weekdays"][0] == {"weekday": "Mon", "meal_count": 2, "average_calories": 1200.0}
+    assert result["weekdays"][2]["meal_count"] == 1
+    assert result["hours"][8]["meal_count"] == 1 and result["hours"][12]["calories"] == 700
+    assert result["hours"][19]["meal_count"] == 1
+
+    foods = result["foods"]
+    assert [food["name"] for food in foods] == ["rice", "noodles", "egg"]
+    assert foods[0]["count"] == 2 and foods[0]["calories"] == 1000
+    assert abs(sum(food["calorie_share"] for food in foods) - 1) < 1e-3
+
+    assert result["target"]["total_difference"] == 100
+    assert result["target"]["days_over"] == 1 and result["target"]["days_under"] == 1
+
+def test_large_history():
+    """測試多年記錄的分析時間"""
+    print("\n🧪 測試大量記錄...")
+
+    rng = np.random.default_rng(0)
+    start = datetime(2020, 1, 1)
+    meal_count = 5 * 365 * 4
+    history = MealHistory(
+        meal_times=np.datetime64(start, "m") + rng.integers(0, 5 * 365 * 24 * 60, meal_count).astype("timedelta64[m]"),
+        meal_calories=rng.integers(100, 1200, meal_count),
+        food_times=np.datetime64(start, "m") + rng.integers(0, 5 * 365 * 24 * 60, meal_count * 3).astype("timedelta64[m]"),
+        food_names=rng.choice(np.array([f"food-{i}" for i in range(500)]), meal_count * 3),
+        food_calories=rng.integers(10, 600, meal_count * 3),
+    )
+
+    started = time.perf_counter()
+    result = analyse_history(history, date(2020, 1, 1), date(2024, 12, 29), target=2000)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"   {meal_count} 筆餐點、{len(result['daily'])} 天: {elapsed:.1f} ms")
+    assert result["meal_count"] == meal_count
+    assert elapsed < 1000
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試餐點趨勢分析...")
+    print("=" * 50)
+
+    try:
+        test_rolling_mean()
+        test_analyse_history()
+        test_large_history()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+餐點記錄 API 測試腳本
+使用暫存的 SQLite 資料庫，不需要 MySQL
+"""
+
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+# 統計數據不寫入專案的 cache/metrics，避免混入正式環境的 /metrics
+os.environ.setdefault('CALORIE_METRICS_DIR', os.path.join(_db_dir, 'metrics'))
+
+from sqlalchemy import event
+
+import server
+from server import FoodItem, MealRecord, app, db, rebuild_rollups
+
+def _reset_database(meal_count):
+    """重建表格並寫入測試用餐點，每筆餐點有兩個食物項目"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        start = datetime(2024, 1, 1, 12, 0)
+        for i in range(meal_count):
+            meal = MealRecord(date=start + timedelta(hours=i), total_calories=300 + i)
+            meal.foods = [FoodItem(name=f"food-{i}-a", calories=100), FoodItem(name=f"food-{i}-b", calories=200 + i)]
+            db.session.add(meal)
+        db.session.commit()
+
+@contextmanager
+def _server_setting(name, value):
+    """暫時修改 server 模組的設定，結束時還原"""
+    saved = getattr(server, name)
+    setattr(server, name, value)
+    try:
+        yield
+    finally:
+        setattr(server, name, saved)
+
+@contextmanager
+def _count_queries():
+    """計算區塊內送到資料庫的 SQL 數量"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def test_constant_query_count():
+    """測試每頁查詢次數不隨餐點數量增加"""
+    print("🧪 測試 /api/meals 查詢次數...")
+
+    client = app.test_client()
+    counts = {}
+    for meal_count in (5, 60):
+        _reset_database(meal_count)
+        with _count_queries() as statements:
+            response = client.get("/api/meals?per_page=50")
+        assert response.status_code == 200
+        counts[meal_count] = len(statements)
+        print(f"   {meal_count} 筆餐點: {len(statements)} 次查詢")
+
+    assert counts[5] == counts[60], f"查詢次數不應隨資料量增加: {counts}"
+    assert counts[60] <= 3
+
+def test_page_contents():
+    """測試游標分頁內容與食物項目"""
+    print("\n🧪 測試游標分頁...")
+
+    _reset_database(12)
+    client = app.test_client()
+
+    data = client.get("/api/meals?per_page=5&count=1").get_json()
+    assert data["total"] == 12
+    assert data["has_next"] and data["next_cursor"]
+    first = data["meals"][0]
+    assert first["total_calories"] == 311
+    assert first["foods"] == [{"name": "food-11-a", "calories": 100}, {"name": "food-11-b", "calories": 211}]
+
+    seen = [meal["total_calories"] for meal in data["meals"]]
+    while data["next_cursor"]:
+        data = client.get(f"/api/meals?per_page=5&cursor={data['next_cursor']}").get_json()
+        assert "total" not in data
+        seen.extend(meal["total_calories"] for meal in data["meals"])
+    assert seen == list(range(311, 299, -1)), seen
+
+    response = client.get("/api/meals?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+def test_cursor_ties():
+    """測試同一時間的多筆餐點依 id 分頁，不重複也不遺漏"""
+    print("\n🧪 測試相同時間的餐點...")
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        same_time = datetime(2024, 1, 1, 12, 0)
+        db.session.add_all([MealRecord(date=same_time, total_calories=i) for i in range(7)])
+        db.session.commit()
+
+    client = app.test_client()
+    ids, cursor = [], ""
+    while True:
+        data = client.get(f"/api/meals?per_page=3&cursor={cursor}").get_json()
+        ids.extend(meal["id"] for meal in data["meals"])
+        if not data["has_next"]:
+            break
+        cursor = data["next_cursor"]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 7, ids
+
+def test_meals_page():
+    """測試 /meals 只在伺服器端輸出第一頁"""
+    print("\n🧪 測試 /meals 頁面...")
+
+    _reset_database(12)
+    client = app.test_client()
+    with _count_queries() as statements:
+        html = client.get("/meals").get_data(as_text=True)
+    assert len(statements) <= 2
+    assert "food-11-a" in html and "food-7-b" in html
+    assert "food-6-a" not in html
+    assert "let nextCursor = \"" in html
+
+def test_stats_rollups():
+    """測試儲存與刪除餐點時增量更新的彙總與重新計算結果一致"""
+    print("\n🧪 測試每日彙總...")
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+
+    meals = [
+        [{"name": "rice", "calories": 200}, {"name": "egg", "calories": 80}],
+        [{"name": "rice", "calories": 250}],
+        [{"name": "salad", "calories": 120}, {"name": "egg", "calories": 70}],
+    ]
+    for foods in meals:
+        response = client.post("/save_meal", json={"foods": foods})
+        assert response.get_json()["success"]
+
+    with app.app_context():
+        salad_meal = db.session.scalar(db.select(FoodItem.meal_record_id).where(FoodItem.name == "salad"))
+    assert client.delete(f"/delete_meal/{salad_meal}").get_json()["success"]
+
+    with _count_queries() as statements:
+        stats = client.get("/api/stats?days=7").get_json()
+    assert len(statements) <= 2
+    today = stats["daily"][-1]
+    assert len(stats["daily"]) == 7
+    assert today == {"date": stats["end"], "total_calories": 530, "meal_count": 2}, today
+    assert sum(week["meal_count"] for week in stats["weekly"]) == 2
+    assert stats["top_foods"][0] == {"name": "rice", "count": 2, "calories": 450}
+    assert "salad" not in [food["name"] for food in stats["top_foods"]]
+
+    # 由明細表重新計算後結果應相同
+    with app.app_context():
+        rebuild_rollups()
+    assert client.get("/api/stats?days=7").get_json() == stats
+
+def test_save_meal_batched():
+    """測試儲存餐點的 SQL 數量不隨食物項目數增加"""
+    print("\n🧪 測試批次寫入食物項目...")
+
+    counts = {}
+    client = app.test_client()
+    for food_count in (1, 20):
+        _reset_database(0)
+        foods = [{"name": f"food-{i}", "calories": 10} for i in range(food_count)]
+        with _count_queries() as statements:
+            assert client.post("/save_meal", json={"foods": foods}).get_json()["success"]
+        counts[food_count] = len(statements)
+    print(f"   {counts}")
+    assert counts[1] == counts[20]
+
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(FoodItem)) == 20
+
+def test_import_meals():
+    """測試以 CSV 與 NDJSON 匯入歷史餐點"""
+    print("\n🧪 測試匯入歷史餐點...")
+
+    _reset_database(0)
+    client = app.test_client()
+
+    csv_body = (
+        "meal_id,date,total_calories,food_name,food_calories\n"
+        "1,2023-05-01 08:00,,toast,150\n"
+        "1,2023-05-01 08:00,,coffee,5\n"
+        "2,2023-05-01T19:30:00+08:00,600,noodles,600\n"
+        "3,not-a-date,,rice,200\n"
+    )
+    data = client.post("/api/meals/import", data=csv_body, content_type="text/csv").get_json()
+    print(f"   CSV: {data}")
+    assert data["imported"] == 2 and data["skipped"] == 1
+    assert data["errors"][0]["line"] == 5
+
+    lines = [
+        {"date": f"2023-06-{day:02d}T12:00:00", "foods": [{"name": "salad", "calories": "about 300 kcal"}]}
+        for day in range(1, 29)
+    ]
+    ndjson_body = "\n".join(json.dumps(line) for line in lines) + "\n{broken\n"
+    # 以較小的區塊大小確認分段提交
+    with _server_setting("IMPORT_CHUNK_SIZE", 10):
+        data = client.post("/api/meals/import", data=ndjson_body, content_type="application/x-ndjson").get_json()
+    assert data["imported"] == 28 and data["skipped"] == 1
+
+    stats_before = None
+    with app.app_context():
+        meal = db.session.execute(
+            db.select(MealRecord.date, MealRecord.total_calories).order_by(MealRecord.id).limit(2)
+        ).all()
+        assert meal[0].total_calories == 155
+        # 含時區的時間換算為 UTC
+        assert meal[1].date == datetime(2023, 5, 1, 11, 30)
+        stats_before = db.session.execute(db.text(
+            "SELECT day, total_calories, meal_count FROM daily_calorie_rollup ORDER BY day")).all()
+        rebuild_rollups()
+        stats_after = db.session.execute(db.text(
+            "SELECT day, total_calories, meal_count FROM daily_calorie_rollup ORDER BY day")).all()
+    assert stats_before == stats_after and len(stats_after) == 29
+
+    # 超過匯入上限時回應匯入專屬的訊息，而非單張圖片的上限
+    with _server_setting("IMPORT_MAX_BYTES", 100):
+        response = client.post("/api/meals/import", data=ndjson_body, content_type="application/x-ndjson")
+    assert response.status_code == 413
+    assert response.get_json() == {"success": False, "message": "匯入檔案過大 (上限 100 bytes)"}
+
+def test_export_round_trip():
+    """測試匯出的 CSV 與 NDJSON 可重新匯入且內容相同"""
+    print("\n🧪 測試匯出餐點...")
+
+    _reset_database(25)
+    client = app.test_client()
+    with _server_setting("EXPORT_CHUNK_SIZE", 10):
+
+        with _count_queries() as statements:
+            csv_body = client.get("/api/meals/export?format=csv").get_data(as_text=True)
+        # 每段兩次查詢，最後再一次確認沒有更多資料
+        assert len(statements) == 7, len(statements)
+        assert csv_body.count("\n") == 1 + 25 * 2
+        ndjson_body = client.get("/api/meals/export?format=ndjson").get_data(as_text=True)
+        exported = [json.loads(line) for line in ndjson_body.splitlines()]
+        assert len(exported) == 25
+        assert exported[0]["foods"] == [{"name": "food-0-a", "calories": 100}, {"name": "food-0-b", "calories": 200}]
+
+        for body, content_type in ((csv_body, "text/csv"), (ndjson_body, "application/x-ndjson")):
+            _reset_database(0)
+            data = client.post("/api/meals/import", data=body, content_type=content_type).get_json()
+            assert data["imported"] == 25 and data["skipped"] == 0, data
+            reimported = [json.loads(line) for line in
+                          client.get("/api/meals/export?format=ndjson").get_data(as_text=True).splitlines()]
+            assert reimported == exported
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試餐點記錄 API...")
+    print("=" * 50)
+
+    try:
+        test_constant_query_count()
+        test_page_contents()
+        test_cursor_ties()
+        test_meals_page()
+        test_stats_rollups()
+        test_save_meal_batched()
+        test_import_meals()
+        test_export_round_trip()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+統計數據測試腳本
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from metrics import MetricsRegistry
+
+def _registry(directory):
+    registry = MetricsRegistry(directory, flush_interval=60)
+    calls = registry.counter("calls_total", "呼叫次數")
+    latency = registry.histogram("latency_seconds", "耗時", [1, 5])
+    registry.gauge("open_circuits", "斷路器開啟的程序數")
+    return registry, calls, latency
+
+def test_render_local():
+    """測試單一程序的 Prometheus 輸出"""
+    print("🧪 測試 Prometheus 輸出...")
+
+    registry, calls, latency = _registry(None)
+    calls.inc(model="gpt-4o", outcome="success")
+    calls.inc(2, model="gpt-4o", outcome="success")
+    latency.observe(0.5)
+    latency.observe(3)
+    latency.observe(30)
+
+    text = registry.render()
+    print(text)
+    assert 'calls_total{model="gpt-4o",outcome="success"} 3' in text
+    assert 'latency_seconds_bucket{le="1"} 1' in text
+    assert 'latency_seconds_bucket{le="5"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_sum 33.5" in text
+    assert "# TYPE latency_seconds histogram" in text
+
+    registry._metrics[-1].set(1)
+    assert "# TYPE open_circuits gauge\nopen_circuits 1" in registry.render()
+
+def test_aggregate_workers():
+    """測試多個 worker 的數值經由共用目錄加總"""
+    print("\n🧪 測試跨 worker 加總...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        worker_a, calls_a, latency_a = _registry(directory)
+        worker_b, calls_b, latency_b = _registry(directory)
+        # 模擬不同程序寫入各自的快照檔
+        worker_b._pid, worker_b._snapshot_path = os.getpid(), os.path.join(directory, "metrics_other.json")
+
+        calls_a.inc(outcome="success")
+        calls_b.inc(outcome="success")
+        calls_b.inc(outcome="error")
+        latency_b.observe(2)
+        worker_b.flush()
+
+        text = worker_a.render()
+        assert 'calls_total{outcome="success"} 2' in text
+        assert 'calls_total{outcome="error"} 1' in text
+        assert "latency_seconds_count 1" in text
+
+def _write_dead_snapshot(directory, calls):
+    """以已結束的子程序 ID 寫入快照，模擬重新啟動前的 worker"""
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    with open(os.path.join(directory, f"metrics_{child.pid}_1.json"), "w", encoding="utf-8") as f:
+        json.dump({"calls_total": {'outcome="success"': calls}, "open_circuits": {"": 1}}, f)
+
+def test_fold_dead_snapshots():
+    """測試已結束程序的快照併入累計檔，檔案數量不隨重新啟動增加"""
+    print("\n🧪 測試合併已結束程序的快照...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        worker, calls, _ = _registry(directory)
+        calls.inc(outcome="success")
+        worker.flush()
+        _write_dead_snapshot(directory, 2)
+        _write_dead_snapshot(directory, 3)
+
+        text = worker.render()
+        assert 'calls_total{outcome="success"} 6' in text
+        # 已結束程序的量測值不保留
+        assert text.endswith("# TYPE open_circuits gauge\n")
+        # 只剩本程序的快照與累計檔
+        assert sorted(os.listdir(directory)) == [".lock", "accumulated.json", os.path.basename(worker._path())]
+        # 再次輸出不會重複計入
+        assert 'calls_total{outcome="success"} 6' in worker.render()
+
+        _write_dead_snapshot(directory, 4)
+        assert 'calls_total{outcome="success"} 10' in worker.render()
+        assert len(os.listdir(directory)) == 3
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試統計數據...")
+    print("=" * 50)
+
+    try:
+        test_render_local()
+        test_aggregate_workers()
+        test_fold_dead_snapshots()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
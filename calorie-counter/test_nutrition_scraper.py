@@ -7,8 +7,9 @@
 
 import sys
 import json
+import time
 from nutrition_scraper import NutritionScraper
-from advanced_scraper import AdvancedNutritionScraper
+from advanced_scraper import AdvancedNutritionScraper, HostRateLimiter
 
 def test_basic_scraper():
     """測試基礎爬蟲功能"""
@@ -92,6 +93,21 @@ def test_calculations():
         tdee = advanced_scraper._calculate_tdee(bmr_male, level)
         print(f"   {level}: {tdee:.0f} 卡路里")
 
+def test_host_rate_limiter():
+    """測試同一主機的請求間隔"""
+    print("\n⏱️ 測試主機請求間隔...")
+
+    # 同一主機的下一個請求需等待間隔，不同主機互不影響
+    limiter = HostRateLimiter(min_interval=0.3)
+    started = time.monotonic()
+    limiter.acquire("example.com")
+    limiter.acquire("example.org")
+    assert time.monotonic() - started < 0.1
+    limiter.acquire("example.com")
+    elapsed = time.monotonic() - started
+    print(f"   同一主機第二個請求等待 {elapsed:.2f} 秒")
+    assert elapsed >= 0.3
+
 def main():
     """主測試函數"""
     print("🚀 開始測試營養爬蟲功能...")
@@ -107,6 +123,9 @@ def main():
         # 測試計算功能
         test_calculations()
         
+        # 測試主機請求間隔
+        test_host_rate_limiter()
+        
         print("\n" + "=" * 50)
         print("✅ 所有測試完成！")
         print("\n📝 測試結果摘要:")
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+營養資訊搜尋索引測試腳本
+"""
+
+import itertools
+import random
+import statistics
+import sys
+import time
+
+from advanced_scraper import AdvancedNutritionScraper
+from nutrition_search import SYNONYMS, InvertedIndex, NutritionSearch, SpellingCorrector, _score_candidates, tokenize
+
+def _titles(results):
+    return [entry["title"] for entry, _ in results]
+
+def test_tokenize():
+    """測試英文單字與中文 bigram（先列出英文詞彙）"""
+    print("🧪 測試斷詞...")
+
+    tokens = tokenize("維生素C（Vitamin C）攝取要點，鐵")
+    print(f"   {tokens}")
+    assert tokens == ["c", "vitamin", "c", "維生", "生素", "攝取", "取要", "要點", "鐵"]
+    # 數字與單位分開
+    assert tokenize("ＰＲＯＴＥＩＮ 1.6g") == ["protein", "1", "6", "g"]
+    assert tokenize("每天300mg，2000IU") == ["300", "mg", "2000", "iu", "每天"]
+
+def test_synonyms_and_ranking():
+    """測試同義詞展開與相關度排序"""
+    print("\n🧪 測試同義詞與排序...")
+
+    index = InvertedIndex(SYNONYMS)
+    for i, entry in enumerate(AdvancedNutritionScraper().scrape_nutrition_database()):
+        index.add(i, entry)
+
+    for query in ("鐵", "Iron", "fe", "ferrous"):
+        assert _titles(index.search(query))[0] == "鐵質（Iron）攝取要點", query
+    assert _titles(index.search("vitamin C"))[0] == "維生素C（Vitamin C）攝取要點"
+    assert _titles(index.search("維生素B9")) == ["葉酸（Folate，維生素B9）攝取要點"]
+    assert _titles(index.search("蛋白質"))[0] == "蛋白質攝取指南"
+    assert "鎂（Magnesium）攝取要點" in _titles(index.search("mg"))
+    assert _titles(index.search("IU")) == ["維生素D與運動表現"]
+    # 所有詞彙都須出現
+    assert index.search("protein unicorn") == []
+
+    # 標題命中排在內文命中之前
+    index = InvertedIndex()
+    index.add("body", {"title": "Breakfast ideas", "content": "Oats with whey protein and berries"})
+    index.add("title", {"title": "Protein timing", "content": "When to eat after training"})
+    assert _titles(index.search("protein")) == ["Protein timing", "Breakfast ideas"]
+
+def test_incremental_updates():
+    """測試增量加入、取代與移除"""
+    print("\n🧪 測試增量更新...")
+
+    index = InvertedIndex(SYNONYMS)
+    index.add("a", {"title": "Magnesium and sleep", "content": "..."})
+    assert _titles(index.search("鎂")) == ["Magnesium and sleep"]
+    index.add("b", {"title": "鎂的食物來源", "content": "堅果、全穀"})
+    assert len(index.search("magnesium")) == 2
+    index.add("a", {"title": "Zinc and immunity", "content": "..."})
+    assert _titles(index.search("magnesium")) == ["鎂的食物來源"]
+    assert index.remove("b") and not index.remove("b")
+    assert index.search("鎂") == [] and len(index) == 1
+
+    class FakeStore:
+        versions = {"site": 1.0}
+        articles = [{"title": "Potassium rich foods", "content": "Bananas", "category": "scraped"}]
+
+        def crawl_state(self):
+            return {site: {"last_success": version} for site, version in self.versions.items()}
+
+        def site_articles(self, site):
+            return self.articles
+
+    loads = []
+    store = FakeStore()
+    search = NutritionSearch(lambda: loads.append(1) or [{"title": "鉀（Potassium）攝取要點", "content": ""}],
+                             store, refresh_interval=0)
+    assert len(search.search("鉀")) == 2
+    store.versions["site"] = 2.0
+    store.articles = [{"title": "Calcium and bones", "content": "Milk", "category": "scraped"}]
+    assert [entry["title"] for entry in search.search("ca")] == ["Calcium and bones"]
+    assert len(search.search("potassium")) == 1
+    assert loads == [1], "內建資料庫只應載入一次"
+
+def test_fuzzy_search():
+    """測試拼字修正與簡繁轉換"""
+    print("\n🧪 測試模糊搜尋...")
+
+    speller = SpellingCorrector()
+    for word in ("magnesium", "protein", "zinc", "fe", "抗壞血酸"):
+        speller.add(word)
+    assert speller.lookup("protien") == "protein"   # 相鄰字元對調
+    assert speller.lookup("magnesum") == "magnesium"
+    assert speller.lookup("zink") == "zinc"
+    assert speller.lookup("fa") is None              # 短詞不修正
+    assert speller.lookup("抗壞血") == "抗壞血酸"
+
+    search = NutritionSearch(AdvancedNutritionScraper().scrape_nutrition_database)
+    cases = {
+        "magnesum": ("magnesium", "鎂（Magnesium）攝取要點"),
+        "Vitamn C": ("vitamin c", "維生素C（Vitamin C）攝取要點"),
+        "potasium": ("potassium", "鉀（Potassium）攝取要點"),
+        "抗壞血": ("抗壞血酸", "維生素C（Vitamin C）攝取要點"),
+        # 簡體字與「維他命」不需修正即可命中
+        "维他命C": (None, "維生素C（Vitamin C）攝取要點"),
+        "叶酸": (None, "葉酸（Folate，維生素B9）攝取要點"),
+    }
+    for query, (expected_correction, expected_title) in cases.items():
+        results, corrected = search.search_with_correction(query)
+        print(f"   {query} -> {corrected}: {results[0]['title'] if results else None}")
+        assert corrected == expected_correction, query
+        assert results[0]["title"] == expected_title, query
+
+    # 複數還原與字首展開：分類為 fats、carbohydrates、vitamins 的資料也能以單數或縮寫查到
+    for query, category in (("fat", "fats"), ("carb", "carbohydrates"), ("Carbs", "carbohydrates"),
+                            ("vitamin", "vitamins"), ("vitamins", "vitamin_c")):
+        results, corrected = search.search_with_correction(query)
+        assert corrected is None and category in [entry["category"] for entry in results], query
+    assert "維生素D與運動表現" in [entry["title"] for entry in search.search("vitamin")]
+
+    # 詞彙索引找不到時比對子字串
+    assert search.search("nesium") == []
+    results, corrected = search.search_with_correction("nesium")
+    assert corrected is None and results[0]["title"] == "鎂（Magnesium）攝取要點"
+
+    # 沒有接近的詞彙時不回傳無關結果
+    assert search.search_with_correction("葉子") == ([], None)
+    assert search.search_with_correction("qwerty") == ([], None)
+
+def _brute_force(index, query, limit=20):
+    """逐篇評分所有包含全部詞彙的文件，作為排序結果的對照"""
+    lists = [index._spec_postings(spec) for spec in index._query_terms(query)]
+    docs = set.intersection(*(set(weights) for _, weights in lists))
+    idfs = [index._idf(len(weights)) for _, weights in lists]
+    return [doc for _, doc in _score_candidates(docs, lists, idfs, limit)]
+
+def test_large_corpus():
+    """測試十萬篇文章時的查詢結果與增量更新"""
+    print("\n🧪 測試大量文章...")
+
+    # 詞彙出現頻率依 Zipf 分布，常見詞彙出現在大部分文章中；alpha 與 beta 各出現在一半文章中但很少同時出現
+    rng = random.Random(0)
+    # 數字會被拆成獨立詞彙，合成的詞彙只用英文字母
+    words = ["w" + "".join("abcdefghij"[int(digit)] for digit in str(i)) for i in range(5000)]
+    for rank, word in ((0, "protein"), (3, "calories"), (10, "recovery"), (30, "hydration"), (300, "iron")):
+        words[rank] = word
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    pool = rng.choices(words, cum_weights=cum_weights, k=500_000)
+    cjk = ["蛋白質", "鐵質", "鈣", "熱量", "運動", "恢復", "水分", "補充", "飲食", "建議", "維生素", "碳水化合物"]
+    index = InvertedIndex(SYNONYMS)
+    started = time.perf_counter()
+    for i in range(100_000):
+        start = rng.randrange(len(pool) - 100)
+        marker = "alpha beta" if i % 5000 == 0 else ("alpha", "beta")[i % 2]
+        index.add(i, {
+            "title": " ".join(pool[start:start + rng.randint(3, 10)]),
+            "content": " ".join(pool[start + 10:start + rng.randint(20, 90)]) + f" {marker} "
+                       + "，".join(rng.sample(cjk, rng.randint(0, 8))),
+            "category": "scraped",
+        })
+    print(f"   建立索引: {time.perf_counter() - started:.1f} 秒")
+
+    # 查詢時間只列出供參考，不設門檻，避免在較慢的機器上誤判
+    queries = ("protein", "鐵", "protein recovery", "蛋白質", words[4242], "calories hydration", f"iron {words[42]}",
+               "alpha beta", "hydrat recovery")
+    for query in queries:
+        started = time.perf_counter()
+        results = index.search(query)  # 第一次查詢時建立該詞彙的排序
+        cold = (time.perf_counter() - started) * 1000
+        timings = []
+        for _ in range(20):
+            started = time.perf_counter()
+            index.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"   {query}: {len(results)} 筆，第一次 {cold:.1f} ms，之後 {statistics.median(timings):.3f} ms")
+        assert [entry["title"] for entry, _ in results] == [
+            index._entries[doc]["title"] for doc in _brute_force(index, query)], query
+    assert len(index.search("alpha beta")) == 20
+
+    # 加入與移除資料時就地更新已排序的列表，不必在下一次查詢重新排序
+    ranked = index._ranked["protein"][0]
+    index.add("new", {"title": "Protein protein protein", "content": "alpha beta", "category": "scraped"})
+    assert index._ranked["protein"][0] is ranked and ranked == sorted(ranked)
+    for query in ("protein", "protein alpha beta"):
+        assert _titles(index.search(query)) == [
+            index._entries[doc]["title"] for doc in _brute_force(index, query)], query
+    assert "Protein protein protein" in _titles(index.search("protein alpha beta"))
+    index.remove("new")
+    assert index._ranked["protein"][0] is ranked and ranked == sorted(ranked)
+    assert len(ranked) == len(index._postings["protein"])
+    assert "Protein protein protein" not in _titles(index.search("alpha beta"))
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試營養資訊搜尋...")
+    print("=" * 50)
+
+    try:
+        test_tokenize()
+        test_synonyms_and_ranking()
+        test_incremental_updates()
+        test_fuzzy_search()
+        test_large_corpus()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OpenAI 用戶端重試與斷路器測試腳本
+"""
+
+import sys
+
+import openai
+
+from openai_client import CircuitOpenError, ResilientOpenAIClient
+
+class FakeCompletions:
+    """依序回傳或拋出預先設定的結果"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+class FakeOpenAI:
+    def __init__(self, outcomes):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions(outcomes)
+
+    def with_options(self, **kwargs):
+        return self
+
+def make_client(outcomes, **kwargs):
+    fake = FakeOpenAI(outcomes)
+    options = dict(backoff_base=0.001, backoff_max=0.001, reset_timeout=60)
+    options.update(kwargs)
+    return ResilientOpenAIClient(client=fake, **options), fake.chat.completions
+
+def connection_error():
+    return openai.APIConnectionError(request=None)
+
+def test_retry_then_success():
+    """測試暫時性錯誤會重試"""
+    print("🧪 測試重試...")
+
+    client, completions = make_client([connection_error(), connection_error(), "ok"], max_retries=2)
+    assert client.create_chat_completion(model="gpt-4o") == "ok"
+    assert completions.calls == 3
+
+    stats = client.stats()
+    print(f"   重試次數: {stats['retries']}")
+    assert stats["retries"] == 2
+    assert stats["successes"] == 1
+    assert stats["circuit_state"] == "closed"
+
+def test_non_retryable_error():
+    """測試非暫時性錯誤不重試也不累計到斷路器"""
+    print("\n🧪 測試非暫時性錯誤...")
+
+    client, completions = make_client([ValueError("bad request")] * 3, failure_threshold=1)
+    for _ in range(2):
+        try:
+            client.create_chat_completion(model="gpt-4o")
+            assert False, "應拋出例外"
+        except ValueError:
+            pass
+    assert completions.calls == 2
+    assert client.stats()["circuit_state"] == "closed"
+
+def test_circuit_breaker():
+    """測試連續失敗後斷路器開啟並快速失敗"""
+    print("\n🧪 測試斷路器...")
+
+    events = []
+    client, completions = make_client([connection_error()] * 4, max_retries=1, failure_threshold=2,
+                                      on_circuit_event=events.append)
+    for _ in range(2):
+        try:
+            client.create_chat_completion(model="gpt-4o")
+            assert False, "應拋出例外"
+        except openai.APIConnectionError:
+            pass
+    assert completions.calls == 4
+
+    try:
+        client.create_chat_completion(model="gpt-4o")
+        assert False, "斷路器應開啟"
+    except CircuitOpenError as e:
+        print(f"   {e}")
+    assert completions.calls == 4
+
+    stats = client.stats()
+    assert stats["circuit_state"] == "open"
+    assert stats["circuit_opened"] == 1
+    assert stats["circuit_rejected"] == 1
+    assert events == ["opened", "rejected"]
+
+def test_half_open_recovery():
+    """測試冷卻時間過後的試探呼叫成功會關閉斷路器"""
+    print("\n🧪 測試斷路器恢復...")
+
+    events = []
+    client, completions = make_client([connection_error(), "ok"], max_retries=0,
+                                      failure_threshold=1, reset_timeout=0, on_circuit_event=events.append)
+    try:
+        client.create_chat_completion(model="gpt-4o")
+        assert False, "應拋出例外"
+    except openai.APIConnectionError:
+        pass
+    assert client.stats()["circuit_state"] == "half_open"
+    assert client.create_chat_completion(model="gpt-4o") == "ok"
+    assert client.stats()["circuit_state"] == "closed"
+    assert events == ["opened", "closed"]
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試 OpenAI 用戶端...")
+    print("=" * 50)
+
+    try:
+        test_retry_then_success()
+        test_non_retryable_error()
+        test_circuit_breaker()
+        test_half_open_recovery()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
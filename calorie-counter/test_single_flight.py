@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+單一飛行請求合併測試腳本
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from single_flight import SingleFlight
+
+def test_coalescing():
+    """測試相同鍵同時呼叫時只執行一次"""
+    print("🧪 測試請求合併...")
+
+    flight = SingleFlight(None)
+    calls = []
+
+    def analyse():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"total": 445}
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(lambda _: flight.do("image", analyse), range(5)))
+    print(f"   5 個請求，實際呼叫 {len(calls)} 次")
+    assert calls == [1]
+    assert results == [{"total": 445}] * 5
+
+    # 完成後的下一次呼叫重新執行，不同鍵互不影響
+    assert flight.do("image", analyse) == {"total": 445}
+    assert flight.do("other", analyse) == {"total": 445}
+    assert len(calls) == 3
+
+def test_error_propagation():
+    """測試領導者的錯誤傳給等待者"""
+    print("\n🧪 測試錯誤傳遞...")
+
+    flight = SingleFlight(None)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError("upstream error")
+
+    def call(_):
+        try:
+            flight.do("image", failing)
+        except ValueError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        errors = list(executor.map(call, range(3)))
+    assert calls == [1]
+    assert errors == ["upstream error"] * 3
+
+def test_abandoned_leader():
+    """測試領導者的串流中斷時，等待者改為自行呼叫而不是失敗"""
+    print("\n🧪 測試領導者中斷...")
+
+    flight = SingleFlight(None)
+    leader_started = threading.Event()
+
+    def stream_leader():
+        with flight.claim("image") as call:
+            assert call.leader
+            leader_started.set()
+            yield "item"
+            call.result = {"total": 445}
+        yield "result"
+
+    events = stream_leader()
+    assert next(events) == "item"
+    assert leader_started.is_set()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        waiter = executor.submit(flight.do, "image", lambda: {"total": 300})
+        time.sleep(0.1)
+        assert not waiter.done(), "等待者應等待進行中的呼叫"
+        # 模擬 SSE 用戶端離線
+        events.close()
+        assert waiter.result(timeout=5) == {"total": 300}
+
+def test_shared_lock():
+    """測試設定鎖目錄時，多個 worker 依序取得呼叫權"""
+    print("\n🧪 測試跨 worker 互斥...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        workers = [SingleFlight(directory), SingleFlight(directory)]
+        if not workers[0].shared:
+            print("   不支援檔案鎖，略過")
+            return
+        active = []
+        overlaps = []
+
+        def analyse():
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.1)
+            active.pop()
+            return {"total": 445}
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda worker: worker.do("image", analyse), workers))
+        assert overlaps == [1, 1]
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試請求合併...")
+    print("=" * 50)
+
+    try:
+        test_coalescing()
+        test_error_propagation()
+        test_abandoned_leader()
+        test_shared_lock()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批次圖片分析 API 測試腳本
+以模擬的分析函數執行，不呼叫 OpenAI
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+# 統計數據不寫入專案的 cache/metrics，避免混入正式環境的 /metrics
+os.environ.setdefault('CALORIE_METRICS_DIR', os.path.join(_db_dir, 'metrics'))
+
+import server
+from analysis_result import CalorieAnalysis
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_images")
+
+def _read_images():
+    """依檔案名稱排序讀取測試圖片"""
+    images = []
+    for name in sorted(os.listdir(IMAGE_DIR)):
+        with open(os.path.join(IMAGE_DIR, name), "rb") as f:
+            images.append(f.read())
+    return images
+
+IMAGES = _read_images()
+
+@contextmanager
+def _fake_server_batch(analyse, **settings):
+    """暫時替換伺服器的分析函數與批次設定，結束時還原"""
+    names = ("get_calories_from_image", *settings)
+    saved = {name: getattr(server, name) for name in names}
+    server.get_calories_from_image = analyse
+    for name, value in settings.items():
+        setattr(server, name, value)
+    try:
+        yield server.app.test_client()
+    finally:
+        for name, value in saved.items():
+            setattr(server, name, value)
+
+def _post_batch(client, images):
+    files = [(io.BytesIO(image), f"meal-{i}.jpg") for i, image in enumerate(images)]
+    return client.post("/upload/batch", data={"images": files}, content_type="multipart/form-data")
+
+def _analysis(total):
+    return CalorieAnalysis.from_model_output({"food_items": [{"name": "餐點", "calories": total}]})
+
+def test_results_in_upload_order():
+    """測試結果依上傳順序排列，與完成順序無關"""
+    print("🧪 測試批次結果順序...")
+
+    totals = {image: 100 * (i + 1) for i, image in enumerate(IMAGES)}
+
+    def analyse(image_bytes):
+        # 先上傳的圖片最慢完成
+        time.sleep(0.05 * (len(IMAGES) - IMAGES.index(image_bytes)))
+        return _analysis(totals[image_bytes])
+
+    with _fake_server_batch(analyse, BATCH_CONCURRENCY=len(IMAGES)) as client:
+        response = _post_batch(client, IMAGES)
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["filename"] for result in results] == [f"meal-{i}.jpg" for i in range(len(IMAGES))]
+    assert [result["calories"]["total"] for result in results] == [totals[image] for image in IMAGES]
+    print(f"   {len(results)} 張圖片依上傳順序回傳")
+
+def test_per_image_errors():
+    """測試單張圖片失敗或超過大小上限時，其他圖片仍有結果"""
+    print("\n🧪 測試單張圖片錯誤...")
+
+    small, failing, large = sorted(IMAGES[:3], key=len)
+
+    def analyse(image_bytes):
+        if image_bytes == failing:
+            raise ValueError("無法辨識的圖片")
+        return _analysis(445)
+
+    # 上限介於兩張圖片之間，較大的一張在讀取時即被拒絕
+    with _fake_server_batch(analyse, MAX_UPLOAD_BYTES=len(large) - 1) as client:
+        results = _post_batch(client, [large, small, failing]).get_json()["results"]
+    assert results[0] == {"filename": "meal-0.jpg", "error": f"Image too large (max {len(large) - 1} bytes)"}
+    assert results[1]["calories"]["total"] == 445
+    assert results[2] == {"filename": "meal-2.jpg", "error": "無法辨識的圖片"}
+
+def test_batch_limits():
+    """測試圖片數量上限與整體請求大小上限"""
+    print("\n🧪 測試批次上限...")
+
+    small = min(IMAGES, key=len)
+    with _fake_server_batch(lambda image_bytes: _analysis(445), BATCH_MAX_IMAGES=2,
+                            MAX_UPLOAD_BYTES=len(small)) as client:
+        response = _post_batch(client, [small] * 3)
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Too many images (max 2)"}
+        assert _post_batch(client, [small] * 2).status_code == 200
+
+        # 超過放寬後的整體上限時，訊息說明批次上限而非單張圖片上限
+        response = _post_batch(client, [max(IMAGES, key=len)])
+        assert response.status_code == 413
+        assert response.get_json() == {"error": f"Batch too large (max 2 images of {len(small)} bytes each)"}
+    print("   超過張數回應 400，超過整體大小回應 413")
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試批次圖片分析...")
+    print("=" * 50)
+
+    try:
+        test_results_in_upload_order()
+        test_per_image_errors()
+        test_batch_limits()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+視覺模型後端測試腳本
+以模擬的內層後端錄製，不呼叫 OpenAI
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from vision_backends import (
+    OpenAIBackend,
+    RecordReplayBackend,
+    ReplayMissError,
+    VisionBackend,
+    VisionRequest,
+    VisionResponse,
+    create_backend,
+)
+
+CONTENT = json.dumps({
+    "reasoning": "一碗牛肉麵，湯頭與麵條分開估算",
+    "food_items": [{"name": "牛肉麵", "calories": "550"}],
+    "total": "550",
+}, ensure_ascii=False)
+
+class FakeInnerBackend(VisionBackend):
+    """只實作 complete 的內層後端，串流沿用預設的一次回傳"""
+
+    def __init__(self, content=CONTENT):
+        self.content = content
+        self.calls = []
+
+    def complete(self, request):
+        self.calls.append(request.image_key)
+        return VisionResponse(self.content, "gpt-4o-2024-08-06", {"prompt_tokens": 120, "completion_tokens": 40})
+
+def _request(image_key):
+    return VisionRequest(image_key, "gpt-4o", [{"role": "user", "content": "image"}])
+
+def _drain(stream):
+    """取出串流的所有片段與產生器的回傳值"""
+    chunks = []
+    while True:
+        try:
+            chunks.append(next(stream))
+        except StopIteration as stop:
+            return chunks, stop.value
+
+def test_abstract_backend():
+    """測試未實作 complete 的後端無法建立"""
+    print("🧪 測試後端介面...")
+
+    try:
+        VisionBackend()
+        raise AssertionError("VisionBackend 應為抽象類別")
+    except TypeError:
+        pass
+
+    class StreamOnly(VisionBackend):
+        def stream(self, request):
+            yield ""
+
+    try:
+        StreamOnly()
+        raise AssertionError("未實作 complete 的後端應無法建立")
+    except TypeError:
+        pass
+
+def test_record_then_replay():
+    """測試錄製模式儲存回應，重播模式不需內層後端即可回傳相同內容"""
+    print("\n🧪 測試錄製與重播...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        inner = FakeInnerBackend()
+        recorder = RecordReplayBackend(directory, inner=inner)
+        recorded = recorder.complete(_request("a" * 64))
+        assert recorded.content == CONTENT and inner.calls == ["a" * 64]
+        assert os.path.exists(os.path.join(directory, f"{'a' * 64}.json"))
+
+        # 已錄製的圖片不再呼叫內層後端
+        assert recorder.complete(_request("a" * 64)).content == CONTENT
+        assert inner.calls == ["a" * 64]
+
+        # 串流錄製經由內層後端的 stream
+        chunks, streamed = _drain(recorder.stream(_request("b" * 64)))
+        assert "".join(chunks) == CONTENT and streamed.content == CONTENT
+        assert inner.calls == ["a" * 64, "b" * 64]
+
+        replayer = RecordReplayBackend(directory)
+        replayed = replayer.complete(_request("a" * 64))
+        assert replayed.content == CONTENT
+        assert replayed.model == "gpt-4o-2024-08-06"
+        assert replayed.usage == {"prompt_tokens": 120, "completion_tokens": 40}
+
+        # 重播串流分段輸出，合併後與錄製內容相同
+        chunks, replayed = _drain(replayer.stream(_request("b" * 64)))
+        assert len(chunks) > 1
+        assert all(len(chunk) <= RecordReplayBackend.STREAM_CHUNK_CHARS for chunk in chunks)
+        assert "".join(chunks) == CONTENT and replayed.content == CONTENT
+
+        for call in (replayer.complete, lambda request: _drain(replayer.stream(request))):
+            try:
+                call(_request("c" * 64))
+                raise AssertionError("未錄製的圖片應拋出 ReplayMissError")
+            except ReplayMissError:
+                pass
+        print(f"   重播串流分為 {len(chunks)} 段")
+
+def test_create_backend():
+    """測試依名稱建立後端"""
+    print("\n🧪 測試建立後端...")
+
+    client = object()
+    with tempfile.TemporaryDirectory() as directory:
+        backend = create_backend("openai", client, directory)
+        assert isinstance(backend, OpenAIBackend) and backend.client is client
+
+        backend = create_backend("record", client, directory)
+        assert isinstance(backend, RecordReplayBackend) and backend.directory == directory
+        assert isinstance(backend.inner, OpenAIBackend) and backend.inner.client is client
+
+        backend = create_backend("replay", client, directory)
+        assert isinstance(backend, RecordReplayBackend) and backend.inner is None
+
+        try:
+            create_backend("gemini", client, directory)
+            raise AssertionError("未知的後端名稱應拋出 ValueError")
+        except ValueError:
+            pass
+
+def main():
+    """主測試函數"""
+    print("🚀 開始測試視覺模型後端...")
+    print("=" * 50)
+
+    try:
+        test_abstract_backend()
+        test_record_then_replay()
+        test_create_backend()
+        print("\n" + "=" * 50)
+        print("✅ 所有測試完成！")
+    except AssertionError as e:
+        print(f"\n❌ 測試失敗: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+視覺模型後端
+將模型呼叫抽象為可替換的後端：OpenAI（或相容的本機模擬伺服器）以及依圖片雜湊錄製/重播回應
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Generator, List, Optional
+
+from image_cache import write_json_atomic
+
+
+@dataclass
+class VisionRequest:
+    image_key: str
+    model: str
+    messages: List[Dict]
+
+
+@dataclass
+class VisionResponse:
+    content: str
+    model: str
+    usage: Optional[Dict] = None
+    retries: int = 0
+
+
+class ReplayMissError(Exception):
+    """重播模式下找不到該圖片的錄製回應"""
+
+
+class VisionBackend(ABC):
+    """視覺模型後端介面，子類別至少須實作 complete"""
+
+    @abstractmethod
+    def complete(self, request: VisionRequest) -> VisionResponse:
+        """回傳完整的模型回應"""
+
+    def stream(self, request: VisionRequest) -> Generator[str, None, VisionResponse]:
+        """逐段產生回應文字，結束時以產生器的回傳值提供完整回應；預設一次回傳完整內容"""
+        response = self.complete(request)
+        yield response.content
+        return response
+
+
+def _usage_dict(response) -> Optional[Dict]:
+    usage = getattr(response, "usage", None)
+    return usage.model_dump() if usage is not None else None
+
+
+class OpenAIBackend(VisionBackend):
+    """呼叫 OpenAI chat completions；設定 OPENAI_BASE_URL 即可改連本機模擬伺服器"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, request: VisionRequest) -> VisionResponse:
+        response = self.client.create_chat_completion(
+            model=request.model,
+            response_format={"type": "json_object"},
+            messages=request.messages,
+        )
+        return VisionResponse(
+            response.choices[0].message.content,
+            getattr(response, "model", None) or request.model,
+            _usage_dict(response),
+            self.client.last_retries,
+        )
+
+    def stream(self, request: VisionRequest) -> Generator[str, None, VisionResponse]:
+        # include_usage 讓最後一段回傳 token 用量，串流時才能統計成本
+        stream = self.client.create_chat_completion(
+            model=request.model,
+            response_format={"type": "json_object"},
+            messages=request.messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        retries = self.client.last_retries
+        chunks = []
+        model = request.model
+        usage = None
+        for chunk in stream:
+            model = getattr(chunk, "model", None) or model
+            usage = _usage_dict(chunk) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                yield delta
+        return VisionResponse("".join(chunks), model, usage, retries)
+
+
+class RecordReplayBackend(VisionBackend):
+    """依圖片雜湊存放回應；有 inner 時為錄製模式，沒有時只重播已錄製的回應"""
+
+    # 重播串流時每段的字元數，模擬模型逐段輸出
+    STREAM_CHUNK_CHARS = 24
+
+    def __init__(self, directory: str, inner: Optional[VisionBackend] = None):
+        self.directory = directory
+        self.inner = inner
+
+    def _path(self, image_key: str) -> str:
+        return os.path.join(self.directory, f"{image_key}.json")
+
+    def _load(self, image_key: str) -> Optional[VisionResponse]:
+        try:
+            with open(self._path(image_key), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return VisionResponse(saved["content"], saved.get("model", ""), saved.get("usage"))
+
+    def _save(self, image_key: str, response: VisionResponse) -> None:
+        write_json_atomic(self._path(image_key), {
+            "model": response.model,
+            "content": response.content,
+            "usage": response.usage,
+        })
+
+    def complete(self, request: VisionRequest) -> VisionResponse:
+        saved = self._load(request.image_key)
+        if saved is not None:
+            return saved
+        if self.inner is None:
+            raise ReplayMissError(f"沒有圖片 {request.image_key} 的錄製回應")
+
+        response = self.inner.complete(request)
+        self._save(request.image_key, response)
+        return response
+
+    def stream(self, request: VisionRequest) -> Generator[str, None, VisionResponse]:
+        saved = self._load(request.image_key)
+        if saved is not None:
+            content = saved.content
+            for i in range(0, len(content), self.STREAM_CHUNK_CHARS):
+                yield content[i:i + self.STREAM_CHUNK_CHARS]
+            return saved
+        if self.inner is None:
+            raise ReplayMissError(f"沒有圖片 {request.image_key} 的錄製回應")
+
+        response = yield from self.inner.stream(request)
+        self._save(request.image_key, response)
+        return response
+
+
+def create_backend(name: str, client, replay_dir: str) -> VisionBackend:
+    """依名稱建立後端：openai、record 或 replay"""
+    if name == "openai":
+        return OpenAIBackend(client)
+    if name == "record":
+        return RecordReplayBackend(replay_dir, inner=OpenAIBackend(client))
+    if name == "replay":
+        return RecordReplayBackend(replay_dir)
+    raise ValueError(f"未知的視覺模型後端: {name}")